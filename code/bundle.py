@@ -0,0 +1,169 @@
+import pygame, os, sys, mmap, struct, time, subprocess
+
+# Packs the game's assets (images, fonts, tilesets, compiled rooms and world files) into one indexed file that is
+# memory mapped at start-up, so a launch opens one file instead of one per asset. Images are stored decoded, as raw
+# pixels in the format convert_alpha gives (32 bit ARGB, BGRA bytes on little endian machines), so loading one wraps
+# the mapped bytes in a surface without decoding or converting. Nothing is decoded until it is asked for. Entries are
+# named by their path relative to the bundle file (the repo root), e.g. 'assets/fonts/small_font.png'.
+
+MAGIC = b'SNKB'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxII')  # magic, version, entry count, index offset
+ENTRY = struct.Struct('<IIBxxxQQII')  # name offset, name length (into the name blob), kind, data offset, length, w, h
+ALIGN = 16  # entry data alignment, keeps the uint32 grids of compiled rooms aligned
+
+RAW = 0  # bytes as they are on disk
+IMAGE = 1  # decoded BGRA pixels
+
+IMAGE_TYPES = ('.png', '.jpg', '.jpeg', '.gif')
+RAW_TYPES = ('.lvl', '.world')
+
+
+# ------------------ RUNTIME ------------------
+
+class Bundle:
+    def __init__(self, path):
+        self.root = os.path.dirname(os.path.abspath(path))
+        with open(path, 'rb') as file:
+            # copy on write, so a surface drawn on never writes back to the file
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, count, index_offset = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} asset bundle')
+
+        names_offset = index_offset + count * ENTRY.size
+        self.entries = {}  # {name: (kind, offset, length, width, height)}
+        self.folders = {}  # {folder name: [file names]} in bundle order
+        for i in range(count):
+            name_start, name_length, *entry = ENTRY.unpack_from(self.buffer, index_offset + i * ENTRY.size)
+            start = names_offset + name_start
+            name = self.buffer[start:start + name_length].decode('utf-8')
+            self.entries[name] = tuple(entry)
+            folder, file_name = name.rpartition('/')[::2]
+            self.folders.setdefault(folder, []).append(file_name)
+
+    # entry name of a path (relative to the working directory, or absolute)
+    def get_name(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def __contains__(self, path):
+        return self.get_name(path) in self.entries
+
+    # view of a raw entry's bytes in the mapped file
+    def get_bytes(self, path):
+        kind, offset, length, width, height = self.entries[self.get_name(path)]
+        return memoryview(self.buffer)[offset:offset + length]
+
+    # new surface over an image entry's pixels (surfaces from the same entry share pixels, as subsurfaces do)
+    def get_image(self, path):
+        kind, offset, length, width, height = self.entries[self.get_name(path)]
+        return pygame.image.frombuffer(memoryview(self.buffer)[offset:offset + length], (width, height), 'BGRA')
+
+    # file names in a folder, None if the bundle has none
+    def listdir(self, path):
+        return self.folders.get(self.get_name(path))
+
+
+# ------------------ BUILDING ------------------
+
+# packs every image and compiled room / world file under the source folders
+def build_bundle(bundle_path, sources):
+    root = os.path.dirname(os.path.abspath(bundle_path))
+    files = []
+    for source in sources:
+        for folder, sub_folders, file_names in os.walk(source):
+            sub_folders.sort()
+            for file_name in sorted(file_names):
+                extension = os.path.splitext(file_name)[1].lower()
+                if extension in IMAGE_TYPES + RAW_TYPES:
+                    path = os.path.join(folder, file_name)
+                    name = os.path.relpath(os.path.abspath(path), root).replace(os.sep, '/')
+                    files.append((name, path, extension in IMAGE_TYPES))
+
+    entries = []
+    names = bytearray()
+    # written to a temporary file and renamed so a half written bundle is never read
+    temp_path = bundle_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0))  # placeholder until the index is written
+        for name, path, is_image in files:
+            width = height = 0
+            if is_image:
+                image = pygame.image.load(path)
+                width, height = image.get_size()
+                data = pygame.image.tobytes(image, 'BGRA')
+            else:
+                with open(path, 'rb') as source_file:
+                    data = source_file.read()
+            file.write(bytes(-file.tell() % ALIGN))
+            encoded = name.encode('utf-8')
+            entries.append(ENTRY.pack(len(names), len(encoded), IMAGE if is_image else RAW, file.tell(), len(data),
+                                      width, height))
+            names += encoded
+            file.write(data)
+
+        index_offset = file.tell()
+        file.write(b''.join(entries))
+        file.write(names)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, len(entries), index_offset))
+    os.replace(temp_path, bundle_path)
+    return len(entries)
+
+
+# start-up as main.py does it, up to the first room being entered (run in a fresh process per launch). Prints the
+# whole launch and the asset loading part of it (ms)
+STARTUP = '''
+import sys, time
+start = time.perf_counter()
+import pygame, game_data
+game_data.use_asset_bundle = sys.argv[1] == '1'
+pygame.init()
+from world import World
+from text import Font
+from support import load_image
+screen = pygame.display.set_mode((game_data.screen_width, game_data.screen_height))
+assets_start = time.perf_counter()
+pygame.display.set_icon(load_image('../assets/icon/app_icon.png'))
+font = Font(game_data.fonts['small_font'], 'white')
+world = World('../rooms/tiled_worlds/habitat.world', screen, screen.get_rect(), [])
+world.enter_room('../rooms/tiled_rooms/room_0.tmx', 'initial')
+end = time.perf_counter()
+print('start-up', (end - start) * 1000, (end - assets_start) * 1000)
+'''
+
+
+# builds the bundle then compares launches with and without it: python bundle.py [launches]
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    from game_data import asset_bundle_path
+    from compiled_level import compile_level, get_compiled_path, is_compiled_current
+
+    # rooms are compiled first so the bundle has every room's current .lvl
+    for folder, _, file_names in os.walk('../rooms'):
+        for file_name in file_names:
+            if file_name.endswith('.tmx'):
+                tmx_path = os.path.join(folder, file_name)
+                if not is_compiled_current(get_compiled_path(tmx_path)):
+                    compile_level(tmx_path)
+    start = time.perf_counter()
+    count = build_bundle(asset_bundle_path, ['../assets', '../rooms'])
+    print(f'bundled {count} assets into {asset_bundle_path} ({os.path.getsize(asset_bundle_path) / 1024:.0f} KB) '
+          f'in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+    launches = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    environment = dict(os.environ, SDL_VIDEODRIVER=os.environ.get('SDL_VIDEODRIVER', 'dummy'),
+                       SDL_AUDIODRIVER=os.environ.get('SDL_AUDIODRIVER', 'dummy'), PYGAME_HIDE_SUPPORT_PROMPT='1')
+    # launches alternate between the two, so neither gets the warmer file cache or a quieter machine
+    times = {'0': [], '1': []}
+    for _ in range(launches):
+        for use_bundle in times:
+            output = subprocess.run([sys.executable, '-c', STARTUP, use_bundle], env=environment, check=True,
+                                    capture_output=True, text=True).stdout
+            line = next(line for line in output.splitlines() if line.startswith('start-up'))  # rooms print as they stream
+            times[use_bundle].append([float(ms) for ms in line.split()[1:]])
+    for use_bundle in times:
+        launch, assets = zip(*times[use_bundle])
+        print(f'{"bundle" if use_bundle == "1" else "loose files"}: launch {min(launch):.1f} ms best '
+              f'({sum(launch) / launches:.1f} mean), assets {min(assets):.1f} ms best ({sum(assets) / launches:.1f} mean) '
+              f'of {launches} launches')
@@ -1,10 +1,11 @@
-import pygame
-from game_data import controller_map, tile_size
-from support import rotate_point_deg, get_angle_deg, get_rect_corners
+import pygame, math
+import numpy as np
+from game_data import controller_map, tile_size, zoom_granularity, max_zoom
+from systems import rotate_points
 
 
 class Camera():
-    def __init__(self, surface, screen_rect, room_dim, player, controllers):
+    def __init__(self, surface, screen_rect, room_dim, player, controllers, get_room_corners):
         self.player = player  # the target of the camera
         self.target = self.player.get_pos()  # target position
         self.scroll_value = [0, 0]  # the scroll, shifts the world to create camera effect
@@ -14,6 +15,7 @@ class Camera():
         #-- zoom --
         self.zoom = 1
         self.zoom_speed = 0.1
+        self.max_zoom = max_zoom
 
         # lerp = linear interpolation. Speed the camera takes to center on the player as it moves, (camera smoothing)
         # -- normal lerp --
@@ -43,23 +45,14 @@ class Camera():
         self.screen_center_y = surface.get_height() // 2
         self.screen_rect = screen_rect
 
-        # -- room dimensions and bounding rect --
-        room_width = room_dim[0]
-        room_height = room_dim[1]
-        self.room_corners = [[0, 0], [0, room_height], [room_width, room_height], [room_width, 0]]  # corners outlining rect (for rot)
-
-        # -- boundary collision --
-        # separate for x and y so that the shorter one doesn't glitch out with too large a tolerance
-        # half screen dimension to snap camera to wall as soon as player turns around anywhere on wall side of screen
-        self.collision_tolerance_x = self.screen_width // 2
-        self.collision_tolerance_y = self.screen_height // 2
-
-        self.camera_boundaries()
+        # -- room bounds -- the view is kept inside the room, get_room_corners returns the room's corners on screen
+        self.bounds = RoomBounds(room_dim)
+        self.get_room_corners = get_room_corners
 
 # -- input --
 
-    def get_input(self):
-        keys = pygame.key.get_pressed()
+    # keys is the frame's key state (see replay.FrameInput)
+    def get_input(self, keys):
 
         # TODO testing remove potentially
         if keys[pygame.K_LSHIFT] and keys[pygame.K_c]:
@@ -87,63 +80,41 @@ class Camera():
         # caps min zoom (no negative zoom)
         if self.zoom < 1:
             self.zoom = 1
+        elif self.zoom > self.max_zoom:
+            self.zoom = self.max_zoom
 
     def reset_zoom(self):
         self.zoom = 1
 
-    def update_target(self):
+    def update_target(self, keys):
         self.target = self.player.get_pos()  # sets target to player pos for modification
 
-        self.get_input()
+        self.get_input(keys)
 
         # APPLY OFFSETS TO TARGET HERE
 
-    # rotates level 'rectangle' corners
-    def update_level_rect(self, rot_value):
-        origin = self.player.get_pos()
-        # rotate corner points
-        for p in range(len(self.room_corners)):
-            self.room_corners[p][0], self.room_corners[p][1] = rotate_point_deg(self.room_corners[p], origin, rot_value)
-
-    def camera_boundaries(self):
-        # must MODIFY existing scroll rather than reassigning
-        # if edge of screen has exceeded edge of level, reduce scroll based on difference between
-        # MODIFED level edge (hence +ing or -ing scroll value as well as just finding dif between edges) and screen edge
-
-        '''# horizontal
-        if self.screen_rect.left <= self.room_rect.left - self.scroll_value[0]:
-            self.scroll_value[0] += abs(self.room_rect.left - self.screen_rect.left - self.scroll_value[0])
-        if self.screen_rect.right >= self.room_rect.right - self.scroll_value[0]:
-            self.scroll_value[0] += -abs(self.screen_rect.right - self.room_rect.right + self.scroll_value[0])
-
-        # vertical
-        if self.screen_rect.top <= self.room_rect.top - self.scroll_value[1]:
-            self.scroll_value[1] += abs(self.room_rect.top - self.screen_rect.top - self.scroll_value[1])
-        if self.screen_rect.bottom >= self.room_rect.bottom - self.scroll_value[1]:
-            self.scroll_value[1] -= abs(self.screen_rect.bottom - self.room_rect.bottom + self.scroll_value[1])'''
-
-        for pair in range(4):
-            a = self.room_corners[pair]
-            b = self.room_corners[(pair+1) % 4]  # loops around if == 4 (so pair 3, 0 is included)
-            c = self.room_corners[(pair+2) % 4]  # corner opposite to a
-            angle = get_angle_deg(a, b)
-            for corner in get_rect_corners(self.screen_rect):
-                c_angle = get_angle_deg(a, c)
-                diff_c = angle - c_angle
-                corner_angle = get_angle_deg(a, corner)
-                diff_corner = angle - corner_angle
-                # if the point is not inside the given line (inside determined by angle to opp corner), modify scroll
-                if not (diff_c < 0 and corner_angle <= 0) and not (diff_c > 0 and corner_angle >= 0):
-                    pass  # TODO work out how to restrict camera lol
+    # moves scroll so the view stays inside the room (centered on an axis the room is narrower than). The room corners
+    # are where the last frame left them, this frame rotates them around the player before scrolling, so the view
+    # (screen center + scroll, before scrolling) is clamped against the room rotated around the player
+    def camera_boundaries(self, rot_value):
+        corners = np.array(self.get_room_corners(), dtype=np.float64)
+        if rot_value != 0:
+            rotate_points(corners, np.array(self.player.get_pos(), dtype=np.float64), rot_value)
+        zoom = self.get_view().zoom
+        # a pixel of margin so rounding the scroll never shows past the edge
+        half_size = (self.screen_center_x / zoom + 1, self.screen_center_y / zoom + 1)
+        center = (self.screen_center_x + self.scroll_value[0], self.screen_center_y + self.scroll_value[1])
+        x, y = self.bounds.clamp_rect(corners, center, half_size)
+        self.scroll_value[0] = round(x - self.screen_center_x)
+        self.scroll_value[1] = round(y - self.screen_center_y)
 
 
 # -- Getters and Setters --
 
     # scrolls the world when the player hits certain points on the screen
     # dynamic camera tut, dafluffypotato:  https://www.youtube.com/watch?v=5q7tmIlXROg
-    def get_scroll(self, dt, rot_value):
-        self.update_target()  # update camera target
-        self.update_level_rect(rot_value)  # update level bounds to cam rotation
+    def get_scroll(self, dt, rot_value, keys):
+        self.update_target(keys)  # update camera target
 
         # if camera is to follow normally, do normal stuff, otherwise, focus camera directly on target
         if not self.focus_target:
@@ -167,20 +138,102 @@ class Camera():
         self.scroll_value[1] = round(self.scroll_value[1] * dt)
 
         # camera boundaries
-        self.camera_boundaries()
-
-        # shift room boundary rect corners
-        for p in range(len(self.room_corners)):
-            self.room_corners[p] = [self.room_corners[p][0] - self.scroll_value[0],
-                                    self.room_corners[p][1] - self.scroll_value[1]]
+        self.camera_boundaries(rot_value)
 
         return self.scroll_value
 
-    # returns zoom value and offset required to zoom into target point (currently center of screen)
-    def get_zoom(self):
-        # compensates for zooming to origin by offsetting screen with scroll value
-        width = pygame.display.get_surface().get_width()
-        height = pygame.display.get_surface().get_height()
-        # x = (xz - x)/2
-        offset = ((width * self.zoom - width) // 2, (height * self.zoom - height) // 2)
-        return self.zoom, offset
+    # render transform for the current zoom, quantised so zoomed tile sprites can be cached per zoom level
+    def get_view(self):
+        zoom = max(1, round(self.zoom / zoom_granularity) * zoom_granularity)
+        return View(zoom, (self.screen_center_x, self.screen_center_y))
+
+
+# the room as four half-planes. In room space the room is the rect [0, width] x [0, height] from its top left corner, so
+# its edge normals are the room axes and never change. On screen the room is rotated and scrolled, the current corners
+# give the room axes on screen and a point or rect is tested against each half-plane with dot products (no angles).
+# Corners are (4, 2): top left, top right, bottom right, bottom left (see Level.room_corners)
+class RoomBounds:
+    def __init__(self, room_dim):
+        self.size = np.array(room_dim, dtype=np.float64)
+
+    # top left corner and unit room x and y axes on screen
+    def get_axes(self, corners):
+        origin = np.asarray(corners[0], dtype=np.float64)
+        x_axis = (np.asarray(corners[1], dtype=np.float64) - origin) / self.size[0]
+        y_axis = (np.asarray(corners[3], dtype=np.float64) - origin) / self.size[1]
+        return origin, x_axis, y_axis
+
+    # screen points (n, 2) -> distances along the room axes from the room's top left corner (n, 2)
+    def project(self, corners, points):
+        origin, x_axis, y_axis = self.get_axes(corners)
+        rel = np.asarray(points, dtype=np.float64) - origin
+        return np.column_stack((rel @ x_axis, rel @ y_axis))
+
+    # whether each screen point (n, 2) is inside the room, at least margin from every edge
+    def contains(self, corners, points, margin=0):
+        room = self.project(corners, points)
+        return np.all((room >= margin) & (room <= self.size - margin), axis=1)
+
+    # center of the screen aligned rect (half_size from center) moved the least distance so the rect is inside the
+    # room. The rect's extent along a room axis is the sum of its half sizes projected onto that axis, so each axis is
+    # clamped on its own. If the room is narrower than the rect along an axis the rect is centered on it
+    def clamp_rect(self, corners, center, half_size):
+        origin, x_axis, y_axis = self.get_axes(corners)
+        center = np.asarray(center, dtype=np.float64)
+        rel = center - origin
+        for axis, length in ((x_axis, self.size[0]), (y_axis, self.size[1])):
+            position = rel @ axis
+            extent = half_size[0] * abs(axis[0]) + half_size[1] * abs(axis[1])
+            if length <= extent * 2:
+                target = length / 2
+            else:
+                target = min(max(position, extent), length - extent)
+            center += axis * (target - position)
+        return center.tolist()
+
+
+# camera zoom is applied when drawing rather than to entities (movement, collisions and tile hitboxes stay in unzoomed
+# screen space): drawn position = origin + (pos - origin) * zoom, origin is the screen center
+class View:
+    def __init__(self, zoom=1, origin=(0, 0)):
+        self.zoom = zoom
+        self.origin = origin
+
+    def point(self, pos):
+        if self.zoom == 1:
+            return pos
+        return (self.origin[0] + (pos[0] - self.origin[0]) * self.zoom,
+                self.origin[1] + (pos[1] - self.origin[1]) * self.zoom)
+
+    # sequence or (n, 2) array of points, returns a list of [x, y] for drawing
+    def points(self, points):
+        if self.zoom == 1:
+            return points.tolist() if isinstance(points, np.ndarray) else points
+        return ((np.asarray(points, dtype=np.float64) - self.origin) * self.zoom + self.origin).tolist()
+
+    # radii and line widths, never below 1
+    def length(self, length):
+        if self.zoom == 1:
+            return length
+        return max(1, round(length * self.zoom))
+
+    # drawn area of a rect
+    def rect(self, rect):
+        if self.zoom == 1:
+            return rect
+        left, top = self.point(rect.topleft)
+        right, bottom = self.point(rect.bottomright)
+        return pygame.Rect(math.floor(left), math.floor(top), math.ceil(right) - math.floor(left),
+                           math.ceil(bottom) - math.floor(top))
+
+    # area of unzoomed screen space that is drawn into screen area rect (for culling)
+    def world_rect(self, rect):
+        if self.zoom == 1:
+            return rect
+        left = self.origin[0] + (rect[0] - self.origin[0]) / self.zoom
+        top = self.origin[1] + (rect[1] - self.origin[1]) / self.zoom
+        return pygame.Rect(math.floor(left), math.floor(top), math.ceil(rect[2] / self.zoom) + 1,
+                           math.ceil(rect[3] / self.zoom) + 1)
+
+
+no_zoom = View()
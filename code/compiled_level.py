@@ -0,0 +1,632 @@
+import os, sys, mmap, struct, hashlib
+from array import array
+import numpy as np
+from xml.etree import ElementTree
+from pytmx.pytmx import unpack_gids, decode_gid, convert_to_bool, GID_MASK
+from game_data import tile_size, tile_image_cache, voxel_tiles
+from support import get_asset_bundle, load_image
+from voxel import get_tile_model, load_voxel_model
+
+# Compiles a Tiled .tmx room (plus its external .tsx tilesets and .tx templates) into a compact binary file that is
+# memory mapped at runtime. Gid grids are stored as raw little endian uint32 arrays, objects and their properties as
+# packed records and tile collision geometry (plus the collideable layer's navigation mesh) is precomputed, so loading
+# a room builds views without any XML parsing.
+# The compiled file sits next to the .tmx (room_0.tmx -> room_0.lvl) and is rebuilt whenever a source file changes.
+
+MAGIC = b'SNKL'
+VERSION = 4
+NONE = 0xFFFFFFFF  # string index used for missing values
+
+# --- record layouts (all little endian) ---
+# magic, version, width, height, tilewidth, tileheight, then (count, offset) pairs for each table:
+# dependencies, strings, images, layers, objects, properties
+HEADER = struct.Struct('<4sHxxIIII' + 'II' * 6)
+DEPENDENCY = struct.Struct('<Iqq20s')  # path, mtime_ns, size, sha1
+STRING = struct.Struct('<II')  # offset, length into the string blob
+IMAGE = struct.Struct('<IIiiiiI')  # tiled gid (with flip flags), source, rect x, y, w, h (w == 0 is whole image), trans
+# name, class, kind, visible, parallaxx, parallaxy, width, height, data offset, item count, items offset/first object,
+# collider count, colliders offset, walkable rect count, walkable offset, portal count, portals offset
+LAYER = struct.Struct('<IIBB2xffIIIIIIIIIII')
+OBJECT = struct.Struct('<IIIfffffIII')  # id, name, type, x, y, width, height, rotation, gid, first prop, prop count
+PROPERTY = struct.Struct('<IBxxxI')  # key, value type, value (as string)
+
+TILE_LAYER = 0
+OBJECT_LAYER = 1
+NAVMESH_LAYER = 'collideable'  # tile layer whose empty cells are decomposed into the navigation mesh
+
+# property value types, values are stored as strings and cast on load
+PROP_TYPES = {'string': 0, 'int': 1, 'float': 2, 'bool': 3, 'object': 4, 'color': 0, 'file': 0}
+PROP_CASTS = [str, int, float, convert_to_bool, int]
+
+
+# ------------------ RUNTIME ------------------
+
+# loads a room, compiling it first if the compiled file is missing or out of date. Bundled rooms (see bundle.py) are
+# used as they were compiled when the bundle was built, unless the bundle predates the current format (then the room is
+# loaded as if there were no bundle)
+def load_level(tmx_path):
+    compiled_path = get_compiled_path(tmx_path)
+    bundle = get_asset_bundle()
+    if bundle is not None and compiled_path in bundle:
+        buffer = bundle.get_bytes(compiled_path)
+        if read_header(buffer) is not None:
+            return CompiledLevel(compiled_path, tmx_path, buffer)
+        print(f'compiled_level: bundled {compiled_path} is not version {VERSION}, rebuild the bundle (python bundle.py)')
+    if not is_compiled_current(compiled_path):
+        compile_level(tmx_path, compiled_path)
+    return CompiledLevel(compiled_path, tmx_path)
+
+
+def get_compiled_path(tmx_path):
+    return os.path.splitext(tmx_path)[0] + '.lvl'
+
+
+# compiled file is current if every source file is unchanged. A changed mtime alone (e.g. file was re-saved or
+# checked out again) falls back to comparing content hashes before forcing a recompile
+def is_compiled_current(compiled_path):
+    if not os.path.exists(compiled_path):
+        return False
+    with open(compiled_path, 'rb') as file:
+        header = read_header(file.read(HEADER.size))
+        if header is None:
+            return False
+        file.seek(0)
+        data = file.read()
+
+    strings = read_strings(data, header[8], header[9])
+    base = os.path.dirname(compiled_path)
+    for i in range(header[6]):
+        path_i, mtime, size, digest = DEPENDENCY.unpack_from(data, header[7] + i * DEPENDENCY.size)
+        path = os.path.join(base, strings[path_i])
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_mtime_ns == mtime and stat.st_size == size:
+            continue
+        if stat.st_size != size or file_hash(path) != digest:
+            return False
+    return True
+
+
+# header fields of a compiled level, None if it is too short or of another format version
+def read_header(data):
+    if len(data) < HEADER.size:
+        return None
+    header = HEADER.unpack_from(data, 0)
+    if header[0] != MAGIC or header[1] != VERSION:
+        return None
+    return header
+
+
+def read_strings(data, count, offset):
+    strings = []
+    blob_start = offset + count * STRING.size
+    for i in range(count):
+        start, length = STRING.unpack_from(data, offset + i * STRING.size)
+        strings.append(bytes(data[blob_start + start:blob_start + start + length]).decode('utf-8'))
+    return strings
+
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).digest()
+
+
+# uint32 grid view over the mapped file. Big endian machines get a byteswapped copy instead of a view
+def uint32_view(buffer, offset, count, shape):
+    if count == 0:
+        return memoryview(array('I'))  # memoryview can not cast to an empty shape
+    view = memoryview(buffer)[offset:offset + count * 4]
+    if sys.byteorder == 'little':
+        return view.cast('I', shape)
+    values = array('I', view)
+    values.byteswap()
+    return memoryview(values).cast('B').cast('I', shape)
+
+
+def int32_view(buffer, offset, count, shape):
+    if count == 0:
+        return memoryview(array('i'))  # memoryview can not cast to an empty shape
+    view = memoryview(buffer)[offset:offset + count * 4]
+    if sys.byteorder == 'little':
+        return view.cast('i', shape)
+    values = array('i', view)
+    values.byteswap()
+    return memoryview(values).cast('B').cast('i', shape)
+
+
+# stands in for pytmx's TiledMap, exposing the parts of its interface used by Level
+class CompiledLevel:
+    def __init__(self, compiled_path, tmx_path, buffer=None):
+        self.filename = tmx_path
+        self.base_path = os.path.dirname(tmx_path)
+        self.buffer = buffer  # compiled file contents, mapped here unless given (e.g. a view into the asset bundle)
+        if buffer is None:
+            with open(compiled_path, 'rb') as file:
+                self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = read_header(self.buffer)
+        if header is None:
+            raise ValueError(f'{compiled_path} is not a version {VERSION} compiled level')
+        self.width, self.height, self.tilewidth, self.tileheight = header[2:6]
+        self.strings = read_strings(self.buffer, header[8], header[9])
+
+        # images are only resolved (and loaded) when a tile first asks for them
+        self.image_records = {}
+        for i in range(header[10]):
+            gid, source, x, y, w, h, trans = IMAGE.unpack_from(self.buffer, header[11] + i * IMAGE.size)
+            rect = (x, y, w, h) if w else None
+            self.image_records[gid] = (self.strings[source], rect, self.get_string(trans))
+        self.loaders = {}
+
+        # objects
+        self.objects_by_id = {}
+        self.objects_by_name = {}
+        objects = []
+        for i in range(header[14]):
+            record = OBJECT.unpack_from(self.buffer, header[15] + i * OBJECT.size)
+            properties = {}
+            for p in range(record[9], record[9] + record[10]):
+                key, value_type, value = PROPERTY.unpack_from(self.buffer, header[17] + p * PROPERTY.size)
+                properties[self.strings[key]] = PROP_CASTS[value_type](self.strings[value])
+            obj = CompiledObject(self, record, properties)
+            objects.append(obj)
+            self.objects_by_id[obj.id] = obj
+            self.objects_by_name[obj.name] = obj
+
+        # layers (in editor order)
+        self.layers = []
+        self.layernames = {}
+        for i in range(header[12]):
+            record = LAYER.unpack_from(self.buffer, header[13] + i * LAYER.size)
+            if record[2] == TILE_LAYER:
+                layer = CompiledTileLayer(self, record)
+            else:
+                layer = CompiledObjectLayer(self, record, objects[record[10]:record[10] + record[9]])
+            self.layers.append(layer)
+            self.layernames[layer.name] = layer
+
+    def get_string(self, index):
+        if index == NONE:
+            return None
+        return self.strings[index]
+
+    def get_layer_by_name(self, name):
+        try:
+            return self.layernames[name]
+        except KeyError:
+            raise ValueError(f'Layer "{name}" not found.')
+
+    def get_object_by_id(self, obj_id):
+        return self.objects_by_id[obj_id]
+
+    def get_object_by_name(self, name):
+        return self.objects_by_name[name]
+
+    # surfaces are cached globally so restarting a room (or sharing a tileset between rooms) reuses the same surface
+    # objects, which also keeps tile_cache hits working across Level instances
+    def get_tile_image_by_gid(self, gid):
+        if gid == 0:
+            return None
+        source, rect, trans = self.image_records[gid]
+        flags = decode_gid(gid)[1]
+        path = os.path.join(self.base_path, source)
+        key = (path, rect, flags)
+        if key not in tile_image_cache:
+            model = get_tile_model(path) if voxel_tiles else None
+            if model is not None:
+                # as many layers as the hand drawn stack so the model stands as tall (flip flags are not applied)
+                height = rect[3] if rect else load_image(path).get_height()
+                tile_image_cache[key] = load_voxel_model(model, tile_size, height // tile_size)
+            else:
+                if (path, trans) not in self.loaders:
+                    from pytmx.util_pygame import pygame_image_loader  # imported with the first tile, not at start-up
+                    self.loaders[(path, trans)] = pygame_image_loader(path, trans, image=load_image(path))
+                tile_image_cache[key] = self.loaders[(path, trans)](rect, flags)
+        return tile_image_cache[key]
+
+
+class CompiledTileLayer:
+    def __init__(self, parent, record):
+        self.parent = parent
+        (name, cls, kind, visible, px, py, width, height, data_offset, n_tiles, tiles_offset, n_colliders,
+         colliders_offset, n_walkable, walkable_offset, n_portals, portals_offset) = record
+        self.name = parent.strings[name]
+        self.type = parent.get_string(cls)
+        self.visible = bool(visible)
+        self.parallaxx = px
+        self.parallaxy = py
+        self.width = width
+        self.height = height
+        # views straight into the mapped file
+        self.data = uint32_view(parent.buffer, data_offset, width * height, (height, width))  # data[y, x] = tiled gid
+        self.locations = int32_view(parent.buffer, tiles_offset, n_tiles * 2, (n_tiles * 2,))  # flat x, y of non empty tiles
+        # solid tiles merged into rects, flat x, y, w, h (px, room space) (see tiles.Colliders)
+        self.colliders = int32_view(parent.buffer, colliders_offset, n_colliders * 4, (n_colliders * 4,))
+        # navigation mesh (NAVMESH_LAYER only), convex walkable rects as flat x, y, w, h (px) and the shared edges
+        # between them as flat rect a, rect b, x1, y1, x2, y2 (px)
+        self.walkable = int32_view(parent.buffer, walkable_offset, n_walkable * 4, (n_walkable * 4,))
+        self.portals = int32_view(parent.buffer, portals_offset, n_portals * 6, (n_portals * 6,))
+
+    def __iter__(self):
+        return self.iter_data()
+
+    def iter_data(self):
+        data = self.data
+        for x, y in zip(self.locations[0::2], self.locations[1::2]):
+            yield x, y, data[y, x]
+
+    # yields x, y, surface for each non empty tile (same as pytmx)
+    def tiles(self):
+        get_image = self.parent.get_tile_image_by_gid
+        data = self.data
+        for x, y in zip(self.locations[0::2], self.locations[1::2]):
+            yield x, y, get_image(data[y, x])
+
+
+class CompiledObjectLayer(list):
+    def __init__(self, parent, record, objects):
+        super().__init__(objects)
+        self.parent = parent
+        self.name = parent.strings[record[0]]
+        self.type = parent.get_string(record[1])
+        self.visible = bool(record[3])
+        self.parallaxx = record[4]
+        self.parallaxy = record[5]
+
+
+class CompiledObject:
+    def __init__(self, parent, record, properties):
+        self.parent = parent
+        self.id = record[0]
+        self.name = parent.get_string(record[1])
+        self.type = parent.get_string(record[2])
+        self.x, self.y, self.width, self.height, self.rotation = record[3:8]
+        self.gid = record[8]
+        self.properties = properties
+
+    @property
+    def image(self):
+        if self.gid:
+            return self.parent.get_tile_image_by_gid(self.gid)
+        return None
+
+    # custom properties are accessed as attributes, same as pytmx (e.g. obj.player_facing)
+    def __getattr__(self, item):
+        try:
+            return self.__dict__['properties'][item]
+        except KeyError:
+            raise AttributeError(f"Object '{self.__dict__.get('name')}' has no property {item}")
+
+
+# ------------------ COMPILER ------------------
+
+class LevelWriter:
+    def __init__(self):
+        self.strings = []
+        self.string_index = {}
+        self.images = []
+        self.layers = []
+        self.objects = []
+        self.properties = []
+        self.dependencies = []
+        self.blobs = bytearray()  # grids and collision data, appended after the tables
+
+    def string(self, value):
+        if value is None:
+            return NONE
+        value = str(value)
+        if value not in self.string_index:
+            self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return self.string_index[value]
+
+    # returns offset of data relative to the start of the blob section (aligned for uint32 views)
+    def blob(self, values):
+        while len(self.blobs) % 4:
+            self.blobs.append(0)
+        offset = len(self.blobs)
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.blobs += values.tobytes()
+        return offset
+
+    def to_bytes(self, width, height, tilewidth, tileheight):
+        tables = [
+            (len(self.dependencies), b''.join(DEPENDENCY.pack(*d) for d in self.dependencies)),
+            (len(self.strings), self.pack_strings()),
+            (len(self.images), b''.join(IMAGE.pack(*i) for i in self.images)),
+            (len(self.layers), None),  # layers hold blob offsets so are packed once the blob section is placed
+            (len(self.objects), b''.join(OBJECT.pack(*o) for o in self.objects)),
+            (len(self.properties), b''.join(PROPERTY.pack(*p) for p in self.properties)),
+        ]
+        layer_bytes = len(self.layers) * LAYER.size
+
+        # place tables after header
+        offsets = []
+        position = HEADER.size
+        for count, data in tables:
+            position += (-position) % 4
+            offsets.append(position)
+            position += layer_bytes if data is None else len(data)
+        blob_start = position + (-position) % 4
+
+        # shift layer blob offsets to absolute file offsets
+        layers = []
+        for record in self.layers:
+            record = list(record)
+            record[8] += blob_start
+            if record[2] == TILE_LAYER:
+                record[10] += blob_start
+                record[12] += blob_start
+                record[14] += blob_start
+                record[16] += blob_start
+            layers.append(LAYER.pack(*record))
+        tables[3] = (tables[3][0], b''.join(layers))
+
+        fields = [MAGIC, VERSION, width, height, tilewidth, tileheight]
+        for (count, data), offset in zip(tables, offsets):
+            fields += [count, offset]
+        out = bytearray(HEADER.pack(*fields))
+        for (count, data), offset in zip(tables, offsets):
+            out += bytes(offset - len(out))
+            out += data
+        out += bytes(blob_start - len(out))
+        out += self.blobs
+        return bytes(out)
+
+    def pack_strings(self):
+        table = bytearray()
+        blob = bytearray()
+        for value in self.strings:
+            encoded = value.encode('utf-8')
+            table += STRING.pack(len(blob), len(encoded))
+            blob += encoded
+        return bytes(table + blob)
+
+
+# writes the compiled room next to the tmx (or to compiled_path)
+def compile_level(tmx_path, compiled_path=None):
+    if compiled_path is None:
+        compiled_path = get_compiled_path(tmx_path)
+    base = os.path.dirname(compiled_path)
+    writer = LevelWriter()
+    dependencies = [tmx_path]
+
+    root = ElementTree.parse(tmx_path).getroot()
+    width = int(root.get('width'))
+    height = int(root.get('height'))
+    tilewidth = int(root.get('tilewidth'))
+    tileheight = int(root.get('tileheight'))
+
+    # -- tilesets -- gid: (image source relative to compiled file, rect, trans)
+    image_sources = {}
+    for tileset in root.findall('tileset'):
+        firstgid = int(tileset.get('firstgid'))
+        tileset_dir = os.path.dirname(tmx_path)
+        source = tileset.get('source')
+        if source:
+            path = os.path.normpath(os.path.join(tileset_dir, source))
+            dependencies.append(path)
+            tileset = ElementTree.parse(path).getroot()
+            tileset_dir = os.path.dirname(path)
+        read_tileset(tileset, firstgid, tileset_dir, base, image_sources)
+
+    # -- layers and objects (editor order, groups are flattened) --
+    used_gids = set()
+    templates = {}
+    for node in walk_layers(root):
+        name = writer.string(node.get('name'))
+        cls = writer.string(node.get('class'))
+        visible = int(node.get('visible', 1))
+        parallax = (float(node.get('parallaxx', 1)), float(node.get('parallaxy', 1)))
+
+        if node.tag == 'layer':
+            data_node = node.find('data')
+            grid = unpack_gids(data_node.text.strip(), data_node.get('encoding'), data_node.get('compression'))
+            layer_w = int(node.get('width'))
+            layer_h = int(node.get('height'))
+            gids = array('I', grid.astype('=u4').tobytes())  # rect merging below walks the grid cell by cell
+            filled = np.flatnonzero(grid)
+            locations = array('i', np.column_stack((filled % layer_w, filled // layer_w)).astype('=i4').tobytes())
+            used_gids.update(np.unique(grid[filled]).tolist())
+            colliders = merge_solid_rects(gids, layer_w, layer_h, tilewidth, tileheight)
+            walkable = array('i')
+            portals = array('i')
+            if node.get('name') == NAVMESH_LAYER:
+                walkable = merge_free_rects(gids, layer_w, layer_h, tilewidth, tileheight)
+                portals = find_portals(walkable)
+            writer.layers.append((name, cls, TILE_LAYER, visible, parallax[0], parallax[1], layer_w, layer_h,
+                                  writer.blob(gids), len(locations) // 2, writer.blob(locations),
+                                  len(colliders) // 4, writer.blob(colliders),
+                                  len(walkable) // 4, writer.blob(walkable), len(portals) // 6, writer.blob(portals)))
+
+        else:
+            first_object = len(writer.objects)
+            for obj in node.findall('object'):
+                attributes, properties = read_object(obj, os.path.dirname(tmx_path), templates, dependencies)
+                gid = int(attributes.get('gid', 0))
+                x = float(attributes.get('x', 0))
+                y = float(attributes.get('y', 0))
+                obj_width = float(attributes.get('width', 0))
+                obj_height = float(attributes.get('height', 0))
+                if gid:
+                    y -= obj_height  # tiled stores tile objects by their bottom left corner, pytmx shifts to top left
+                    used_gids.add(gid)
+                first_prop = len(writer.properties)
+                for key, (value_type, value) in properties.items():
+                    writer.properties.append((writer.string(key), PROP_TYPES.get(value_type, 0), writer.string(value)))
+                writer.objects.append((int(attributes['id']), writer.string(attributes.get('name')),
+                                       writer.string(attributes.get('class', attributes.get('type'))),
+                                       x, y, obj_width, obj_height, float(attributes.get('rotation', 0)), gid,
+                                       first_prop, len(writer.properties) - first_prop))
+            writer.layers.append((name, cls, OBJECT_LAYER, visible, parallax[0], parallax[1], 0, 0,
+                                  0, len(writer.objects) - first_object, first_object, 0, 0, 0, 0, 0, 0))
+
+    # -- images -- only gids that are actually used are stored
+    for gid in sorted(used_gids):
+        source, rect, trans = image_sources[gid & ~GID_MASK]
+        if rect is None:
+            rect = (0, 0, 0, 0)
+        writer.images.append((gid, writer.string(source), *rect, writer.string(trans)))
+
+    # -- dependencies --
+    for path in dependencies:
+        stat = os.stat(path)
+        writer.dependencies.append((writer.string(os.path.relpath(path, base)), stat.st_mtime_ns, stat.st_size,
+                                    file_hash(path)))
+
+    # write to temporary file first so a running game never maps a half written file
+    temp_path = compiled_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(writer.to_bytes(width, height, tilewidth, tileheight))
+    os.replace(temp_path, compiled_path)
+    return compiled_path
+
+
+# yields tile layers and object groups in editor order, descending into group layers
+def walk_layers(node):
+    for child in node:
+        if child.tag in ('layer', 'objectgroup'):
+            yield child
+        elif child.tag == 'group':
+            yield from walk_layers(child)
+
+
+# gid ordering matches pytmx's reload_images so gids resolve to the same tiles
+def read_tileset(tileset, firstgid, tileset_dir, base, image_sources):
+    tilewidth = int(tileset.get('tilewidth'))
+    tileheight = int(tileset.get('tileheight'))
+    spacing = int(tileset.get('spacing', 0))
+    margin = int(tileset.get('margin', 0))
+
+    image = tileset.find('image')
+    if image is not None:
+        source = os.path.relpath(os.path.join(tileset_dir, image.get('source')), base)
+        image_w = int(image.get('width'))
+        image_h = int(image.get('height'))
+        gid = firstgid
+        for y in range(margin, image_h + margin - tileheight + 1, tileheight + spacing):
+            for x in range(margin, image_w + margin - tilewidth + 1, tilewidth + spacing):
+                image_sources[gid] = (source, (x, y, tilewidth, tileheight), image.get('trans'))
+                gid += 1
+
+    # image collection tiles (e.g. sprite stacks) have their own image
+    for tile in tileset.findall('tile'):
+        tile_image = tile.find('image')
+        if tile_image is not None:
+            source = os.path.relpath(os.path.join(tileset_dir, tile_image.get('source')), base)
+            image_sources[firstgid + int(tile.get('id'))] = (source, None, tile_image.get('trans'))
+
+
+# returns object attributes and {name: (type, value)} properties with the object's template (if any) applied underneath
+def read_object(obj, tmx_dir, templates, dependencies):
+    attributes = {}
+    properties = {}
+    template = obj.get('template')
+    if template:
+        path = os.path.normpath(os.path.join(tmx_dir, template))
+        if path not in templates:
+            dependencies.append(path)
+            templates[path] = ElementTree.parse(path).getroot().find('object')
+        attributes.update(templates[path].items())
+        properties.update(read_properties(templates[path]))
+    attributes.update(obj.items())
+    properties.update(read_properties(obj))
+    return attributes, properties
+
+
+def read_properties(node):
+    properties = {}
+    for child in node.findall('properties'):
+        for prop in child.findall('property'):
+            value = prop.get('value')
+            if value is None:
+                value = prop.text or ''
+            properties[prop.get('name')] = (prop.get('type', 'string'), value)
+    return properties
+
+
+# merges solid tiles into rectangles: runs along each row, then identical runs on consecutive rows are joined
+# returns flat int32 array of x, y, w, h in pixels
+def merge_solid_rects(gids, width, height, tilewidth, tileheight):
+    open_rects = {}  # (start col, end col): [x, y, w, h] still growing downwards
+    rects = []
+    for y in range(height):
+        row_runs = []
+        x = 0
+        while x < width:
+            if gids[y * width + x]:
+                start = x
+                while x < width and gids[y * width + x]:
+                    x += 1
+                row_runs.append((start, x))
+            else:
+                x += 1
+
+        next_open = {}
+        for run in row_runs:
+            if run in open_rects:
+                rect = open_rects.pop(run)
+                rect[3] += tileheight
+            else:
+                rect = [run[0] * tilewidth, y * tileheight, (run[1] - run[0]) * tilewidth, tileheight]
+            next_open[run] = rect
+        rects += open_rects.values()
+        open_rects = next_open
+    rects += open_rects.values()
+
+    flat = array('i')
+    for rect in rects:
+        flat += array('i', rect)
+    return flat
+
+
+# decomposes the empty cells into rectangles (convex), greedily growing each from the first unused empty cell: as far
+# right as possible, then down while the whole row below is empty. Returns flat int32 array of x, y, w, h in pixels
+def merge_free_rects(gids, width, height, tilewidth, tileheight):
+    used = bytearray(width * height)
+    rects = array('i')
+    for y in range(height):
+        for x in range(width):
+            if gids[y * width + x] or used[y * width + x]:
+                continue
+            w = 1
+            while x + w < width and not gids[y * width + x + w] and not used[y * width + x + w]:
+                w += 1
+            h = 1
+            while y + h < height and not any(gids[(y + h) * width + x + i] or used[(y + h) * width + x + i]
+                                             for i in range(w)):
+                h += 1
+            for row in range(y, y + h):
+                used[row * width + x:row * width + x + w] = b'\x01' * w
+            rects += array('i', (x * tilewidth, y * tileheight, w * tilewidth, h * tileheight))
+    return rects
+
+
+# shared edges of touching rects (flat x, y, w, h), returns flat int32 array of rect a, rect b, x1, y1, x2, y2
+def find_portals(rects):
+    rects = [rects[i:i + 4] for i in range(0, len(rects), 4)]
+    portals = array('i')
+    for a, (ax, ay, aw, ah) in enumerate(rects):
+        for b in range(a + 1, len(rects)):
+            bx, by, bw, bh = rects[b]
+            if ax + aw == bx or bx + bw == ax:  # side by side, shared vertical edge
+                top, bottom = max(ay, by), min(ay + ah, by + bh)
+                if top < bottom:
+                    x = bx if ax + aw == bx else ax
+                    portals += array('i', (a, b, x, top, x, bottom))
+            elif ay + ah == by or by + bh == ay:  # stacked, shared horizontal edge
+                left, right = max(ax, bx), min(ax + aw, bx + bw)
+                if left < right:
+                    y = by if ay + ah == by else ay
+                    portals += array('i', (a, b, left, y, right, y))
+    return portals
+
+
+# precompile rooms, e.g. before building an executable: python compiled_level.py ../rooms/tiled_rooms/room_0.tmx
+if __name__ == '__main__':
+    for tmx in sys.argv[1:]:
+        print(f'compiled {tmx} -> {compile_level(tmx)}')
@@ -1,12 +1,17 @@
-import pygame, math
-from random import randint
-from game_data import tile_size, controller_map, screen_width, screen_height
-from support import get_angle_rad, rotate_point_deg, get_distance, lerp2D
+import pygame, math, copy, random
+import numpy as np
+from collections import deque
+from game_data import tile_size, controller_map, screen_width, screen_height, creature_navmesh
+from support import get_angle_rad, get_distance, lerp2D
+from systems import transform_points
+from camera import no_zoom
+from pathfinding import Lattice, DStarLite
 
 
 # SET UP FOR PLATFORMER SINCE PLATFORMERS ARE HARDER TO CREATE A PLAYER FOR
 class Creature(pygame.sprite.Sprite):
-    def __init__(self, level, spawn, segments, segment_spacing):
+    # rng is the creature's random stream (see replay.get_rng)
+    def __init__(self, level, spawn, segments, segment_spacing, rng=random):
         super().__init__()
         self.level = level
         self.surface = self.level.screen_surface
@@ -31,7 +36,7 @@ class Creature(pygame.sprite.Sprite):
         self.corner_correction = 8  # tolerance for correcting player on edges of tiles (essentially rounded corners)
 
         # - Brain -
-        self.brain = Brain(self.head, self.level)
+        self.brain = Brain(self.head, self.level, rng)
 
         # - Visuals -
         self.outline_curve_segments = 3
@@ -123,62 +128,50 @@ class Creature(pygame.sprite.Sprite):
         else:
             self.fabrik_forwards(target)
 
-    def apply_rotation(self, rot_value, origin):
-        # only rotate if required
-        if rot_value != 0:
-            # rotate target
-            self.brain.target = rotate_point_deg(self.brain.target, origin, rot_value)
-            # rotate pathfinding
-            path = self.brain.path
-            for node in range(len(path)):
-                path[node] = rotate_point_deg(path[node], origin, rot_value)
-
-            # rotate body segments and their legs
-            for i in range(len(self.segments)):
-                self.segments[i].set_pos(rotate_point_deg(self.segments[i].get_pos(), origin, rot_value))
-                # if has legs, rotate legs
-                if self.segments[i].has_legs:
-                    for legpair in self.segments[i].legs:
-                        # rotate feet targets
-                        for foot in range(len(legpair.feet)):
-                            legpair.feet[foot] = rotate_point_deg(legpair.feet[foot], origin, rot_value)
-                        # rotate leg joints
-                        for appendage in legpair.legs:
-                            appendage.target = rotate_point_deg(appendage.target, origin, rot_value)
-                            for joint in range(len(appendage.joints)):
-                                appendage.joints[joint] = rotate_point_deg(appendage.joints[joint], origin, rot_value)
-
-    def apply_scroll(self, scroll_value):
-        # only scroll if required
-        if scroll_value != [0, 0]:
-            # scroll target
-            self.brain.target = [self.brain.target[0] - scroll_value[0],
-                                 self.brain.target[1] - scroll_value[1]]
-            # scroll path
-            path = self.brain.path
-            for node in range(len(path)):
-                path[node] = (path[node][0] - scroll_value[0],
-                              path[node][1] - scroll_value[1])
-
-            # scroll body segments and legs and their targets
-            for seg in range(len(self.segments)):
-                self.segments[seg].set_pos([self.segments[seg].get_pos()[0] - scroll_value[0],
-                                            self.segments[seg].get_pos()[1] - scroll_value[1]])
-                if self.segments[seg].has_legs:
-                    for legpair in self.segments[seg].legs:
-                        # rotate feet targets
-                        for foot in range(len(legpair.feet)):
-                            legpair.feet[foot] = [legpair.feet[foot][0] - scroll_value[0],
-                                                  legpair.feet[foot][1] - scroll_value[1]]
-                        # rotate leg joints
-                        for appendage in legpair.legs:
-                            appendage.target = [appendage.target[0] - scroll_value[0],
-                                                appendage.target[1] - scroll_value[1]]
-                            for joint in range(len(appendage.joints)):
-                                appendage.joints[joint] = [appendage.joints[joint][0] - scroll_value[0],
-                                                           appendage.joints[joint][1] - scroll_value[1]]
-
-    def update(self, tiles, rot_value, dt, origin, scroll_value):  #, current_spawn):
+    # the creature's points (body, legs, brain target and path) are not entities, they are moved with the camera here
+    # using the same transform as the camera systems. Scroll is applied before rotation, as it is for entities
+    def apply_camera(self, scroll_value, rot_value, origin):
+        # only transform if required
+        if rot_value == 0 and scroll_value[0] == 0 and scroll_value[1] == 0:
+            return
+
+        # gather every point (order matters, points are scattered back in the same order)
+        brain = self.brain
+        points = [brain.target] + list(brain.path)
+        for seg in self.segments:
+            points.append(seg.get_pos())
+            if seg.has_legs:
+                for legpair in seg.legs:
+                    points += legpair.feet
+                    for appendage in legpair.legs:
+                        points.append(appendage.target)
+                        points += appendage.joints
+
+        points = transform_points(points, scroll_value, rot_value, origin)
+
+        # scatter
+        brain.target = points[0]
+        i = 1
+        for node in range(len(brain.path)):
+            brain.path[node] = tuple(points[i])
+            i += 1
+        for seg in self.segments:
+            seg.set_pos(points[i])
+            i += 1
+            if seg.has_legs:
+                for legpair in seg.legs:
+                    for foot in range(len(legpair.feet)):
+                        legpair.feet[foot] = points[i]
+                        i += 1
+                    for appendage in legpair.legs:
+                        appendage.target = points[i]
+                        i += 1
+                        for joint in range(len(appendage.joints)):
+                            appendage.joints[joint] = points[i]
+                            i += 1
+
+    # camera scroll and rotation are applied after the update (see apply_camera)
+    def update(self, tiles, dt):  #, current_spawn):
 
         # respawns player if respawn has been evoked
         #if self.respawn:
@@ -204,11 +197,6 @@ class Creature(pygame.sprite.Sprite):
             else:
                 self.segments[i].update(tiles, angle)
 
-        # - update world -
-        # scroll and rotation shouldn't have collision applied, it is separate movement
-        self.apply_rotation(rot_value, origin)
-        self.apply_scroll(scroll_value)
-
 # -- visual methods --
 
     # returns array of points from body segs to be drawn as a polygon using in built pygame method
@@ -259,15 +247,46 @@ class Creature(pygame.sprite.Sprite):
         # TODO: sort points clockwise order to avoid breaking up of silhoutte
         return polygon
 
-    def draw(self, dev):
+    # screen area the creature is drawn to (body, feet and legs), for dirty rectangle rendering
+    def get_rect(self):
+        points = []
+        margin = 4  # foot radius
+        for seg in self.segments:
+            points.append(seg.get_pos())
+            margin = max(margin, seg.get_radius())
+            if seg.has_legs:
+                for legpair in seg.legs:
+                    points += legpair.feet
+                    for appendage in legpair.legs:
+                        points += appendage.joints
+                        margin = max(margin, appendage.line_weight)
+        points = np.array(points, dtype=np.float64)
+        left, top = np.floor(points.min(axis=0)) - margin - 1
+        right, bottom = np.ceil(points.max(axis=0)) + margin + 1
+        return pygame.Rect(int(left), int(top), int(right - left), int(bottom - top))
+
+    # copy of what draw and get_rect read (segments, legs, brain path and target), so a finished frame can be drawn while
+    # the creature moves on (see pipeline.py)
+    def snapshot(self):
+        creature = copy.copy(self)
+        creature.segments = [segment.snapshot() for segment in self.segments]
+        creature.head = creature.segments[0]
+        creature.brain = copy.copy(self.brain)
+        creature.brain.path = list(self.brain.path)
+        creature.brain.target = list(self.brain.target)
+        return creature
+
+    # view applies the camera zoom (see camera.View)
+    def draw(self, dev, view=no_zoom):
         for segment in self.segments:
-            segment.draw(dev)
+            segment.draw(dev, view)
 
         if dev:
-            for i in range(1, len(self.brain.path)):
-                pygame.draw.line(self.surface, "red", self.brain.path[i-1], self.brain.path[i], 1)
+            path = view.points(self.brain.path)
+            for i in range(1, len(path)):
+                pygame.draw.line(self.surface, "red", path[i-1], path[i], 1)
 
-        pygame.draw.polygon(self.surface, "orange", self.get_body_polygon(), 0)
+        pygame.draw.polygon(self.surface, "orange", view.points(self.get_body_polygon()), 0)
 
 
 # --------- BODY ---------
@@ -317,15 +336,12 @@ class BodySegment(pygame.sprite.Sprite):
 
     # --- COLLISIONS ---
 
+    # tiles is a TileLayer, pushed out of its baked colliders back towards where seg came from
     def collision(self, tiles):
-        for tile in tiles:
-            distance = get_distance(self.pos, tile.hitbox.center)
-            if distance - (tile.radius + self.radius) < 0:
-                angle = get_angle_rad(self.pos, self.prev_pos)  # angle to move back towards where seg came from
-                self.hitbox.centerx += math.sin(angle) * (tile.radius + self.radius - distance + 1)
-                self.hitbox.centery += math.cos(angle) * (tile.radius + self.radius - distance + 1)
-
-                self.pos = [self.hitbox.centerx, self.hitbox.centery]
+        pos = tiles.collide_circle(self.pos, self.prev_pos, self.radius)
+        if pos is not None:
+            self.hitbox.center = pos
+            self.pos = [self.hitbox.centerx, self.hitbox.centery]
 
     '''# checks collision for a given hitbox against given tiles on the x
     def collision_x(self, tiles):
@@ -414,19 +430,27 @@ class BodySegment(pygame.sprite.Sprite):
 
         self.prev_pos = self.pos  # store current pos in prev_pos ready for next frame
 
-    def draw(self, dev):
+    def snapshot(self):
+        segment = copy.copy(self)
+        segment.pos = list(self.pos)
+        if self.has_legs:
+            segment.legs = [legpair.snapshot() for legpair in self.legs]
+        return segment
+
+    def draw(self, dev, view=no_zoom):
         # -- feet --
         if self.has_legs:
             for leg in self.legs:
-                leg.draw(dev)
+                leg.draw(dev, view)
 
         # -- body --
         if dev:
+            pos = view.point(self.pos)
             if self.head:
-                pygame.draw.circle(self.surface, 'purple', self.pos, 3)
+                pygame.draw.circle(self.surface, 'purple', pos, 3)
             else:
-                pygame.draw.circle(self.surface, 'green', self.pos, 1)
-            pygame.draw.circle(self.surface, 'orange', self.pos, self.radius, 1)
+                pygame.draw.circle(self.surface, 'green', pos, 1)
+            pygame.draw.circle(self.surface, 'orange', pos, view.length(self.radius), 1)
 
             #pygame.draw.rect(self.surface, 'grey', self.hitbox, 1)  # TODO TESTING hitbox
 
@@ -434,7 +458,7 @@ class BodySegment(pygame.sprite.Sprite):
             x = math.sin(self.rot) * 12
             y = math.cos(self.rot) * 12
             epos = (self.pos[0] + x, self.pos[1] + y)
-            pygame.draw.line(self.surface, 'red', self.pos, epos, 1)
+            pygame.draw.line(self.surface, 'red', pos, view.point(epos), 1)
 
 
 class LegPair:
@@ -488,10 +512,9 @@ class LegPair:
         # pos == prev pos but with x coordinate changed ready for collision testing
         pos = [new_pos[0], prev_pos[1]]
         # -- X Collisions --
-        for tile in tiles:
-            if tile.hitbox.collidepoint(pos):
-                # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
-                return prev_pos[0]
+        if tiles.collidepoint(pos):
+            # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
+            return prev_pos[0]
         # if not inside tile, return x of new position
         return new_pos[0]
 
@@ -499,10 +522,9 @@ class LegPair:
         # pos == prev pos but with x coordinate changed ready for collision testing
         pos = [prev_pos[0], new_pos[1]]
         # -- X Collisions --
-        for tile in tiles:
-            if tile.hitbox.collidepoint(pos):
-                # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
-                return prev_pos[1]
+        if tiles.collidepoint(pos):
+            # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
+            return prev_pos[1]
         # if not inside tile, return x of new position
         return new_pos[1]
 
@@ -584,14 +606,20 @@ class LegPair:
         for i in range(len(self.legs)):
             self.legs[i].update(self.anchor, self.feet[i])
 
-    def draw(self, dev):
+    def snapshot(self):
+        legpair = copy.copy(self)
+        legpair.feet = [list(foot) for foot in self.feet]
+        legpair.legs = [appendage.snapshot() for appendage in self.legs]
+        return legpair
+
+    def draw(self, dev, view=no_zoom):
         # ------------ FEET ---------------
-        pygame.draw.circle(self.surface, 'blue', self.feet[0], 4)
-        pygame.draw.circle(self.surface, 'blue', self.feet[1], 4)
+        pygame.draw.circle(self.surface, 'blue', view.point(self.feet[0]), view.length(4))
+        pygame.draw.circle(self.surface, 'blue', view.point(self.feet[1]), view.length(4))
 
         # ----------- LEG SEGMENTS -------------
         for leg in self.legs:
-            leg.draw(dev)
+            leg.draw(dev, view)
 
 
 class Appendage:
@@ -643,10 +671,9 @@ class Appendage:
         # pos == prev pos but with x coordinate changed ready for collision testing
         pos = [new_pos[0], prev_pos[1]]
         # -- X Collisions --
-        for tile in tiles:
-            if tile.hitbox.collidepoint(pos):
-                # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
-                return prev_pos[0]
+        if tiles.collidepoint(pos):
+            # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
+            return prev_pos[0]
         # if not inside tile, return x of new position
         return new_pos[0]
 
@@ -654,10 +681,9 @@ class Appendage:
         # pos == prev pos but with x coordinate changed ready for collision testing
         pos = [prev_pos[0], new_pos[1]]
         # -- X Collisions --
-        for tile in tiles:
-            if tile.hitbox.collidepoint(pos):
-                # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
-                return prev_pos[1]
+        if tiles.collidepoint(pos):
+            # if inside tile, return x of prev position (ASSUMES DOESNT START IN TILE)
+            return prev_pos[1]
         # if not inside tile, return x of new position
         return new_pos[1]
 
@@ -744,11 +770,18 @@ class Appendage:
         self.target = target
         self.solve_joints()
 
-    def draw(self, dev):
+    def snapshot(self):
+        appendage = copy.copy(self)
+        appendage.joints = [list(joint) for joint in self.joints]
+        return appendage
+
+    def draw(self, dev, view=no_zoom):
+        joints = view.points(self.joints)
+        line_weight = view.length(self.line_weight)
         # skip anchor joint
-        for i in range(1, len(self.joints)):
-            joint = self.joints[i]
-            pygame.draw.line(self.surface, 'black', self.joints[i - 1], joint, self.line_weight)
+        for i in range(1, len(joints)):
+            joint = joints[i]
+            pygame.draw.line(self.surface, 'black', joints[i - 1], joint, line_weight)
 
             if dev:
                 pygame.draw.circle(self.surface, 'pink', joint, 2)
@@ -757,152 +790,87 @@ class Appendage:
 # --------- BRAIN ---------
 
 class Brain:
-    def __init__(self, head_segment, level):
+    def __init__(self, head_segment, level, rng=random):
         self.head = head_segment
         self.level = level
+        self.rng = rng  # draws targets
 
         # -- pathfinding --
         self.target = self.head.get_pos()
-        self.path = [self.head.get_pos()]  # start path as current position (no target yet defined). Len must be > 0
+        self.path = deque([self.head.get_pos()])  # start path as current position (no target yet defined). Len must be > 0
         self.path_precision = 10  # 15 !!!!! diagonal should be less than tile size !!!!!
         self.path_reset = 120  # every 300 frames if not reached target, re-evalutate (may be integrated into states, i.e roaming)
         self.path_timer = 0
         self.view_rad = 150  # maximum displacement from creature head pos that target can be generated
+        self.use_navmesh = creature_navmesh  # plan over the level's navmesh, else D* Lite over a lattice
+        self.lattice = None  # walkable nodes path_precision apart (rebuilt when path_precision changes)
+        self.planner = None  # D* Lite search towards the current target
+        self.path_failures = 0  # targets no path was found to (see sweep.py)
 
     # -- calculate propeties --
 
-    # pathfinding algorithm
+    # plans from the head to the target with D* Lite on a lattice in room space (see pathfinding.py). The planner is
+    # kept while the target stays the same, so replanning after the head has moved only repairs the previous search.
+    # Returns the path in screen space (excluding the head's node, ending with the target), empty if unreachable
     def pathfind(self, tiles):
-        # TODO simplify code
-        target_rect = pygame.Rect((self.target[0] - self.path_precision // 2, self.target[1] - self.path_precision // 2),
-                                  (self.path_precision, self.path_precision))
-        # neighbours includes cardinal and diagonal neighbours
-        neighbours = [(self.path_precision, 0),
-                      (0, self.path_precision),
-                      (-self.path_precision, 0),
-                      (0, -self.path_precision),
-                      (self.path_precision, self.path_precision),
-                      (self.path_precision, -self.path_precision),
-                      (-self.path_precision, self.path_precision),
-                      (-self.path_precision, -self.path_precision)]
-        start = (int(self.head.get_pos()[0]), int(self.head.get_pos()[1]))
-        # for open and closed dicts: {(xpos, ypos): nodeInstance}
-        open = {start: PathNode(start, 0, start, self.target)}  # nodes to be evaluated (initally only contains starting node)
-        closed = {}  # nodes that have been evaluated
-
-        run = True
-        while run:
-            # if open is empty, indicates no possible path can be found. Generate new target
-            if not open.keys():
-                return []
-
-            # find node with lowest f cost in open
-            current_node = open[list(open.keys())[0]]
-            for node in open.keys():
-                # if node has better f cost than current node or (the f costs are the same but
-                # the h cost is better), set to current
-                if open[node].get_f() < current_node.get_f() or (open[node].get_f() == current_node.get_f() and open[node].get_h() < current_node.get_h()):
-                    current_node = open[node]
-
-            current_pos = current_node.get_pos()
-            # update dicts
-            closed[current_pos] = current_node  # add node to closed
-            del open[current_pos]  # remove node from open
-
-            # if not the target, check through all the neighbouring positions
-            for i in neighbours:
-                # find adjacent coordinate
-                neighbour_pos = (int(current_pos[0] + i[0]), int(current_pos[1] + i[1]))
-
-                # check node is not already in closed before looping over tiles, if it is skip to next neighbour
-                if neighbour_pos not in closed.keys():
-
-                    # ends when neighbour is in target hitbox (prevents path overshoot and also prevents hanging bug
-                    # where no neighbour can be both in the hitbox and not in a tile).
-                    if target_rect.collidepoint(neighbour_pos):
-                        run = False
-
-                    # checks if neighbour is traversable or not, if not skip to next neighbour
-                    traversable = True
-                    for tile in tiles:
-                        if tile.hitbox.collidepoint(neighbour_pos):
-                            traversable = False
-                            break
-                    if traversable:
-                        neighbour_g = current_node.get_g() + self.path_precision  # increases g one node further along path
-                        # if it is either not in open or path to neighbour is shorter (based on g cost), add to open
-                        if neighbour_pos not in open.keys() or neighbour_g < open[neighbour_pos].get_g():
-                            # set/update node in open
-                            open[neighbour_pos] = PathNode(neighbour_pos, neighbour_g, start, self.target, current_node)
-
-        # -- Return full path --
-        node = closed[current_pos]
-        path = [self.target]
-        # keep adding parent positions to path until start node is reached. Follow path using parents
-        # does not include start node position (already there)
-        while node.get_pos() != start:
-            path.append(node.get_pos())
-            node = node.get_parent()
-        # exit loop with the full path (reversed so the start is at the start and the target is at the end)
-        path.reverse()
-
-        # return path
+        level = self.level
+        if self.use_navmesh:
+            return self.pathfind_navmesh()
+        if self.lattice is None or self.lattice.spacing != self.path_precision:
+            self.lattice = Lattice(level.solid, tile_size, self.path_precision)
+            self.planner = None
+        start = self.lattice.get_free_node(level.get_room_pos(self.head.get_pos()))
+        goal = self.lattice.get_free_node(level.get_room_pos(self.target))
+        if start is None or goal is None:
+            return deque()
+
+        if self.planner is None or self.planner.goal != goal:
+            self.planner = DStarLite(self.lattice, start, goal)
+        else:
+            self.planner.move_start(start)
+        nodes = self.planner.get_path()[1:]  # does not include start node position (already there)
+        if not nodes and start != goal:
+            return deque()
+
+        path = deque()
+        if nodes:
+            path.extend(map(tuple, level.get_screen_points([self.lattice.get_pos(node) for node in nodes]).tolist()))
+        path.append(tuple(self.target))
         return path
 
-    # finds a new target then solves a path to that target
+    # plans from the head to the target over the level's navmesh (see pathfinding.NavMesh), corners are kept the head's
+    # radius away from walls. Replanning is a fresh search, it only visits tens of rects
+    def pathfind_navmesh(self):
+        level = self.level
+        start = level.get_room_pos(self.head.get_pos())
+        goal = level.get_room_pos(self.target)
+        points = level.navmesh.find_path(start, goal, self.head.radius)[1:-1]  # start and goal are the screen positions
+        if not points and level.navmesh.locate(start) != level.navmesh.locate(goal):
+            return deque()
+
+        path = deque()
+        if points:
+            path.extend(map(tuple, level.get_screen_points(points).tolist()))
+        path.append(tuple(self.target))
+        return path
+
+    # finds a new target then solves a path to that target. Targets are drawn from the level's free space index so
+    # they are always inside the room and not inside a tile (bounded time, no retries)
     def find_target(self, tiles):
         head_pos = self.head.get_pos()
-        bounds = self.level.room_corners
-        # ⌜
-        tl_tr_angle = get_angle_rad(bounds[0], bounds[1])  # topleft corner to topright corner angle
-        tl_bl_angle = get_angle_rad(bounds[0], bounds[3])  # topleft corner to bottomleft corner angle
-        if tl_tr_angle < tl_bl_angle:
-            tl_tr_angle += 2 * math.pi  # for comparison, tl_tr must be the larger so increase by revolution
-        # ⌟
-        br_bl_angle = get_angle_rad(bounds[2], bounds[3])  # bottomright corner to bottomleft corner angle
-        br_tr_angle = get_angle_rad(bounds[2], bounds[1])  # bottomright corner to topright corner angle
-        if br_bl_angle < br_tr_angle:
-            br_bl_angle += 2 * math.pi  # for comparison, br_bl must be the larger so increase by revolution
-
-        # generate within certain radius from head
-        self.target = (head_pos[0] + randint(-self.view_rad, self.view_rad),
-                       head_pos[1] + randint(-self.view_rad, self.view_rad))
-
-        # continue to randomly generate point until point not in a tile and within room
-        repeat = True
-        while repeat:
-            repeat = False  # assume no repeat required until proven neccessary
-
-            # get and adjust angles to point
-            a1 = get_angle_rad(bounds[0], self.target)
-            if a1 < tl_bl_angle:
-                a1 += 2 * math.pi  # must be between two angles for comparison
-            a2 = get_angle_rad(bounds[2], self.target)
-            if a2 < br_tr_angle:
-                a2 += 2 * math.pi
-
-            # check target inside roomz
-            if not tl_tr_angle >= a1 >= tl_bl_angle or \
-               not br_bl_angle >= a2 >= br_tr_angle:
-                repeat = True  # needs to be randomised and tested again
-
-            # if inside room, check not inside tile
-            else:
-                for tile in tiles:
-                    if tile.hitbox.collidepoint(self.target):
-                        repeat = True  # needs to be randomised and tested again
-                        break
-
-            # if repeat is required, randomise target for next iteration
-            if repeat:
-                self.target = (head_pos[0] + randint(-self.view_rad, self.view_rad),
-                               head_pos[1] + randint(-self.view_rad, self.view_rad))
+        target = self.level.free_space.sample(self.level.get_room_pos(head_pos), self.view_rad, self.rng)
+        if target is None:
+            self.target = [head_pos[0], head_pos[1]]  # nowhere to go, try again next frame
+        else:
+            self.target = tuple(self.level.get_screen_points([target])[0].tolist())
 
         # find path to new target
+        self.path_timer = 0
         self.path = self.pathfind(tiles)
         # if no path can be found, will return empty path. Set target to head and try find target again next frame
         if not self.path:
-            self.path = [head_pos]  # path is head
+            self.path_failures += 1
+            self.path = deque([head_pos])  # path is head
             self.target = [head_pos[0], head_pos[1]]  # target is head
 
     # -- getters and setters --
@@ -914,53 +882,18 @@ class Brain:
     def update(self, tiles):
         self.path_timer += 1
 
-        # find target, if target has been collected or reset time exceeded
+        # find target, if target has been collected
         # TODO integrate path reset into creature state machine (i.e. roaming)
-        if self.head.hitbox.collidepoint(self.target) or self.path_timer >= self.path_reset:
-            self.path_timer = 0
+        if self.head.hitbox.collidepoint(self.target):
             self.find_target(tiles)
+        # re-evaluate the path to the same target from where the head is now (repairs the kept search)
+        elif self.path_timer >= self.path_reset:
+            self.path_timer = 0
+            path = self.pathfind(tiles)
+            if path:
+                self.path = path
+            else:
+                self.find_target(tiles)
         # if target not reached shorten path to target as path points are reached
-        elif self.head.hitbox.collidepoint(self.path[0]):
-            self.path = self.path[1:]
-
-
-class PathNode:
-    def __init__(self, pos, g_cost, start, target, parent=None):
-        # position
-        self.pos = pos
-
-        # points
-        self.start = start
-        self.target = target
-
-        # parents and children
-        self.parent = parent
-        self.children = []
-
-        # costs
-        self.g = g_cost  # distance from node to start node (not counting this node)
-        self.h = int(get_distance(self.pos, target))  # distance from node to target node (not counting this node)
-        self.f = self.g + self.h
-
-    # -- getters and setters --
-
-    def get_pos(self):
-        return self.pos
-
-    def get_g(self):
-        return self.g
-
-    def get_h(self):
-        return self.h
-
-    def get_f(self):
-        return self.f
-
-    def get_parent(self):
-        return self.parent
-
-    def get_children(self):
-        return self.children
-
-    def add_child(self, node):
-        self.children.append(node)
\ No newline at end of file
+        elif len(self.path) > 1 and self.head.hitbox.collidepoint(self.path[0]):
+            self.path.popleft()
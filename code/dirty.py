@@ -0,0 +1,61 @@
+# dirty rectangle rendering for frames where the camera does not move. While scroll, rotation and zoom are unchanged the
+# layers behind the moving entities are identical every frame, so they are drawn once into a cached composite and each
+# frame only the regions moving entities (and UI) covered last frame or cover this frame are restored from it and redrawn.
+# Any camera change (or a forced invalidate, e.g. pause, dev tools) falls back to a full redraw for that frame.
+class DirtyRenderer:
+    def __init__(self, surface, background_colour):
+        self.surface = surface
+        self.background_colour = background_colour
+        self.background = None  # static composite, valid while the camera is still
+        self.previous = []  # regions drawn to last frame, restored this frame
+        self.rects = []  # regions changed this frame
+        self.full = True  # whole screen redrawn this frame
+
+    # drop the cached composite, the next frame is a full redraw
+    def invalidate(self):
+        self.background = None
+
+    # starts a frame, draw_background draws everything behind the moving entities. Moving entity bounds for this frame
+    # must be passed in (rects), returns whether this is a full redraw
+    def begin(self, static, draw_background, rects):
+        if not static:
+            self.background = None
+        if self.background is None:
+            self.full = True
+            self.surface.fill(self.background_colour)
+            draw_background()
+            if static:
+                self.background = self.surface.copy()
+        else:
+            self.full = False
+            self.rects = merge_rects(self.previous + rects)
+            for rect in self.rects:
+                self.surface.blit(self.background, rect, rect)
+        self.previous = list(rects)
+        return self.full
+
+    # regions drawn to after begin that are not entity bounds (UI), restored next frame
+    def mark(self, rect):
+        self.previous.append(rect)
+        if not self.full:
+            self.rects.append(rect)
+
+    # clip areas for redrawing static layers in front of the moving entities (only within dirty regions)
+    def get_clip_rects(self):
+        return [None] if self.full else self.rects
+
+    # rects to pass to the display update, None for the whole screen
+    def get_update_rects(self):
+        return None if self.full else self.rects
+
+
+# unions overlapping rects so overlapping regions (e.g. an entity's last and current bounds, a flock) are redrawn once
+def merge_rects(rects):
+    merged = []
+    for rect in rects:
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect = rect.union(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
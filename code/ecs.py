@@ -0,0 +1,142 @@
+import numpy as np
+
+
+# entity component system storage. Entities are integer ids. Every entity belongs to one archetype (a fixed set of
+# components) and its components are a row in that archetype's NumPy arrays, so systems (see systems.py) process
+# every entity of an archetype with one vectorised operation instead of a Python method call per object.
+# Game classes (tiles, triggers, spawns, player, boids) are thin facades (Entity) that hold an entity id and read and
+# write their row, so adding a new entity type adds rows, not per-object update dispatch.
+class Registry:
+    def __init__(self):
+        self.archetypes = {}  # {archetype name: Archetype}
+        self.locations = {}  # {entity id: (Archetype, row)}
+        self.next_entity = 0
+
+    # components are name=(dtype, width), width 1 stores a scalar per entity. Registering again returns the existing
+    # archetype (components must match)
+    def register(self, name, **components):
+        if name in self.archetypes:
+            archetype = self.archetypes[name]
+            if archetype.components != components:
+                raise ValueError(f"Archetype '{name}' already registered with different components")
+            return archetype
+        archetype = Archetype(name, components)
+        self.archetypes[name] = archetype
+        return archetype
+
+    # adds an entity to a registered archetype, missing components are zero. Returns the entity id
+    def create(self, archetype_name, **values):
+        archetype = self.archetypes[archetype_name]
+        entity = self.next_entity
+        self.next_entity += 1
+        row = archetype.add(entity, values)
+        self.locations[entity] = (archetype, row)
+        return entity
+
+    def destroy(self, entity):
+        archetype, row = self.locations.pop(entity)
+        moved = archetype.remove(row)
+        # last row was moved into the removed row to keep arrays dense
+        if moved is not None:
+            self.locations[moved] = (archetype, row)
+
+    # returns a view of the entity's component (writes go straight to the array), scalars are returned by value
+    def get(self, entity, component):
+        archetype, row = self.locations[entity]
+        return archetype.columns[component][row]
+
+    def set(self, entity, component, value):
+        archetype, row = self.locations[entity]
+        archetype.columns[component][row] = value
+
+    # archetypes that have every given component, only those named if names are given
+    def query(self, *components, names=None):
+        archetypes = self.archetypes.values() if names is None else \
+            [self.archetypes[name] for name in names if name in self.archetypes]
+        return [archetype for archetype in archetypes
+                if archetype.count and all(c in archetype.columns for c in components)]
+
+    # copy of the named archetypes (every archetype if none are named), so a finished frame can be read while this
+    # registry moves on. Facades read the copy when their registry is swapped for it (see pipeline.py)
+    def snapshot(self, *names):
+        registry = Registry()
+        registry.next_entity = self.next_entity
+        for name in names or list(self.archetypes):
+            archetype = registry.archetypes[name] = self.archetypes[name].snapshot()
+            registry.locations.update((entity, (archetype, row)) for row, entity in enumerate(archetype.entities.tolist()))
+        return registry
+
+
+class Archetype:
+    def __init__(self, name, components):
+        self.name = name
+        self.components = components
+        self.count = 0  # rows in use, arrays are over allocated and grown by doubling
+        self.capacity = 16
+        self.entities = np.zeros(self.capacity, dtype=np.int64)  # entity id of each row
+        self.columns = {}
+        for component, (dtype, width) in components.items():
+            shape = (self.capacity,) if width == 1 else (self.capacity, width)
+            self.columns[component] = np.zeros(shape, dtype=dtype)
+
+    def grow(self):
+        self.capacity *= 2
+        self.entities = np.resize(self.entities, self.capacity)
+        for component, column in self.columns.items():
+            grown = np.zeros((self.capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.columns[component] = grown
+
+    def add(self, entity, values):
+        if self.count == self.capacity:
+            self.grow()
+        row = self.count
+        self.count += 1
+        self.entities[row] = entity
+        for component, column in self.columns.items():
+            column[row] = values.get(component, 0)
+        return row
+
+    # swap removes row, returns the entity moved into row (None if row was the last)
+    def remove(self, row):
+        self.count -= 1
+        if row == self.count:
+            return None
+        self.entities[row] = self.entities[self.count]
+        for column in self.columns.values():
+            column[row] = column[self.count]
+        return int(self.entities[row])
+
+    # dense view of a component over every entity in the archetype (invalidated when the archetype grows)
+    def view(self, component):
+        return self.columns[component][:self.count]
+
+    # copy of the rows in use (see Registry.snapshot)
+    def snapshot(self):
+        archetype = Archetype(self.name, {})
+        archetype.components = self.components
+        archetype.count = archetype.capacity = self.count
+        archetype.entities = self.entities[:self.count].copy()
+        archetype.columns = {component: column[:self.count].copy() for component, column in self.columns.items()}
+        return archetype
+
+
+# base class for facades, subclasses expose components with component()
+class Entity:
+    def __init__(self, registry, archetype_name, **values):
+        self.registry = registry
+        self.entity = registry.create(archetype_name, **values)
+
+    def get_row(self):
+        return self.registry.locations[self.entity][1]
+
+
+# class attribute exposing an entity component, e.g. pos = component('pos')
+def component(name):
+    def getter(self):
+        return self.registry.get(self.entity, name)
+
+    def setter(self, value):
+        self.registry.set(self.entity, name, value)
+
+    return property(getter, setter)
@@ -0,0 +1,182 @@
+import pygame, sys, time, copy, weakref, random
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from ecs import Registry
+from boids import Flock, get_boid_rects, draw_boids, draw_predator
+from systems import scroll_system, rotation_system
+from camera import no_zoom
+
+# worker processes are forked, spawning would re-run main.py (it is not import guarded)
+can_fork = 'fork' in multiprocessing.get_all_start_methods()
+
+# published boid state, one row per boid then one for the predator: pos x, pos y, vel x, vel y, heading
+state_width = 5
+
+
+# runs a Flock in its own process so several flocks update on separate cores, in parallel with the main process. The
+# worker owns the simulation (a Flock in a private registry, moved by the same camera systems) and publishes each step
+# into one of two shared memory buffers. The main process draws from the front buffer without copying while the worker
+# writes the back one, then the buffers swap when the step is collected. Per frame only the camera scroll, rotation and
+# origin (and the active flock size) are sent. The process is started when its level is entered (see
+# Level.start_flock_workers), on the main thread before the level's job and pipeline threads exist since forking copies
+# whatever locks other threads hold, so streamed levels that are never entered do not start workers. It is stopped when
+# the FlockWorker is garbage collected
+class FlockWorker:
+    # rng is the flock's random stream, the forked worker carries on from its state (see replay.get_rng)
+    def __init__(self, surface, flock_size, use_predator=False, use_wind=False, parallax=(1, 1), rng=random):
+        self.surface = surface
+        self.settings = (surface.get_size(), flock_size, use_predator, use_wind, parallax, rng)
+        self.capacity = flock_size
+        self.flock_size = flock_size  # active boids (see set_flock_size)
+        self.use_predator = use_predator
+        self.shape = (2, flock_size + 1, state_width)  # [buffer, row, state]
+        self.memory = None
+        self.connection = None
+        self.front = 0  # buffer the main process reads
+        self.counts = [flock_size, flock_size]  # active boids in each buffer
+        self.pending = False  # a step has been sent and not collected
+        self.state = None  # copy of the front buffer (snapshots only)
+
+    def start(self):
+        if self.memory is not None:
+            return
+        self.memory = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * 8)
+        context = multiprocessing.get_context('fork')
+        self.connection, child = context.Pipe()
+        process = context.Process(target=run_flock, args=(child, self.memory.name, self.shape) + self.settings,
+                                  daemon=True)
+        process.start()
+        child.close()
+        weakref.finalize(self, stop_worker, self.connection, process, self.memory)
+        self.front = self.connection.recv()  # initial state
+
+    def set_flock_size(self, flock_size):
+        self.flock_size = min(flock_size, self.capacity)
+
+    # starts the worker on the next step, call once per frame after the camera scroll and origin are known
+    def update(self, scroll_value, rot_value, origin):
+        if self.memory is None:
+            raise RuntimeError('flock worker updated before it was started')
+        self.sync()
+        back = 1 - self.front
+        self.counts[back] = self.flock_size
+        self.connection.send((back, tuple(scroll_value), rot_value, tuple(origin), self.flock_size))
+        self.pending = True
+
+    # waits for the step started by update, its buffer becomes the front
+    def sync(self):
+        if self.pending:
+            self.front = self.connection.recv()
+            self.pending = False
+
+    # worker drawing from a copy of the front buffer (see pipeline.py), registry is unused (boids are not entities here)
+    def snapshot(self, registry):
+        worker = copy.copy(self)
+        worker.counts = list(self.counts)
+        worker.state = self.get_state().copy()
+        return worker
+
+    # view of the front buffer (made per call, so no view outlives the shared memory)
+    def get_state(self):
+        if self.state is not None:
+            return self.state
+        if self.memory is None:
+            return np.zeros(self.shape[1:])
+        return np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)[self.front]
+
+    def get_rects(self):
+        state = self.get_state()
+        return get_boid_rects(state[:self.counts[self.front], :2], state[-1, :2] if self.use_predator else None)
+
+    def draw(self, view=no_zoom):
+        if self.memory is None and self.state is None:
+            return
+        state = self.get_state()
+        count = self.counts[self.front]
+        if count:
+            draw_boids(self.surface, state[:count, :2], state[:count, 4], 6, 2, (30, 30, 30), view)
+        if self.use_predator:
+            draw_predator(self.surface, state[-1, :2], state[-1, 4], view)
+
+
+def stop_worker(connection, process, memory):
+    try:
+        connection.send(None)
+    except OSError:
+        pass  # worker already gone
+    process.join(1)
+    if process.is_alive():
+        process.terminate()
+    connection.close()
+    memory.close()
+    memory.unlink()
+
+
+# worker process, steps the flock then applies the camera (the order Level.update uses) and publishes the result
+def run_flock(connection, memory_name, shape, size, flock_size, use_predator, use_wind, parallax, rng):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    buffers = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+    registry = Registry()
+    flock = Flock(registry, pygame.Surface(size), flock_size, use_predator, use_wind, parallax, rng)
+    publish(flock, buffers[0])
+    connection.send(0)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break  # main process closed
+        if message is None:
+            break
+        back, scroll_value, rot_value, origin, flock_size = message
+        flock.set_flock_size(flock_size)
+        flock.update()
+        scroll_system(registry, scroll_value)
+        rotation_system(registry, rot_value, origin)
+        publish(flock, buffers[back])
+        connection.send(back)
+    del buffers
+    memory.close()
+
+
+def publish(flock, state):
+    count = len(flock.boids)
+    pos, vel, heading = flock.get_components('pos', 'vel', 'heading')
+    state[:count, :2] = pos
+    state[:count, 2:4] = vel
+    state[:count, 4] = heading
+    if flock.predator is not None:
+        predator = flock.predator
+        state[-1, :2] = predator.pos
+        state[-1, 2:4] = predator.vel
+        state[-1, 4] = predator.rot_deg
+
+
+# update time per frame of several flocks in process vs in workers: python flock_worker.py [flocks] [flock size]
+if __name__ == '__main__':
+    flocks = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    flock_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    frames = 200
+    surface = pygame.Surface((448, 288))
+
+    registry = Registry()
+    in_process = [Flock(registry, surface, flock_size, True, True, (2, 2)) for _ in range(flocks)]
+    start = time.perf_counter()
+    for _ in range(frames):
+        for flock in in_process:
+            flock.update()
+        scroll_system(registry, (1, 0))
+        rotation_system(registry, 1, (224, 144))
+    in_process_ms = (time.perf_counter() - start) / frames * 1000
+
+    workers = [FlockWorker(surface, flock_size, True, True, (2, 2)) for _ in range(flocks)]
+    for worker in workers:
+        worker.start()
+    start = time.perf_counter()
+    for _ in range(frames):
+        for worker in workers:
+            worker.update((1, 0), 1, (224, 144))
+        for worker in workers:
+            worker.sync()
+    workers_ms = (time.perf_counter() - start) / frames * 1000
+    print(f'{flocks} flocks of {flock_size}: in process {in_process_ms:.3f} ms, workers {workers_ms:.3f} ms per frame')
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 tile_size = 16  # keep to prevent errors, even if game doesn't need tiles
 screen_width = 28 * tile_size  # arbitrary
 screen_height = 18 * tile_size  # arbitrary
@@ -15,3 +16,57 @@ fonts = {'small_font': '../assets/fonts/small_font.png',
 
 tile_cache = {}
 tile_cache_granularity = 5  # deg step
+tile_image_cache = {}  # {(image path, rect, flip flags): surface} shared by every compiled room
+voxel_cache = {}  # {(.vox path, layer size, layers): sprite stack sheet} sheets are keys of tile_cache
+slice_cache = {}  # {(sheet, slice dimensions): [subsurface views]} shared by everything cut from the same sheet
+light_cache = {}  # {(radius, colour, falloff): surface} pre-rendered light sprites shared by every light
+light_radius_step = 2  # px, light radii are quantised to this so flickering lights reuse a small bank of sprites
+zoom_tile_cache = OrderedDict()  # {zoom: {(tile surface, rot): scaled sprite}} least recently used zoom level first
+max_zoom = 3  # camera zoom range is 1 to max_zoom
+zoom_granularity = 2 / tile_size  # zoom is quantised so a zoomed tile grows two whole pixels at a time
+# zoom levels kept in zoom_tile_cache, one for every quantised zoom in the camera's range (17)
+zoom_cache_levels = round((max_zoom - 1) / zoom_granularity) + 1
+
+# assets -- load images, fonts and compiled rooms from one packed file (see bundle.py, python bundle.py builds it).
+# Off, every asset is read from its own file so edits show up without rebuilding. Frozen builds use it when shipped
+use_asset_bundle = False
+asset_bundle_path = '../assets.bundle'
+asset_bundles = {}  # {bundle path: Bundle or None if not used} opened on first asset load
+
+# start-up -- time imports and init phases and write them to a report once the first room is running (see startup.py)
+profile_startup = False
+startup_report_path = '../startup_report.txt'
+
+# replays -- record the input, world seed and state hashes of a session and write them to replay_path on exit (see
+# replay.py, python replay.py plays a recording back as a benchmark and regression check)
+record_replay = False
+replay_path = '../replays/last.replay'
+replay_hash_interval = 60  # frames between state hashes
+
+# world streaming
+room_stream_margin = tile_size * 4  # rooms within this distance of the current room (in the .world file) are streamed in
+room_memory_budget = 64 * 1024 * 1024  # bytes of resident rooms before out of range rooms are evicted
+
+# frames -- simulate the next frame on a worker thread while this one renders (see pipeline.py). Off, frames are
+# simulated then rendered in turn on the main thread (deterministic)
+pipelined_frames = False
+
+# jobs -- threads running independent per frame systems at the same time (see jobs.py), 0 runs them in order
+job_threads = 0
+
+# flocks -- run each flock in its own process (see flock_worker.py), only where processes can be forked
+flock_workers = False
+
+# tiles -- draw tile stacks as the .vox model named like their image when there is one (see voxel.py). Off, the hand
+# drawn stacks are used
+voxel_tiles = False
+
+# creatures -- plan paths over the room's baked navmesh. Off, they plan with D* Lite over a lattice of points
+# path_precision px apart (see pathfinding.py)
+creature_navmesh = True
+
+# adaptive quality -- {knob: (min, max)}, the governor lowers knobs towards the worse end when over the frame budget
+quality_bounds = {'flock_size': (10, 50),  # boids per flock (flocks are created with the max)
+                  'outline_segments': (1, 3),  # creature head/tail outline curve points
+                  'ik_iterations': (5, 17),  # FABRIK iterations per leg
+                  'replan_interval': (120, 360)}  # frames between creature path replans
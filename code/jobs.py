@@ -0,0 +1,74 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+# per frame systems as a job graph. Jobs declare the resources (components, entities, level state) they read and write,
+# and a job depends on every earlier job it conflicts with (it reads what that job writes, or writes what that job
+# reads or writes), so a frame has the same result as running the jobs in the order they were added. With threads,
+# jobs whose dependencies are done run at the same time on a pool (NumPy heavy jobs overlap, NumPy releases the GIL),
+# without, they run in order on the calling thread. Each job's time is kept for the dev overlay
+class JobGraph:
+    def __init__(self, threads=0):
+        self.threads = threads
+        self.executor = None  # started on the first threaded run
+        self.jobs = []  # in the order they were added
+        self.timings = {}  # {job name: ms} smoothed over recent frames
+        self.smoothing = 0.1  # exponential moving average weight of the newest frame
+
+    def add(self, name, function, reads=(), writes=()):
+        job = Job(name, function, reads, writes)
+        for other in self.jobs:
+            if job.conflicts(other):
+                job.dependencies += 1
+                other.dependents.append(job)
+        self.jobs.append(job)
+        return job
+
+    # runs every job once
+    def run(self):
+        if not self.threads:
+            for job in self.jobs:
+                self.run_job(job)
+            return
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='job')
+        waiting = {job: job.dependencies for job in self.jobs}
+        running = {self.executor.submit(self.run_job, job): job for job in self.jobs if not job.dependencies}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                future.result()  # rethrows anything raised by the job
+                for dependent in job.dependents:
+                    waiting[dependent] -= 1
+                    if not waiting[dependent]:
+                        running[self.executor.submit(self.run_job, dependent)] = dependent
+
+    def run_job(self, job):
+        start = time.perf_counter()
+        job.function()
+        ms = (time.perf_counter() - start) * 1000
+        previous = self.timings.get(job.name, ms)
+        self.timings[job.name] = previous + (ms - previous) * self.smoothing
+
+    # dev overlay, the slowest jobs
+    def draw(self, surface, font, pos, lines=8):
+        timings = sorted(self.timings.items(), key=lambda item: item[1], reverse=True)
+        text = [f'jobs {sum(self.timings.values()):.2f}ms ({self.threads or "no"} threads)']
+        text += [f'{name}: {ms:.2f}ms' for name, ms in timings[:lines - 1]]
+        for i, line in enumerate(text):
+            font.render(line, surface, (pos[0], pos[1] + i * (font.line_height + font.line_spacing)))
+
+
+class Job:
+    def __init__(self, name, function, reads, writes):
+        self.name = name
+        self.function = function  # called with no arguments
+        self.reads = set(reads)
+        self.writes = set(writes)
+        self.dependencies = 0  # earlier jobs that must finish first
+        self.dependents = []  # later jobs waiting on this one
+
+    def conflicts(self, other):
+        return bool(self.reads & other.writes or self.writes & (other.reads | other.writes))
@@ -1,25 +1,37 @@
 # - libraries -
-import pygame
-from random import randint
-from pytmx.util_pygame import load_pygame  # allows use of tiled tile map files for pygame use
+import pygame, os, random
+import numpy as np
 # - general -
-from game_data import tile_size, controller_map, fonts, tile_cache, tile_cache_granularity
+from game_data import tile_size, controller_map, fonts, tile_cache, flock_workers, \
+    pipelined_frames, job_threads
 from support import *
+# - entities -
+from ecs import Registry
+from systems import scroll_system, rotation_system, hitbox_system
 # - tiles -
-from tiles import StaticTile, CollideableTile, HazardTile
+from tiles import TileLayer, Colliders, StaticTile, CollideableTile, HazardTile
 # - objects -
 from creature import Creature
 from player import Player
 from boids import Flock
+from flock_worker import FlockWorker, can_fork
+from pipeline import FramePipeline, Frame
+from jobs import JobGraph
 from trigger import SpawnTrigger, Trigger
 from spawn import Spawn
 # - systems -
-from camera import Camera
+from camera import Camera, no_zoom
 from text import Font
+from lighting import EdgeIndex
+from dirty import DirtyRenderer
+from pathfinding import FreeSpaceSampler, NavMesh
+from compiled_level import load_level  # compiled (memory mapped) tiled tile map files
+from replay import get_rng, no_input
+from quality import setters
 
 
 class Level:
-    def __init__(self, level_data, screen_surface, screen_rect, controllers, starting_spawn):
+    def __init__(self, level_data, screen_surface, screen_rect, controllers, starting_spawn, seed=None):
         # TODO testing, remove
         self.dev_debug = False
 
@@ -29,11 +41,19 @@ class Level:
         self.screen_width = screen_surface.get_width()
         self.screen_height = screen_surface.get_height()
 
+        # room
+        self.level_data = level_data  # path of the room's tmx file
+        self.transition = None  # room transition trigger the player has entered (handled by World)
+
         # player vars
         self.starting_spawn = starting_spawn
         self.player_spawn = None  # will be filled after player is initialised
 
         self.controllers = controllers
+        self.input = no_input  # input of the frame being simulated (see replay.FrameInput)
+
+        # randomness -- each subsystem draws from its own stream seeded from the level's seed (see replay.get_rng)
+        self.seed = random.getrandbits(64) if seed is None else seed
 
         # pause and menus
         self.pause = False
@@ -43,27 +63,36 @@ class Level:
         self.rot_value = 0  # ∆ rotation in deg
         self.rot_rate = 2  # in deg
 
-        # boid simulation
-        num_flocks = 1
-        flock_size = 50
-        use_wind = True
-        use_predator = True
-        parallax = (2, 2)
-        self.flocks = [Flock(self.screen_surface, flock_size, use_predator, use_wind, parallax) for f in range(num_flocks)]
+        # render -- frames where the camera is still only redraw what moved (see dirty.py)
+        self.renderer = DirtyRenderer(screen_surface, (48, 99, 142))
+        self.view = no_zoom  # camera zoom transform of this frame (see camera.View)
+        self.zoom = 1  # camera zoom of the last frame
+        # simulation and render, on separate threads when pipelined (see pipeline.py)
+        self.pipeline = FramePipeline(self.simulate, self.render, pipelined_frames)
+        self.frame = None  # frame last rendered
+
+        # entities (tiles, objects, boids), their components are moved in bulk by the systems
+        self.registry = Registry()
 
         dt = 1  # dt starts as 1 because on the first frame we can assume it is 60fps. dt = 1/60 * 60 = 1
 
         # -- get level data from Tiled file --
-        tmx_data = load_pygame(resource_path(level_data))  # tile map file
+        tmx_data = load_level(resource_path(level_data))  # tile map file (compiled on first load or when edited)
+        self.tmx_data = tmx_data
         self.room_dim = [tmx_data.width * tile_size, tmx_data.height * tile_size]
-        # corners outlining rect clockwise
+        # occupancy of the collideable layer [row, col], used by creature path planning
+        collideable = tmx_data.get_layer_by_name('collideable')
+        self.solid = np.asarray(collideable.data) != 0
+        self.free_space = FreeSpaceSampler(self.solid, tile_size)  # random walkable points (creature targets)
+        self.navmesh = NavMesh(collideable.walkable, collideable.portals, self.solid, tile_size)  # baked walkable rects
+        # corners outlining rect clockwise, entities so they are moved by the camera systems (see room_corners)
         ht = tile_size//2  # half the tile size
-        self.room_corners = [[0-ht, 0-ht],
-                             [self.room_dim[0]-ht, 0-ht],
-                             [self.room_dim[0]-ht, self.room_dim[1]-ht],
-                             [0-ht, self.room_dim[1]-ht]]
-        self.all_tile_sprites = pygame.sprite.Group()  # contains all tile sprites for ease of updating/scrolling
-        self.all_object_sprites = pygame.sprite.Group()
+        self.registry.register('room corners', pos=(np.float64, 2))
+        for corner in ([0-ht, 0-ht],
+                       [self.room_dim[0]-ht, 0-ht],
+                       [self.room_dim[0]-ht, self.room_dim[1]-ht],
+                       [0-ht, self.room_dim[1]-ht]):
+            self.registry.create('room corners', pos=corner)
 
         # get background and foreground layers
         self.background_layers = []  # ordered list of all background layers (in render order)
@@ -78,7 +107,11 @@ class Level:
                 self.foreground_layers.append(self.create_tile_layer(tmx_data, layer, "CollideableTile"))
 
         # get objects
-        #self.transitions = self.create_object_layer(tmx_data, 'transitions', 'Trigger')
+        # room transitions are optional, rooms without neighbours have no transitions layer
+        if 'transitions' in tmx_data.layernames:
+            self.transitions = self.create_object_layer(tmx_data, 'transitions', 'Trigger')
+        else:
+            self.transitions = pygame.sprite.Group()
         self.player_spawns = self.create_object_layer(tmx_data, 'spawns', 'Spawn')
         self.spawn_triggers = self.create_object_layer(tmx_data, 'spawns', 'SpawnTrigger')
         # self.player_spawn_triggers = self.create_object_group(tmx_data, 'spawns', 'Trigger')
@@ -87,18 +120,37 @@ class Level:
 
         # get tiles
         self.collideable = self.create_tile_layer(tmx_data, 'collideable', 'CollideableTile')
+        self.edge_index = None  # built by light_edges for the first raycasted light
         '''self.hazards = self.create_tile_layer(tmx_data, 'hazards',
                                               'HazardTile')  # TODO hazard, what type? (use tiled custom hitboxing feature on hazard tiles)'''
 
         # - camera setup -
         rot = 0
-        self.camera = Camera(self.screen_surface, self.screen_rect, self.room_dim, self.player.sprite, controllers)
+        self.camera = Camera(self.screen_surface, self.screen_rect, self.room_dim, self.player.sprite, controllers,
+                             lambda: self.room_corners)
         self.camera.focus(True)  # focuses camera on target
-        scroll_value = self.camera.get_scroll(dt, rot)  # returns scroll, now focused
-        self.player.sprite.apply_scroll(scroll_value)  # applies new scroll to player
-        self.all_tile_sprites.update(scroll_value, rot)  # applies new scroll to all tile sprites
-        self.all_object_sprites.update(scroll_value, rot)  # applies new scroll to all object sprites'''
-        self.apply_scroll(scroll_value)  # scroll level systems
+        scroll_value = self.camera.get_scroll(dt, rot, no_input.keys)  # returns scroll, now focused
+        self.apply_camera(scroll_value, rot)  # applies new scroll to every entity
+
+        # boid simulation -- created after focusing, boids spawn in screen space so must not have the focus scroll
+        num_flocks = 1
+        flock_size = 50
+        use_wind = True
+        use_predator = True
+        parallax = (2, 2)
+        self.flocks = []  # updated in process, moved by the camera systems
+        self.flock_workers = []  # updated in their own processes, in parallel with the rest of the frame
+        for f in range(num_flocks):
+            if flock_workers and can_fork:
+                self.flock_workers.append(FlockWorker(self.screen_surface, flock_size, use_predator, use_wind, parallax,
+                                                      get_rng(self.seed, f'flock {f}')))
+            else:
+                self.flocks.append(Flock(self.registry, self.screen_surface, flock_size, use_predator, use_wind,
+                                         parallax, get_rng(self.seed, f'flock {f}')))
+
+        # per frame systems (see create_jobs)
+        self.dt, self.rot_value, self.scroll_value, self.origin = dt, rot, scroll_value, [0.0, 0.0]
+        self.jobs = self.create_jobs()
 
         # - text setup -
         self.small_font = Font(resource_path(fonts['small_font']), 'white')
@@ -108,17 +160,17 @@ class Level:
 
     # creates all the neccessary types of tiles seperately and places them in individual layer groups
     def create_tile_layer(self, tmx_file, layer_name, type):
-        sprite_group = []
         layer = tmx_file.get_layer_by_name(layer_name)
         tiles = layer.tiles()
         parallax = (layer.parallaxx, layer.parallaxy)
+        # baked collision rects, only for layers that move with the room corners they are placed by
+        colliders = Colliders(layer.colliders, lambda: self.room_corners, self.room_dim) if parallax == (1, 1) else None
+        sprite_group = TileLayer(self.registry, layer_name, colliders)  # tiles add themselves to the layer
 
         if type == "StaticTile":
             # gets layer from tmx and creates StaticTile for every tile in the layer, putting them in both SpriteGroups
             for x, y, surface in tiles:
-                tile = StaticTile((x * tile_size, y * tile_size), (tile_size, tile_size), parallax, surface)
-                sprite_group.append(tile)
-                self.all_tile_sprites.add(tile)
+                StaticTile(sprite_group, (x * tile_size, y * tile_size), (tile_size, tile_size), parallax, surface)
 
         elif type == 'CollideableTile':
             for x, y, surface in tiles:
@@ -128,15 +180,12 @@ class Level:
                     tile_cache[surface] = self.create_tile_cache(images)
 
                 # create tile
-                tile = CollideableTile((x * tile_size, y * tile_size), (tile_size, tile_size), parallax, surface)
-                sprite_group.append(tile)
-                self.all_tile_sprites.add(tile)
+                CollideableTile(sprite_group, (x * tile_size, y * tile_size), (tile_size, tile_size), parallax, surface)
 
         elif type == 'HazardTile':
             for x, y, surface in tiles:
-                tile = HazardTile((x * tile_size, y * tile_size), (tile_size, tile_size), parallax, surface, self.player.sprite)
-                sprite_group.append(tile)
-                self.all_tile_sprites.add(tile)
+                HazardTile(sprite_group, (x * tile_size, y * tile_size), (tile_size, tile_size), parallax, surface,
+                           self.player.sprite)
 
         else:
             raise Exception(f"Invalid create_tile_group type: '{type}' ")
@@ -154,17 +203,23 @@ class Level:
                 # checks if object is a trigger (multiple object types/classes could be in the layer)
                 if obj.type == object_class:
                     spawn_data = tmx_file.get_object_by_id(obj.trigger_spawn)
-                    spawn = Spawn(spawn_data.x, spawn_data.y, spawn_data.name, parallax, spawn_data.player_facing)
-                    trigger = SpawnTrigger(obj.x, obj.y, obj.width, obj.height, obj.name, parallax, spawn)
+                    spawn = Spawn(self.registry, spawn_data.x, spawn_data.y, spawn_data.name, parallax,
+                                  spawn_data.player_facing)
+                    trigger = SpawnTrigger(self.registry, obj.x, obj.y, obj.width, obj.height, obj.name, parallax,
+                                           spawn)
                     sprite_group.add(trigger)
-                    self.all_object_sprites.add(trigger)
 
         elif object_class == "Trigger":
             for obj in layer:
                 if obj.type == object_class:
-                    trigger = Trigger(obj.x, obj.y, obj.width, obj.height, obj.name, parallax)
+                    # 'room' property is the destination tmx (relative to this room), 'spawn' the spawn to arrive at
+                    destination = obj.properties.get('room', None)
+                    if destination is not None:
+                        destination = os.path.normpath(os.path.join(os.path.dirname(self.level_data), destination))
+                    destination_spawn = obj.properties.get('spawn', obj.name)
+                    trigger = Trigger(self.registry, obj.x, obj.y, obj.width, obj.height, obj.name, parallax,
+                                      destination, destination_spawn)
                     sprite_group.add(trigger)
-                    self.all_object_sprites.add(trigger)
 
         elif object_class == 'Spawn':
             sprite_group = {}
@@ -172,9 +227,8 @@ class Level:
                 # multiple types of object could be in layer, so checking it is correct object type (spawn)
                 if obj.type == object_class:
                     # creates a dictionary containing spawn name: spawn pairs for ease and efficiency of access
-                    spawn = Spawn(obj.x, obj.y, obj.name, parallax, obj.player_facing)
+                    spawn = Spawn(self.registry, obj.x, obj.y, obj.name, parallax, obj.player_facing)
                     sprite_group[spawn.name] = spawn
-                    self.all_object_sprites.add(spawn)
 
         elif object_class == 'Player':
             sprite_group = pygame.sprite.GroupSingle()
@@ -184,7 +238,7 @@ class Level:
             spawn = self.player_spawns[self.starting_spawn]
             radius = 5
 
-            player = Player(spawn, self.screen_surface, radius)
+            player = Player(self.registry, spawn, self.screen_surface, radius)
             sprite_group.add(player)
             self.player_spawn = spawn  # stores the spawn instance for future respawn
 
@@ -196,7 +250,7 @@ class Level:
             body_segments = 8
             segment_spacing = 14
 
-            creature = Creature(self, spawn, body_segments, segment_spacing)
+            creature = Creature(self, spawn, body_segments, segment_spacing, get_rng(self.seed, 'creature 0'))
             sprite_group.add(creature)
 
         else:
@@ -205,19 +259,17 @@ class Level:
         return sprite_group
 
     def create_image_layer(self, tmx_file, layer_name):
-        sprite_group = pygame.sprite.GroupSingle()
+        sprite_group = TileLayer(self.registry, layer_name)
         layer = tmx_file.get_layer_by_name(layer_name)
         image = layer.image
         parallax = (layer.parallaxx, layer.parallaxy)
 
-        tile = StaticTile((0, 0), (image.get_width(), image.get_height()), parallax, image)
-        sprite_group.add(tile)
-        self.all_tile_sprites.add(tile)
+        StaticTile(sprite_group, (0, 0), (image.get_width(), image.get_height()), parallax, image)
         return sprite_group
 
     # any layer that is purely for visuals, including parallax layers
     def create_decoration_layer(self, tmx_file, layer_name):
-        sprite_group = pygame.sprite.GroupSingle()
+        sprite_group = TileLayer(self.registry, layer_name)
         layer = tmx_file.get_layer_by_name(layer_name)
         parallax = (layer.parallaxx, layer.parallaxy)
 
@@ -234,40 +286,19 @@ class Level:
             for obj in layer:
                 surf.blit(obj.image, (obj.x, obj.y))
 
-        tile = StaticTile((0, 0), (surf.get_width(), surf.get_height()), parallax, surf)
-        sprite_group.add(tile)
-        self.all_tile_sprites.add(tile)
+        StaticTile(sprite_group, (0, 0), (surf.get_width(), surf.get_height()), parallax, surf)
         return sprite_group
 
-    def create_tile_cache(self, images):
-        cache = {}
-
-        # pre-render 360 deg view at 10 deg increments of stack
-        for rot in range(0, 360, tile_cache_granularity):
-            # multiply by 1.5 to account for expansion of image when rotated 45 deg
-            surf = pygame.Surface((tile_size * 1.5, tile_size * 1.5 + len(images) - 1))  # width, height
-
-            # stack images
-            for img in range(len(images)):
-                rot_img = pygame.transform.rotate(images[img], rot)
-                # account for 1.5 multiplier in height
-                surf.blit(rot_img, (0, surf.get_height() - tile_size * 1.5 - img))
-
-            # make transparent bg
-            surf = surf.convert(24)
-            surf.set_colorkey('black')
-            surf.set_alpha(255)
-
-            # cache image
-            cache[rot] = surf
-
-        return cache
+    # static so rooms can be prebaked without a Level (see World.prebake)
+    @staticmethod
+    def create_tile_cache(images):
+        return create_rotation_cache(images)
 
 # -- check methods --
 
     def get_input(self):
         rot_value = 0
-        keys = pygame.key.get_pressed()
+        keys = self.input.keys
 
         # pause pressed prevents holding key and rapidly switching between T and F
         if keys[pygame.K_p] or self.get_controller_input('pause'):
@@ -295,8 +326,8 @@ class Level:
     # checks controller inputs and returns true or false based on passed check
     def get_controller_input(self, input_check):
         # check if controllers are connected before getting controller input (done every frame preventing error if suddenly disconnected)
-        if len(self.controllers) > 0:
-            controller = self.controllers[0]
+        if len(self.input.controllers) > 0:
+            controller = self.input.controllers[0]
             # TODO testing, remove
             if input_check == 'dev on' and controller.get_button(controller_map['share']):
                 return True
@@ -307,15 +338,56 @@ class Level:
                 return True
         return False
 
+    # sets transition if the player is inside a room transition trigger. Triggers stay in room coordinates so
+    # the player's position is converted back from the scrolled and rotated screen space
+    def check_transitions(self):
+        player_room_pos = self.get_room_pos(self.player.sprite.get_pos())
+        for trigger in self.transitions:
+            if trigger.destination is not None and trigger.room_rect.collidepoint(player_room_pos):
+                self.transition = trigger
+                return
+        self.transition = None
+
 # -- utilities --
 
-    # draw tiles in tile group but only if in camera view (in tile.draw method)
-    def draw_tile_layer(self, layer):
-        layer.sort(key=lambda t: t.pos[1])  # sort layer based on y position of tiles
-        # render layer
-        for tile in layer:
-            # render tile
-            tile.draw(self.screen_surface, self.screen_rect)
+    # converts a screen position to a room (tiled) position using the scrolled and rotated room corners
+    # corners are offset by half a tile (tiles are centered on their position) so that is removed again
+    def get_room_pos(self, point):
+        origin = self.room_corners[0]
+        x_axis = [self.room_corners[1][0] - origin[0], self.room_corners[1][1] - origin[1]]
+        y_axis = [self.room_corners[3][0] - origin[0], self.room_corners[3][1] - origin[1]]
+        rel = [point[0] - origin[0], point[1] - origin[1]]
+        # project onto each room axis, axes are room width and height long
+        x = (rel[0] * x_axis[0] + rel[1] * x_axis[1]) / (x_axis[0] ** 2 + x_axis[1] ** 2) * self.room_dim[0]
+        y = (rel[0] * y_axis[0] + rel[1] * y_axis[1]) / (y_axis[0] ** 2 + y_axis[1] ** 2) * self.room_dim[1]
+        return [x - tile_size // 2, y - tile_size // 2]
+
+    # whether each screen point (n, 2) is inside the room, at least margin from the edges (see camera.RoomBounds)
+    def in_room(self, points, margin=0):
+        return self.camera.bounds.contains(self.room_corners, points, margin)
+
+    # converts room positions (n, 2) back to screen positions, the inverse of get_room_pos
+    def get_screen_points(self, points):
+        corners = self.room_corners
+        points = (np.asarray(points, dtype=np.float64) + tile_size // 2) / self.room_dim
+        return corners[0] + points[:, :1] * (corners[1] - corners[0]) + points[:, 1:] * (corners[3] - corners[0])
+
+    # draw tiles in tile layer but only if in camera view (in TileLayer.draw), or only within area
+    def draw_tile_layer(self, layer, area=None):
+        layer.draw(self.screen_surface, area or self.screen_rect, self.view)
+
+    # everything behind the moving entities, cached by the renderer while the camera is still
+    def draw_background(self, frame):
+        for layer in frame.background_layers:
+            self.draw_tile_layer(layer)
+
+    # screen areas of everything that can move while the camera is still
+    def get_moving_rects(self, frame):
+        rects = [creature.get_rect() for creature in frame.creatures]
+        rects.append(frame.player.get_rect())
+        for flock in frame.flocks:
+            rects += flock.get_rects()
+        return [self.view.rect(rect) for rect in rects]
 
 # -- menus --
 
@@ -330,32 +402,117 @@ class Level:
     def set_pause(self, pause=True):
         self.pause = pause
 
-# -------------------------------------------------------------------------------- #
-    # only applys scroll to level systems, not child objects of the level
-    def apply_scroll(self, scroll_value):
-        for corner in range(len(self.room_corners)):
-            self.room_corners[corner][0] -= int(scroll_value[0])
-            self.room_corners[corner][1] -= int(scroll_value[1])
+    # transition of the frame on screen (pipelined, the simulation is a frame ahead)
+    def get_transition(self):
+        return self.transition if self.frame is None else self.frame.transition
 
-    def apply_rotation(self, rot, origin):
-        for corner in range(len(self.room_corners)):
-            self.room_corners[corner] = rotate_point_deg(self.room_corners[corner], origin, rot)
+    # view of the room corner positions (4, 2), moved by the camera systems
+    @property
+    def room_corners(self):
+        return self.registry.archetypes['room corners'].view('pos')
 
-    # updates the level allowing tile scroll and displaying tiles to screen
+    # collideable layer edges that cast shadows for raycasted lights (see lighting.EdgeIndex), extracted on first use so
+    # rooms without raycasted lights never pay for it
+    @property
+    def light_edges(self):
+        if self.edge_index is None:
+            self.edge_index = EdgeIndex(self)
+        return self.edge_index
+
+# -------------------------------------------------------------------------------- #
+    # scrolls every entity, then rotates them around the player, then moves hitboxes to match. Creatures are not
+    # entities and are moved after (around the same origin)
+    def apply_camera(self, scroll_value, rot_value):
+        scroll_system(self.registry, scroll_value)
+        origin = [float(v) for v in self.player.sprite.get_pos()]
+        rotation_system(self.registry, rot_value, origin)
+        hitbox_system(self.registry)
+        for creature in self.creatures:
+            creature.apply_camera(scroll_value, rot_value, origin)
+
+    # per frame systems as jobs (see jobs.py), added in the order they used to run. Each declares what it reads and
+    # writes so independent ones (creatures, flocks, camera on tiles vs boids) can run at the same time when
+    # game_data.job_threads is set. Jobs read the frame's input from dt, rot_value and scroll_value
+    def create_jobs(self):
+        jobs = JobGraph(job_threads)
+        # player needs to be before tiles for scroll to function properly
+        jobs.add('player', lambda: self.player.update(self.collideable, self.rot_value, self.dt, self.input.keys),
+                 reads=['collideable'], writes=['player'])
+        # camera origin is the scrolled player, flock workers step (and apply the camera) alongside the other jobs
+        jobs.add('camera player', self.scroll_player, writes=['player', 'origin'])
+        jobs.add('flock workers', self.step_flock_workers, reads=['origin'], writes=['flock workers'])
+        # TODO update sprite group
+        # creatures and flocks each draw from their own random stream, so they can run in any order
+        for i, creature in enumerate(self.creatures):
+            jobs.add(f'creature {i}', lambda creature=creature: creature.update(self.collideable, self.dt),
+                     reads=['collideable', 'room corners'], writes=[f'creature {i}'])
+        for i, flock in enumerate(self.flocks):
+            jobs.add(f'flock {i}', flock.update, writes=[f'flock {i}'])
+        # camera -- scroll and rotate everything else (including the room boundary corners)
+        scenery = [name for name in self.registry.archetypes if name not in ('player', 'boids')]
+        jobs.add('camera scenery', lambda: self.apply_camera_to(scenery), reads=['origin'],
+                 writes=['collideable', 'scenery', 'room corners'])
+        jobs.add('camera boids', lambda: self.apply_camera_to(['boids']), reads=['origin'],
+                 writes=[f'flock {i}' for i in range(len(self.flocks))])
+        for i, creature in enumerate(self.creatures):
+            jobs.add(f'camera creature {i}',
+                     lambda creature=creature: creature.apply_camera(self.scroll_value, self.rot_value, self.origin),
+                     reads=['origin'], writes=[f'creature {i}'])
+        jobs.add('transitions', self.check_transitions, reads=['player', 'room corners'], writes=['transition'])
+        return jobs
+
+    # camera for the player alone, its scrolled position is the origin everything else rotates around
+    def scroll_player(self):
+        scroll_system(self.registry, self.scroll_value, ['player'])
+        self.origin = [float(v) for v in self.player.sprite.get_pos()]
+        rotation_system(self.registry, self.rot_value, self.origin, ['player'])
+
+    # forks the flock worker processes, call on the main thread before the first update (see flock_worker.py)
+    def start_flock_workers(self):
+        for worker in self.flock_workers:
+            worker.start()
+
+    def step_flock_workers(self):
+        for worker in self.flock_workers:
+            worker.update(self.scroll_value, self.rot_value, self.origin)
+
+    # camera for the named archetypes, after scroll_player
+    def apply_camera_to(self, names):
+        scroll_system(self.registry, self.scroll_value, names)
+        rotation_system(self.registry, self.rot_value, self.origin, names)
+        hitbox_system(self.registry, names)
+
+    # simulates then renders a frame, pipelined when game_data.pipelined_frames is set (see pipeline.py)
+    def update(self, frame_input):
+        self.pipeline.step(frame_input)
+
+    # updates the level with a frame's input (see replay.FrameInput) and returns what render needs to draw it
     # order is equivalent of layers
-    def update(self, dt):
+    def simulate(self, frame_input):
+        # quality settings arrive with the frame, so they never land mid step when frames are pipelined and replays
+        # apply them on the frame they were recorded with
+        for name, value in frame_input.settings:
+            setters[name](self, value)
+        self.input = frame_input
+        dt = frame_input.dt
         player = self.player.sprite
         # #### INPUT > GAME(checks THEN UPDATE) > RENDER ####
         # checks deal with previous frames interactions. Update creates interactions for this frame which is then diplayed
 
+        # TODO testing, dev tools move the player onto the creatures
+        if self.dev_debug:
+            for creature in self.creatures:
+                player.pos = creature.head.get_pos()
+
         # -- INPUT --
         rot_value = self.get_input()
+        scroll_value = [0, 0]
 
         # -- CHECKS (For the previous frame)  --
         if not self.pause:
 
             # scroll -- must be first, camera calculates scroll, stores it and returns it for application
-            scroll_value = self.camera.get_scroll(dt, rot_value)
+            scroll_value = self.camera.get_scroll(dt, rot_value, frame_input.keys)
             self.camera.focus(False)
 
             # which object should handle collision? https://gamedev.stackexchange.com/questions/127853/how-to-decide-which-gameobject-should-handle-the-collision
@@ -370,52 +527,83 @@ class Level:
             '''if player.get_respawn():
                 self.camera.focus(True)'''
 
-        # -- UPDATES -- player needs to be before tiles for scroll to function properly
-            self.player.update(self.collideable, rot_value, dt, scroll_value)  #, self.tiles_in_screen, scroll_value, self.player_spawn)
-            # TODO update sprite group
-            for creature in self.creatures:
-                creature.update(self.collideable, rot_value, dt, player.get_pos(), scroll_value)
-            self.all_tile_sprites.update(scroll_value, rot_value, player.get_pos())
-            for flock in self.flocks:
-                flock.update(scroll_value, rot_value, player.get_pos())
-            # shift room boundary rect
-            self.apply_scroll(scroll_value)  # apply scroll to level systems
-            self.apply_rotation(rot_value, player.get_pos())
-
-        # -- RENDER --
+        # -- UPDATES -- player, creatures, flocks then the camera, as jobs (see create_jobs)
+            self.dt, self.rot_value, self.scroll_value = dt, rot_value, scroll_value
+            self.jobs.run()
+
+        for worker in self.flock_workers:
+            worker.sync()
+        frame_input.end_frame(self)  # recordings hash the simulated state (see replay.py)
+
+        still = (not self.pause and not self.dev_debug and rot_value == 0
+                 and scroll_value[0] == 0 and scroll_value[1] == 0)
+        return self.get_frame(still)
+
+    # the frame render draws. Pipelined frames are snapshots so the next simulation can run while this one is drawn
+    def get_frame(self, still):
+        flocks = self.flocks + self.flock_workers
+        if not self.pipeline.threaded:
+            return Frame(self.camera.get_view(), still, self.pause, self.dev_debug, self.transition,
+                         self.background_layers, self.collideable, self.foreground_layers, list(self.creatures),
+                         self.player.sprite, flocks, self.room_corners)
+        registry = self.registry.snapshot('player', 'room corners', *(['boids'] if self.flocks else []))
+        return Frame(self.camera.get_view(), still, self.pause, self.dev_debug, self.transition,
+                     [layer.snapshot() for layer in self.background_layers], self.collideable.snapshot(),
+                     [layer.snapshot() for layer in self.foreground_layers],
+                     [creature.snapshot() for creature in self.creatures], self.player.sprite.snapshot(registry),
+                     [flock.snapshot(registry) for flock in flocks], registry.archetypes['room corners'].view('pos'))
+
+    # draws a simulated frame, only reads frame (never live state, which may be mid simulation)
+    def render(self, frame):
+        # camera did not move, so only the regions of moving entities need redrawing
+        self.frame = frame
+        self.view = frame.view  # zoom is applied when drawing
+        static = frame.still and self.view.zoom == self.zoom
+        self.zoom = self.view.zoom
+        self.renderer.begin(static, lambda: self.draw_background(frame),
+                            self.get_moving_rects(frame) if static else [])
 
         # Draw order
-        for layer in self.background_layers:
-            self.draw_tile_layer(layer)
-        for creature in self.creatures:
-            creature.draw(self.dev_debug)
-        player.draw()
-        self.draw_tile_layer(self.collideable)
-        for layer in self.foreground_layers:
-            self.draw_tile_layer(layer)
-        for flock in self.flocks:
-            flock.draw()
+        for creature in frame.creatures:
+            creature.draw(frame.dev_debug, self.view)
+        frame.player.draw(self.view)
+        # layers in front of moving entities are redrawn within the dirty regions
+        for rect in self.renderer.get_clip_rects():
+            self.screen_surface.set_clip(rect)
+            self.draw_tile_layer(frame.collideable, rect)
+            for layer in frame.foreground_layers:
+                self.draw_tile_layer(layer, rect)
+        self.screen_surface.set_clip(None)
+        for flock in frame.flocks:
+            flock.draw(self.view)
 
         # must be after other renders to ensure menu is drawn last
-        if self.pause:
+        if frame.pause:
             self.pause_menu()
 
-        # Dev Tools
-        if self.dev_debug:
+        # Dev Tools -- drawn through the frame's zoom like everything else
+        if frame.dev_debug:
             '''put debug tools here'''
-            for tile in self.collideable:
-                pygame.draw.rect(self.screen_surface, 'green', tile.hitbox, 1)
-                pygame.draw.circle(self.screen_surface, 'green', tile.hitbox.center, tile.radius, 1)
+            view = frame.view
+            for hitbox in frame.collideable.archetype.view('hitbox').tolist():
+                hitbox = pygame.Rect(hitbox)
+                pygame.draw.rect(self.screen_surface, 'green', view.rect(hitbox), 1)
+                pygame.draw.circle(self.screen_surface, 'green', view.point(hitbox.center), view.length(hitbox.width // 2),
+                                   1)
             # TODO testing
-            for creature in self.creatures:
+            for creature in frame.creatures:
                 for point in creature.brain.path:
-                    pygame.draw.circle(self.screen_surface, 'green', point, 2)
-                pygame.draw.circle(self.screen_surface, 'pink', creature.brain.target, 2)
-
-            for corner in range(len(self.room_corners)):
-                pygame.draw.circle(self.screen_surface, 'red', self.room_corners[corner], 2)
-                pygame.draw.line(self.screen_surface, 'pink', self.room_corners[corner], self.room_corners[(corner+1) % 4])
-
-            for creature in self.creatures:
-                pygame.draw.line(self.screen_surface, "red", player.get_pos(), creature.head.get_pos(), 1)
-                player.pos = creature.head.get_pos()
+                    pygame.draw.circle(self.screen_surface, 'green', view.point(point), view.length(2))
+                pygame.draw.circle(self.screen_surface, 'pink', view.point(creature.brain.target), view.length(2))
+
+            room_corners = view.points(frame.room_corners)
+            for corner in range(len(room_corners)):
+                pygame.draw.circle(self.screen_surface, 'red', room_corners[corner], view.length(2))
+                pygame.draw.line(self.screen_surface, 'pink', room_corners[corner], room_corners[(corner+1) % 4])
+
+            # player is moved onto each creature in turn (see simulate)
+            player_pos = frame.player.get_pos()
+            for creature in frame.creatures:
+                pygame.draw.line(self.screen_surface, "red", view.point(player_pos), view.point(creature.head.get_pos()),
+                                 1)
+                player_pos = creature.head.get_pos()
@@ -1,104 +1,381 @@
 import pygame
-from math import sin
-from random import randint
-from support import circle_surf, pos_for_center, get_rect_corners, get_angle_rad, get_distance
+import numpy as np
+from math import sin, cos, atan2, pi, floor
+import random
+from collections import OrderedDict
+from support import pos_for_center
+from game_data import light_cache, light_radius_step, tile_size
+from camera import no_zoom
+
+
+# returns the pre-rendered sprite for a light of radius (already quantised) and colour. Falloff 0 is a hard edged
+# circle, higher values give a soft gradient that fades out towards the edge (higher is a smaller bright core)
+def get_light_sprite(radius, colour, falloff=0):
+    key = (radius, colour, falloff)
+    if key not in light_cache:
+        light_cache[key] = bake_light_sprite(radius, colour, falloff)
+    return light_cache[key]
+
+
+def bake_light_sprite(radius, colour, falloff):
+    surf = pygame.Surface((radius * 2, radius * 2))
+    colour = pygame.Color(colour)
+    if falloff == 0:
+        pygame.draw.circle(surf, colour, (radius, radius), radius)
+    else:
+        # concentric circles from the edge in, each brighter than the last
+        for r in range(radius, 0, -1):
+            intensity = (1 - r / (radius + 1)) ** falloff
+            pygame.draw.circle(surf, (int(colour.r * intensity), int(colour.g * intensity), int(colour.b * intensity)),
+                               (radius, radius), r)
+    surf = surf.convert()
+    surf.set_colorkey((0, 0, 0))
+    return surf
+
+
+def quantise_radius(radius, scale=1):
+    return max(light_radius_step, int(abs(radius) / scale / light_radius_step + 0.5) * light_radius_step)
 
 
 class Light:
-    def __init__(self, surface, pos, colour, raycasted, max_radius, min_radius=0, glow_speed=0):
+    def __init__(self, surface, pos, colour, raycasted, max_radius, min_radius=0, glow_speed=0, falloff=0,
+                 static=False, rng=random):
         self.surface = surface
         self.pos = pos
         self.raycasted = raycasted
+        self.static = static  # light does not move in the room, its visibility polygon is cached
+        self.polygon = None  # visibility polygon in screen space (raycasted lights)
+        self.shadowed = {}  # {sprite size: surface} reused by shadow_sprite
         # amplitude is difference between max and min / 2, (to account for + and -). This creates correct range for sin
         self.amplitude = (max_radius - min_radius)/2
         self.max_radius = max_radius
         self.min_radius = min_radius
         self.radius = max_radius
         self.colour = colour
-        self.time = randint(1, 500)
+        self.falloff = falloff
+        self.time = rng.randint(1, 500)  # flicker phase, rng is the lights' random stream (see replay.get_rng)
         self.glow_speed = glow_speed
-        self.image = circle_surf(self.radius, self.colour)
-
-    # TODO change angles to RADIANS for precsision
-    # use mask of tile layer to get verticies more efficiently
-    '''def raycasted_light(self, pos, tiles):
-        angles = []
-        points = []
-        polygon_points = {}
-        # get surface
-        light_surf = pygame.Surface((self.radius*2, self.radius*2))
-        light_surf.set_colorkey((0, 0, 0))
-
-        # get tile corner angles from pos for raycasting (sorted by angle ascending in a list)
-        for tile in tiles:
-            for point in get_rect_corners(tile.hitbox):
-                if self.radius - get_distance(self.pos, point) >= 0:
-                    points.append(point)
-
-        for point in points:
-            angle = get_angle(self.pos, point)
-
-            polygon_points[angle + 1] = raycast(angle + 1, pos, self.radius, tiles)
-            polygon_points[angle] = point
-            polygon_points[angle - 1] = raycast(angle - 1, pos, self.radius, tiles)
-
-            angles.append(angle)
-            angles.append(angle + 1)
-            angles.append(angle - 1)
-                #point[0] -= pos[0] - self.radius  # makes point relative to the screen origin rather than pos origin
-                #point[1] -= pos[1] - self.radius
-                #points.append(point)
-
-        for point in points:
-            pygame.draw.circle(self.surface, 'red', point, 1)
-
-        angles.sort()
-        points = []
 
-        for angle in angles:
-            points.append(polygon_points[angle])
+        # bake every radius the light can flicker through now, so updates only look sprites up
+        for scale in (1, 2):
+            for radius in range(quantise_radius(min_radius, scale), quantise_radius(max_radius, scale) + 1,
+                                light_radius_step):
+                get_light_sprite(radius, self.colour, self.falloff)
+        self.image = self.get_sprite()
+        self.masked = {}  # {sprite size: surface} reused by composite_lighting
 
-        print(points)
+    # clips the light to what is visible from its position (see EdgeIndex), static lights reuse their polygon until
+    # the edges change
+    def raycasted_light(self, edges):
+        self.polygon = edges.get_polygon(self.pos, self.max_radius, cached=self.static)
 
+    # light sprite with everything outside of the visibility polygon removed, drawn into a reused surface
+    def shadow_sprite(self, sprite, scale):
+        size = sprite.get_size()
+        if size not in self.shadowed:
+            self.shadowed[size] = pygame.Surface(size).convert()
+            self.shadowed[size].set_colorkey((0, 0, 0))
+        surf = self.shadowed[size]
+        surf.fill((0, 0, 0))
+        half = size[0] / 2
+        points = (self.polygon - self.pos) / scale + half
         if len(points) > 2:
-            pygame.draw.polygon(light_surf, self.colour, points, 0)
+            pygame.draw.polygon(surf, (255, 255, 255), points.tolist())
+        surf.blit(sprite, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+        return surf
 
-        return light_surf'''
+    # light sprite for the current radius, scale 2 for a half resolution light map
+    def get_sprite(self, scale=1):
+        sprite = get_light_sprite(quantise_radius(self.radius, scale), self.colour, self.falloff)
+        if self.polygon is not None:
+            return self.shadow_sprite(sprite, scale)
+        return sprite
 
     def get_surf(self):
-        surf = pygame.Surface((self.radius * 2, self.radius * 2))
-        surf.set_colorkey((0, 0, 0))
-        surf.blit(self.image, (0, 0))
-        return surf
+        return self.image
 
     # masks light circles based on mask image (only light up certain layers of game, which are flattened into masked image)
     def composite_lighting(self, mask_tile):
-        surf = self.get_surf()
+        size = self.image.get_size()
+        if size not in self.masked:
+            self.masked[size] = pygame.Surface(size).convert()
+            self.masked[size].set_colorkey((0, 0, 0))
+        surf = self.masked[size]
+        surf.fill((0, 0, 0))
+        surf.blit(self.image, (0, 0))
         light_center = pos_for_center(surf, self.pos)
 
         surf.blit(mask_tile.image, (-light_center[0] + mask_tile.rect.topleft[0], -light_center[1] + mask_tile.rect.topleft[1]))
-        surf.set_colorkey((0, 0, 0))
         return surf
 
-    def update(self, dt, pos, tiles=pygame.sprite.Group()):
+    # edges is the room's EdgeIndex, required for raycasted lights
+    def update(self, dt, pos, edges=None):
         # amplitude * sin(time * speed) + max_radius - amplitude
         # adding difference between max_radius and amplitude brings sin values (based on amplitude)
         # into correct range between max and min.
         self.radius = self.amplitude * sin(self.time * self.glow_speed) + self.max_radius - self.amplitude
         self.pos = pos
 
-        # if not self.raycasted:
-        self.image = circle_surf(abs(self.radius), self.colour)
-        # else:
-            # self.image = self.raycasted_light(pos, tiles)
+        if self.raycasted and edges is not None:
+            self.raycasted_light(edges)
+        self.image = self.get_sprite()
 
         self.time += round(1 * dt)
 
     # mask_tile must be of a tile class with image (surface) and position attributes (e.g. rect, 2-tuple)
-    def draw(self, mask_tile=None):
+    def draw(self, mask_tile=None, view=no_zoom):
         if mask_tile is None:
-            surf = self.image
+            surf = self.image if view.zoom == 1 else self.get_sprite(1 / view.zoom)
+        else:
+            surf = self.composite_lighting(mask_tile)  # masks are in unzoomed screen space
+        self.surface.blit(surf, pos_for_center(surf, view.point(self.pos)), special_flags=pygame.BLEND_RGB_ADD)
+
+
+# accumulates lights into one buffer (allocated once) that is composited onto the screen with a single blit.
+# BLEND_RGB_MULT darkens the screen to the ambient colour except where lit, BLEND_RGB_ADD only brightens. At half
+# resolution lights are drawn with half size sprites and the map is smoothly upscaled into a second reused buffer
+class LightMap:
+    def __init__(self, surface, ambient=(40, 40, 60), half_res=False, blend=pygame.BLEND_RGB_MULT):
+        self.surface = surface
+        self.ambient = ambient
+        self.blend = blend
+        self.scale = 2 if half_res else 1
+        size = (surface.get_width() // self.scale, surface.get_height() // self.scale)
+        self.buffer = pygame.Surface(size).convert()
+        self.upscaled = pygame.Surface(surface.get_size()).convert() if half_res else None
+        self.blits = []  # [(sprite, pos, area, flags)] queued this frame
+
+    # queues a light, drawn with the rest in draw(). view applies the camera zoom (see camera.View)
+    def add(self, light, view=no_zoom):
+        sprite = light.get_sprite(self.scale / view.zoom)
+        half = sprite.get_width() // 2
+        pos = view.point(light.pos)
+        self.blits.append((sprite, (pos[0] / self.scale - half, pos[1] / self.scale - half), None,
+                           pygame.BLEND_RGB_ADD))
+
+    def draw(self):
+        self.buffer.fill(self.ambient if self.blend == pygame.BLEND_RGB_MULT else (0, 0, 0))
+        self.buffer.blits(self.blits, doreturn=False)
+        self.blits.clear()
+        light_map = self.buffer
+        if self.upscaled is not None:
+            pygame.transform.smoothscale(self.buffer, self.upscaled.get_size(), self.upscaled)
+            light_map = self.upscaled
+        self.surface.blit(light_map, (0, 0), special_flags=self.blend)
+
+
+# -- shadow casting --
+
+# boundary edges of a tile layer's solid cells, merged into the longest straight runs and indexed in a uniform grid so
+# a light only considers the edges within its radius. Edges are in room coordinates (tile centers at x * tile_size),
+# which do not change with the camera, so polygons of static lights stay valid until invalidate() is called
+class EdgeIndex:
+    def __init__(self, level, layer_name='collideable', cell_size=64):
+        self.level = level
+        self.cell_size = cell_size
+        solid = np.asarray(level.tmx_data.get_layer_by_name(layer_name).data) != 0
+        self.edges = extract_edges(solid, tile_size)
+        self.cells = {}  # {(cell x, cell y): [edge index]}
+        for i, (x1, y1, x2, y2) in enumerate(self.edges):
+            for cx in range(floor(min(x1, x2) / cell_size), floor(max(x1, x2) / cell_size) + 1):
+                for cy in range(floor(min(y1, y2) / cell_size), floor(max(y1, y2) / cell_size) + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+        self.cache = OrderedDict()  # {(room pos, radius): polygon in room coordinates}, least recently used first
+        self.cache_size = 64
+
+    # call when the layer's tiles change
+    def invalidate(self):
+        self.cache.clear()
+
+    # edges within radius of pos (room coordinates)
+    def query(self, pos, radius):
+        candidates = set()
+        for cx in range(floor((pos[0] - radius) / self.cell_size), floor((pos[0] + radius) / self.cell_size) + 1):
+            for cy in range(floor((pos[1] - radius) / self.cell_size), floor((pos[1] + radius) / self.cell_size) + 1):
+                candidates.update(self.cells.get((cx, cy), ()))
+        return [self.edges[i] for i in candidates if segment_distance(pos, self.edges[i]) <= radius]
+
+    # visibility polygon around a screen position, returned as an (n, 2) array of screen positions
+    def get_polygon(self, pos, radius, cached=False):
+        room_pos = self.level.get_room_pos(pos)
+        key = (round(float(room_pos[0]), 1), round(float(room_pos[1]), 1), radius)
+        polygon = self.cache.get(key) if cached else None
+        if polygon is None:
+            polygon = visibility_polygon(room_pos, radius, self.query(room_pos, radius))
+            if cached:
+                self.cache[key] = polygon
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        if not polygon:
+            return np.zeros((0, 2))
+        return self.level.get_screen_points(polygon)
+
+
+# [(x1, y1, x2, y2)] boundaries between solid and empty cells of a 2-D bool grid, collinear neighbours merged
+def extract_edges(solid, size):
+    padded = np.pad(solid, 1)
+    offset = size // 2  # cells are centered on x * size
+    edges = []
+    # horizontal boundaries, row y is the boundary above cell row y
+    horizontal = padded[:-1, 1:-1] != padded[1:, 1:-1]
+    for y, row in enumerate(horizontal):
+        for start, end in get_runs(row):
+            edges.append((start * size - offset, y * size - offset, end * size - offset, y * size - offset))
+    # vertical boundaries, column x is the boundary left of cell column x
+    vertical = padded[1:-1, :-1] != padded[1:-1, 1:]
+    for x, column in enumerate(vertical.T):
+        for start, end in get_runs(column):
+            edges.append((x * size - offset, start * size - offset, x * size - offset, end * size - offset))
+    return edges
+
+
+# [(start, end)] of each run of True in a 1-D bool array
+def get_runs(values):
+    changes = np.flatnonzero(np.diff(np.concatenate(([0], values.astype(np.int8), [0]))))
+    return list(zip(changes[::2].tolist(), changes[1::2].tolist()))
+
+
+def segment_distance(point, segment):
+    x1, y1, x2, y2 = segment
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = 0 if length == 0 else max(0, min(1, ((point[0] - x1) * dx + (point[1] - y1) * dy) / length))
+    px, py = x1 + t * dx - point[0], y1 + t * dy - point[1]
+    return (px * px + py * py) ** 0.5
+
+
+# angular sweep over segment endpoints (https://www.redblobgames.com/articles/visibility/). Segments are clipped to a
+# square of half width radius around origin, which also bounds the polygon (the light sprite clips it to a circle).
+# Between two neighbouring endpoint angles every segment either spans the whole wedge or none of it, and with crossing
+# points as wedge edges too no two segments swap order inside one, so the segment nearest along the wedge's middle ray
+# is the nearest across the wedge. Nearest segments are found for all wedges at once, k segments cost O(k^2) numpy work
+def visibility_polygon(origin, radius, segments):
+    ox, oy = float(origin[0]), float(origin[1])
+    r = radius
+    clipped = [segment for segment in (clip_segment(segment, -r, -r, r, r, ox, oy) for segment in segments)
+               if segment is not None]
+    segments = np.array(clipped + [(-r, -r, r, -r), (r, -r, r, r), (r, r, -r, r), (-r, r, -r, -r)], dtype=np.float64)
+    x1, y1, x2, y2 = segments.T  # relative to origin
+    sx, sy = x2 - x1, y2 - y1
+    cross = sx * y1 - sy * x1  # distance along a ray is cross / (sx * sin - sy * cos)
+
+    # merged edges cross where solid cells touch diagonally, the nearest segment can change there too
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = sx[:, None] * sy - sy[:, None] * sx  # (segments, segments)
+        wx, wy = x1 - x1[:, None], y1 - y1[:, None]
+        ta = (wx * sy - wy * sx) / denominator
+        tb = (wx * sy[:, None] - wy * sx[:, None]) / denominator
+    a, b = np.nonzero((ta > 0) & (ta < 1) & (tb > 0) & (tb < 1))
+    px, py = x1[a] + ta[a, b] * sx[a], y1[a] + ta[a, b] * sy[a]
+
+    # wedges between neighbouring endpoint (and crossing) angles, the last wraps around to the first
+    starts = np.unique(np.arctan2(np.concatenate((y1, y2, py)), np.concatenate((x1, x2, px))))
+    ends = np.append(starts[1:], starts[0] + 2 * pi)
+    middles = (starts + ends)[:, None] / 2
+    dx, dy = np.cos(middles), np.sin(middles)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = sx * dy - sy * dx  # (wedges, segments)
+        t = cross / denominator
+        u = (dx * y1 - dy * x1) / denominator  # where along the segment the ray crosses it
+    distance = np.where((t >= 0) & (u >= 0) & (u <= 1), t, np.inf)
+    nearest = np.argmin(distance, axis=1)  # the bounding square is always hit
+
+    # where the wedge's edge rays meet its nearest segment
+    angles = np.stack((starts, ends), axis=1)
+    cos_a, sin_a = np.cos(angles), np.sin(angles)
+    t = (cross[nearest, None] / (sx[nearest, None] * sin_a - sy[nearest, None] * cos_a))
+    points = np.stack((ox + t * cos_a, oy + t * sin_a), axis=2).reshape(-1, 2)
+    return points.tolist()
+
+
+# segment (room coordinates) clipped to the rect left, top, right, bottom around ox, oy (Liang-Barsky), returned
+# relative to ox, oy. None if no part of it is inside
+def clip_segment(segment, left, top, right, bottom, ox, oy):
+    x1, y1, x2, y2 = segment
+    x1, y1, dx, dy = x1 - ox, y1 - oy, x2 - x1, y2 - y1
+    start, end = 0.0, 1.0
+    for p, q in ((-dx, x1 - left), (dx, right - x1), (-dy, y1 - top), (dy, bottom - y1)):
+        if p == 0:
+            if q < 0:
+                return None  # parallel to and outside this side
         else:
-            surf = self.composite_lighting(mask_tile)
-        self.surface.blit(surf, pos_for_center(self.image, self.pos), special_flags=pygame.BLEND_RGB_ADD)
+            t = q / p
+            if p < 0:
+                start = max(start, t)
+            else:
+                end = min(end, t)
+    if start >= end:
+        return None
+    return x1 + dx * start, y1 + dy * start, x1 + dx * end, y1 + dy * end
+
+
+# -- checks --
+
+# furthest a ray from origin at angle reaches before a solid cell's side (cells centered on x * size) or the square of
+# half width radius
+def cast_ray(solid, size, origin, angle, radius):
+    dx, dy = cos(angle), sin(angle)
+    nearest = min(radius / abs(dx) if dx else np.inf, radius / abs(dy) if dy else np.inf)
+    half = size / 2
+    for row, column in zip(*np.nonzero(solid)):
+        cx, cy = column * size, row * size
+        for x1, y1, x2, y2 in ((cx - half, cy - half, cx + half, cy - half), (cx + half, cy - half, cx + half, cy + half),
+                               (cx + half, cy + half, cx - half, cy + half), (cx - half, cy + half, cx - half, cy - half)):
+            sx, sy = x2 - x1, y2 - y1
+            denominator = sx * dy - sy * dx
+            if denominator == 0:
+                continue
+            t = (sx * (y1 - origin[1]) - sy * (x1 - origin[0])) / denominator
+            u = (dx * (y1 - origin[1]) - dy * (x1 - origin[0])) / denominator
+            if 0 <= t < nearest and 0 <= u <= 1:
+                nearest = t
+    return nearest
+
+
+# how far a ray from origin at angle reaches inside a polygon that is star shaped around origin
+def polygon_reach(polygon, origin, angle):
+    dx, dy = cos(angle), sin(angle)
+    reach = np.inf
+    for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+        sx, sy = x2 - x1, y2 - y1
+        denominator = sx * dy - sy * dx
+        if denominator == 0:
+            continue
+        t = (sx * (y1 - origin[1]) - sy * (x1 - origin[0])) / denominator
+        u = (dx * (y1 - origin[1]) - dy * (x1 - origin[0])) / denominator
+        if 0 <= t < reach and 0 <= u <= 1:
+            reach = t
+    return reach
+
+
+# compares visibility polygons with brute force ray casts from random empty points of seeded random grids, returns
+# the number of rays that reach further or shorter than tolerance px
+def check_visibility(seeds=range(8), size=12, fill=0.3, radius=60, lights=6, rays=180, tolerance=0.01):
+    mismatches = 0
+    for seed in seeds:
+        rng = random.Random(seed)
+        solid = np.array([[rng.random() < fill for _ in range(size)] for _ in range(size)])
+        edges = extract_edges(solid, tile_size)
+        empty = list(zip(*np.nonzero(~solid)))
+        for _ in range(lights):
+            row, column = rng.choice(empty)
+            origin = (column * tile_size + rng.uniform(-7, 7), row * tile_size + rng.uniform(-7, 7))
+            polygon = visibility_polygon(origin, radius, edges)
+            for _ in range(rays):
+                angle = rng.uniform(-pi, pi)
+                expected = cast_ray(solid, tile_size, origin, angle, radius)
+                if abs(polygon_reach(polygon, origin, angle) - expected) > tolerance:
+                    mismatches += 1
+    return mismatches
+
 
+# python lighting.py, exit status 1 if a visibility polygon disagrees with ray casts
+if __name__ == '__main__':
+    import sys, time
+    start = time.perf_counter()
+    mismatches = check_visibility()
+    print(f'visibility: {mismatches} of {8 * 6 * 180} rays mismatched ({time.perf_counter() - start:.1f} s)')
+    sys.exit(1 if mismatches else 0)
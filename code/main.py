@@ -3,21 +3,35 @@
 
 # screen resizing tut, dafluffypotato: https://www.youtube.com/watch?v=edJZOQwrMKw
 
-import pygame, sys, time
-from level import Level
+from startup import profiler  # first, so the imports below are timed when start-up profiling is on
+import sys, time, atexit
+# pygame only uses pkg_resources as an optional way to find its own data files (pygame.pkgdata falls back to plain
+# paths without it) and importing it was a third of start-up, so it is hidden while pygame imports. If something has
+# already loaded it, it is left as it is
+hide_pkg_resources = 'pkg_resources' not in sys.modules
+if hide_pkg_resources:
+    sys.modules['pkg_resources'] = None
+import pygame
+if hide_pkg_resources:
+    del sys.modules['pkg_resources']
+from world import World
+from present import Presenter
+from quality import QualityGovernor
 from text import Font
 from game_data import *
-from support import resource_path
-
-# General setup
-pygame.mixer.pre_init(44100, -16, 2, 512)
-pygame.init()
-pygame.mixer.init()
+from support import resource_path, load_image
+from replay import Recorder
+
+# General setup -- only the display is initialised up front. The mixer is not initialised while nothing plays audio
+# (when sounds are added, init it before loading them with pygame.mixer.init(44100, -16, 2, 512)) and joysticks are
+# initialised once the first room is running (see init_joysticks)
+with profiler.phase('display init'):
+    pygame.display.init()
 clock = pygame.time.Clock()
 #pygame.mouse.set_visible(False)
 
-# window and screen Setup ----- window is real pygame window. screen is surface everything is placed on then resized
-# to blit on window. (art pixel == game pixel)
+# window and screen Setup ----- window is real pygame window. screen is surface everything is placed on then scaled
+# onto the window by the presenter. (art pixel == game pixel)
 # https://stackoverflow.com/questions/54040397/pygame-rescale-pixel-size
 
 # https://www.pygame.org/docs/ref/display.html#pygame.display.set_mode
@@ -25,25 +39,34 @@ clock = pygame.time.Clock()
 # vsync only works with scaled flag. Scaled flag will only work in combination with certain other flags.
 # although resizeable flag is present, window can not be resized, only fullscreened with vsync still on
 # vsync prevents screen tearing (multiple frames displayed at the same time creating a shuddering wave)
-window = pygame.display.set_mode((int(screen_width * scaling_factor), int(screen_height * scaling_factor)), pygame.RESIZABLE | pygame.DOUBLEBUF | pygame.SCALED, vsync=True)
+# with the scaled flag the screen is the display surface and SDL upscales it, otherwise the presenter integer scales it
+with profiler.phase('window'):
+    presenter = Presenter((screen_width, screen_height), scaling_factor, pygame.RESIZABLE | pygame.DOUBLEBUF, vsync=True)
 
 # all pixel values in game logic should be based on the screen! NO .display FUNCTIONS!!
-screen = pygame.Surface((screen_width, screen_height))  # the display surface, re-scaled and blit to the window
+screen = presenter.screen  # the logical (unscaled) surface everything is drawn to
 screen_rect = screen.get_rect()  # used for camera scroll boundaries
 
 # caption and icon
 pygame.display.set_caption('Larry the Cosmic Horror')
-pygame.display.set_icon(pygame.image.load(resource_path('../assets/icon/app_icon.png')))
+with profiler.phase('icon'):
+    pygame.display.set_icon(load_image(resource_path('../assets/icon/app_icon.png')))
+
+# controller joysticks, filled in place by init_joysticks (levels and cameras keep a reference to the list)
+joysticks = []
+
+
+def init_joysticks():
+    pygame.joystick.init()
+    joysticks.extend(pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count()))
+    print(f"joy {len(joysticks)}")
+    for joystick in joysticks:
+        joystick.init()
 
-# get controller joysticks
-pygame.joystick.init()
-joysticks = [pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count())]
-print(f"joy {len(joysticks)}")
-for joystick in joysticks:
-    joystick.init()
 
 # font
-font = Font(fonts['small_font'], 'white')
+with profiler.phase('font'):
+    font = Font(fonts['small_font'], 'white')
 
 
 def main_menu():
@@ -52,6 +75,7 @@ def main_menu():
 
 
 def game():
+    global game_speed
     click = False
 
     # delta time
@@ -60,8 +84,40 @@ def game():
     previous_time = time.time()
     fps = clock.get_fps()
 
+    starting_room = '../rooms/tiled_rooms/room_0.tmx'
     starting_spawn = 'initial'
-    level = Level('../rooms/tiled_rooms/room_0.tmx', screen, screen_rect, joysticks, starting_spawn)
+    # world streams neighbouring rooms in the background and swaps to them at room transitions
+    with profiler.phase('world'):
+        world = World('../rooms/tiled_worlds/habitat.world', screen, screen_rect, joysticks)
+    # the first room is also built on the streaming thread, a loading frame is shown until it is ready
+    with profiler.phase('first room'):
+        world.load_room(starting_room, starting_spawn)
+        loading_frames = 0
+        while not world.room_ready(starting_room, starting_spawn):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+            screen.fill('black')
+            loading_surf = font.get_text_surface('loading')
+            screen.blit(loading_surf, loading_surf.get_rect(center=screen_rect.center))
+            presenter.present()
+            if not loading_frames:
+                profiler.mark('first frame')
+            loading_frames += 1
+            clock.tick(game_speed)
+        profiler.mark(f'room ready after {loading_frames} loading frames')
+        world.enter_room(starting_room, starting_spawn)
+    # input from here on is recorded (see replay.py), written on exit
+    if record_replay:
+        world.input.recorder = Recorder(world.seed, starting_room, starting_spawn, replay_hash_interval)
+        atexit.register(world.input.recorder.save, replay_path)
+    with profiler.phase('joysticks'):
+        init_joysticks()
+    profiler.report()
+    previous_time = time.time()  # the loading frames are not simulated
+    # lowers simulation/render detail when frames run over budget, restores it when there is headroom
+    governor = QualityGovernor()
 
     run = True
     while run:
@@ -70,10 +126,10 @@ def game():
         dt *= 60  # keeps units such that movement += 1 * dt means add 1px if at 60fps
         previous_time = time.time()
         fps = clock.get_fps()
+        frame_start = time.perf_counter()  # frame work time excludes the wait in clock.tick and vsync
 
         # x and y mouse pos
-        mx, my = pygame.mouse.get_pos()
-        mouse_pos = (mx // scaling_factor, my // scaling_factor)
+        mouse_pos = presenter.to_screen(pygame.mouse.get_pos())
 
         # -- INPUT --
         click = False
@@ -83,6 +139,9 @@ def game():
                 pygame.quit()
                 sys.exit()
 
+            if event.type == pygame.VIDEORESIZE:
+                presenter.resize()
+
             # Keyboard events
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_COMMA or event.key == pygame.K_ESCAPE:
@@ -91,17 +150,15 @@ def game():
                     sys.exit()
                 # TODO Debugging only, remove
                 elif event.key == pygame.K_x:
-                    global game_speed
                     if game_speed == 60:
                         game_speed = 5
                     else:
                         game_speed = 60
                 elif event.key == pygame.K_f:
-                    pygame.display.toggle_fullscreen()
-                    level.set_pause()
+                    presenter.toggle_fullscreen()
+                    world.input.request('pause')
                 elif event.key == pygame.K_r:
-                    level = Level('../rooms/tiled_rooms/room_0.tmx', screen, screen_rect, joysticks,
-                                  starting_spawn)
+                    world.input.request('restart')
 
             # Mouse events
             elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -116,15 +173,19 @@ def game():
                     sys.exit()
 
         # -- Update --
-        screen.fill((48, 99, 142))  # fill background with colour
-        level.update(dt)  # runs level processes
+        world.update(dt)  # runs level processes and room transitions (the level clears or restores the screen)
 
-        font.render(f'FPS: {str(clock.get_fps())}', screen, (0, 0))  # TODO Debugging only, remove
+        fps_surf = font.get_text_surface(f'FPS: {round(clock.get_fps())}')  # rounded so the rendered string is usually cached  TODO Debugging only, remove
+        world.level.renderer.mark(screen.blit(fps_surf, (0, 0)))
+        if world.level.dev_debug:
+            governor.draw(screen, font, (0, font.line_height + font.line_spacing))
+            world.level.jobs.draw(screen, font, (screen_width // 2, font.line_height + font.line_spacing))
 
-        window.blit(pygame.transform.scale(screen, window.get_rect().size), (0, 0))  # scale screen to window
+        governor.update((time.perf_counter() - frame_start) * 1000, world.level, world.input, game_speed)
 
         # -- Render --
-        pygame.display.update()
+        # only the dirty regions when the camera is still, SCALED presents the whole texture whatever the rects
+        presenter.present(None if presenter.scaled else world.level.renderer.get_update_rects())
         clock.tick(game_speed)
 
 
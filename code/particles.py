@@ -1,67 +1,95 @@
-import pygame, random
+import pygame
+import numpy as np
+from itertools import repeat
 from support import circle_surf
-
-
-class Particle(pygame.sprite.Sprite):
-    def __init__(self, screen, colour, apply_gravity=False):
-        super().__init__()
-        self.screen = screen
-
-        # gravity
-        self.apply_gravity = apply_gravity
-        self.gravity_vel = 4
-
-        # position, velocity, direction, timer
-        self.x = random.randint(0, screen.get_width())
-        self.y = random.randint(0, screen.get_height())
-        self.vel = [random.randint(0, 18) / 10 - 1, random.randint(0, 18) / 10 - 1]
-        self.direction = pygame.math.Vector2()
-        self.timer = random.randint(1, 10)
-        self.size = random.randint(1, 3)
-        while self.size > self.timer:
-            self.timer = random.randint(1, 10)
-
-        # colour
-        self.colour = colour
-
-# -- movement methods --
-
-    def gravity(self):
-        self.direction.y += self.gravity_vel
-
-    def apply_x(self):
-        self.direction.x += self.x
-
-        self.x += self.direction.x
-
-    def apply_y(self):
-        self.direction.y += self.y
-
-        if self.apply_gravity:
-            self.gravity()
-
-        self.y += self.direction.y
-
-    def update(self):
-        self.direction = pygame.math.Vector2()  # reset direction
-
-        # apply movement directions
-        self.apply_x()
-        self.apply_y()
-
-        if self.y + self.size >= 70:
-            self.kill()
-        self.timer -= 0.1
-        self.size -= 0.1
-        if self.size < 1:
-            self.size = 1
-
-        if self.timer <= 0:
-            self.kill()
+from systems import rotate_points
+
+
+# pooled particle emitter. Particle state lives in preallocated arrays (capacity particles), dead particles go on a
+# free list and are reused by emit, and every live particle is updated in one vectorised step. Drawing is one blits call
+# of pre-rendered circle sprites indexed by colour and size, so nothing is allocated per particle per frame
+class ParticleEmitter:
+    def __init__(self, surface, capacity, colours, max_size=3, gravity=0.0, shrink=0.1, blend=pygame.BLEND_RGB_ADD,
+                 seed=None):
+        self.surface = surface
+        self.capacity = capacity
+        self.gravity = gravity  # added to y velocity per frame
+        self.shrink = shrink  # size lost per frame (particles never shrink below 1)
+        self.blend = blend
+        self.rng = np.random.default_rng(seed)
+
+        # - particle state -
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)  # frames left
+        self.size = np.zeros(capacity, dtype=np.float32)  # radius
+        self.colour = np.zeros(capacity, dtype=np.int32)  # index into colours
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # free list, a stack of dead particle indices (top is free[free_count - 1])
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self.free_count = capacity
+
+        # - sprites - sprites[colour index][radius], radius 0 is unused
+        self.max_size = max_size
+        self.sprites = [[None] + [circle_surf(radius, colour) for radius in range(1, max_size + 1)]
+                        for colour in colours]
+        # flat lookup so sprites are picked with one array index, sprite_bank[colour * (max_size + 1) + radius]
+        self.sprite_bank = np.array([sprite for sizes in self.sprites for sprite in sizes], dtype=object)
+
+    def get_count(self):
+        return self.capacity - self.free_count
+
+    # spawns up to n particles around pos (spread is the half width of the square they spawn in). Ranges are
+    # (min, max), velocity is per axis. Returns how many were spawned (fewer if the pool is full)
+    def emit(self, n, pos, spread=0, velocity=(-1, 1), life=(10, 60), size=(1, 3), colour=None):
+        n = min(n, self.free_count)
+        if n == 0:
+            return 0
+        self.free_count -= n
+        index = self.free[self.free_count:self.free_count + n]
+
+        rng = self.rng
+        self.pos[index] = np.asarray(pos, dtype=np.float32) + rng.uniform(-spread, spread, (n, 2)) if spread else pos
+        self.vel[index] = rng.uniform(velocity[0], velocity[1], (n, 2))
+        self.life[index] = rng.uniform(life[0], life[1], n)
+        self.size[index] = rng.uniform(size[0], min(size[1], self.max_size), n)
+        self.colour[index] = rng.integers(0, len(self.sprites), n) if colour is None else colour
+        self.alive[index] = True
+        return n
+
+    def update(self, dt=1):
+        alive = self.alive
+        if not self.get_count():
+            return
+        self.vel[alive, 1] += self.gravity * dt
+        self.pos[alive] += self.vel[alive] * dt
+        self.life[alive] -= dt
+        np.maximum(self.size - self.shrink * dt, 1, out=self.size, where=alive)
+
+        # return dead particles to the free list
+        dead = np.flatnonzero(alive & (self.life <= 0))
+        if len(dead):
+            alive[dead] = False
+            self.free[self.free_count:self.free_count + len(dead)] = dead
+            self.free_count += len(dead)
+
+    # particles are in screen space, so they move with the camera like entities (see systems.py)
+    def apply_camera(self, scroll_value, rot_value, origin):
+        alive = self.alive
+        pos = self.pos[alive]
+        pos -= np.asarray(scroll_value, dtype=np.float32)
+        if rot_value != 0:
+            rotate_points(pos, np.asarray(origin, dtype=np.float32), rot_value)
+        self.pos[alive] = pos
 
     def draw(self):
-        surf = circle_surf(int(self.size), self.colour)
-        surf_rect = surf.get_rect()
-        surf_rect.centerx = int(self.x)
-        surf_rect.centery = int(self.y)
-        self.screen.blit(surf, surf_rect.topleft, special_flags=pygame.BLEND_RGB_ADD)
+        index = np.flatnonzero(self.alive)
+        if not len(index):
+            return
+        radius = self.size[index].astype(np.int32)
+        topleft = self.pos[index] - radius[:, np.newaxis]
+        sprites = self.sprite_bank[self.colour[index] * (self.max_size + 1) + radius]
+        # built lazily so no per particle list or tuple outlives the blits call
+        self.surface.blits(zip(sprites.tolist(), zip(topleft[:, 0].tolist(), topleft[:, 1].tolist()),
+                               repeat(None), repeat(self.blend)), doreturn=False)
@@ -0,0 +1,429 @@
+import heapq, math, random
+import numpy as np
+
+inf = float('inf')
+# 8 connected lattice, (di, dj, cost in lattice steps)
+neighbours = [(1, 0, 1), (0, 1, 1), (-1, 0, 1), (0, -1, 1),
+              (1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (-1, -1, math.sqrt(2))]
+
+
+# walkable lattice over a room, nodes are (i, j) at room position (i * spacing + offset, j * spacing + offset).
+# Room positions are what Level.get_room_pos returns (tile centers at x * tile_size), they do not change with the
+# camera so a plan stays valid while the room scrolls and rotates
+class Lattice:
+    def __init__(self, solid, tile_size, spacing):
+        self.spacing = spacing
+        self.offset = -(tile_size // 2)  # lattice starts at the room's edge
+        height, width = solid.shape
+        # the solid cell containing every lattice point (tiles span tile_size centered on their position)
+        self.width = (width * tile_size - 1) // spacing + 1
+        self.height = (height * tile_size - 1) // spacing + 1
+        cols = np.arange(self.width) * spacing // tile_size
+        rows = np.arange(self.height) * spacing // tile_size
+        self.passable = ~solid[rows[:, np.newaxis], cols[np.newaxis, :]]  # [j, i]
+
+    def is_passable(self, node):
+        i, j = node
+        return 0 <= i < self.width and 0 <= j < self.height and bool(self.passable[j, i])
+
+    # nearest node to a room position
+    def get_node(self, pos):
+        return (int(round((pos[0] - self.offset) / self.spacing)), int(round((pos[1] - self.offset) / self.spacing)))
+
+    # nearest passable node (checking the node and its neighbours), None if there is none
+    def get_free_node(self, pos):
+        node = self.get_node(pos)
+        if self.is_passable(node):
+            return node
+        candidates = [(node[0] + di, node[1] + dj) for di, dj, _ in neighbours]
+        candidates = [n for n in candidates if self.is_passable(n)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda n: (self.get_pos(n)[0] - pos[0]) ** 2 + (self.get_pos(n)[1] - pos[1]) ** 2)
+
+    def get_pos(self, node):
+        return node[0] * self.spacing + self.offset, node[1] * self.spacing + self.offset
+
+    # marks nodes passable or not (e.g. a door closing), planners must then be told with DStarLite.update_nodes
+    def set_passable(self, nodes, passable):
+        for i, j in nodes:
+            self.passable[j, i] = passable
+
+
+# D* Lite (Koenig and Likhachev) over a Lattice. The search runs backwards from the goal and keeps its g/rhs values
+# between calls, so when the start moves (the creature walks along the path) or nodes change passability only the
+# affected part of the search tree is repaired instead of searching from scratch. Open list entries are removed lazily
+class DStarLite:
+    def __init__(self, lattice, start, goal):
+        self.lattice = lattice
+        self.start = start
+        self.goal = goal
+        self.reset()
+        self.expanded = 0  # nodes expanded by the last compute (for profiling)
+
+    # forgets the search tree, the next compute searches from the goal again
+    def reset(self):
+        self.last = self.start  # start at the last key modifier update
+        self.km = 0  # key modifier, grows as the start moves so old open list keys stay valid lower bounds
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.open = {self.goal: self.key(self.goal)}  # {node: current key}, heap entries with other keys are stale
+        self.heap = [(self.open[self.goal], self.goal)]
+
+    # octile distance in lattice steps, consistent for the 8 connected lattice
+    @staticmethod
+    def heuristic(a, b):
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return max(dx, dy) + (math.sqrt(2) - 1) * min(dx, dy)
+
+    def key(self, node):
+        m = min(self.g.get(node, inf), self.rhs.get(node, inf))
+        return m + self.heuristic(self.start, node) + self.km, m
+
+    # (neighbour, cost) of passable neighbours, empty for impassable nodes
+    def successors(self, node):
+        is_passable = self.lattice.is_passable
+        if not is_passable(node):
+            return []
+        i, j = node
+        return [((i + di, j + dj), cost) for di, dj, cost in neighbours if is_passable((i + di, j + dj))]
+
+    def update_vertex(self, node):
+        if node != self.goal:
+            g = self.g
+            self.rhs[node] = min((cost + g.get(s, inf) for s, cost in self.successors(node)), default=inf)
+        if self.g.get(node, inf) != self.rhs.get(node, inf):
+            key = self.key(node)
+            self.open[node] = key
+            heapq.heappush(self.heap, (key, node))
+        else:
+            self.open.pop(node, None)
+
+    def compute(self):
+        self.expanded = 0
+        heap, open, g, rhs = self.heap, self.open, self.g, self.rhs
+        start = self.start
+        while heap:
+            key_old, node = heap[0]
+            if open.get(node) != key_old:
+                heapq.heappop(heap)  # stale entry
+                continue
+            if not (key_old < self.key(start) or rhs.get(start, inf) != g.get(start, inf)):
+                break
+            heapq.heappop(heap)
+            self.expanded += 1
+            key_new = self.key(node)
+            if key_old < key_new:
+                open[node] = key_new
+                heapq.heappush(heap, (key_new, node))
+            elif g.get(node, inf) > rhs.get(node, inf):
+                g[node] = rhs[node]
+                del open[node]
+                for s, _ in self.successors(node):
+                    self.update_vertex(s)
+            else:
+                g[node] = inf
+                for s, _ in self.successors(node):
+                    self.update_vertex(s)
+                self.update_vertex(node)
+
+    # the creature has moved, the search tree is reused
+    def move_start(self, start):
+        if start != self.start:
+            self.km += self.heuristic(self.last, start)
+            self.last = start
+            self.start = start
+
+    # nodes whose passability changed (see Lattice.set_passable)
+    def update_nodes(self, nodes):
+        changed = set()
+        for i, j in nodes:
+            changed.add((i, j))
+            changed.update((i + di, j + dj) for di, dj, _ in neighbours)
+        self.km += self.heuristic(self.last, self.start)
+        self.last = self.start
+        for node in changed:
+            self.update_vertex(node)
+
+    # nodes from start to goal following the cheapest successors, empty if the goal is unreachable. Only the start is
+    # sure to be settled once compute stops (keys that tie but for rounding can stop it a node early), so if the walk
+    # reaches a node still on the open list the search is started over, which settles every node it walks through
+    def get_path(self):
+        path = self.walk()
+        if path is None:
+            self.reset()
+            path = self.walk()
+        return path or []
+
+    # path following the cheapest successors through settled nodes, None if it reaches an unsettled one
+    def walk(self):
+        self.compute()
+        g, open = self.g, self.open
+        if g.get(self.start, inf) == inf:
+            return []
+        path = [self.start]
+        node = self.start
+        while node != self.goal:
+            node = min(self.successors(node), key=lambda s: s[1] + g.get(s[0], inf))[0]
+            if node in open:
+                return None
+            path.append(node)
+        return path
+
+
+# samples random walkable points. A summed area table over the free cells of a room's occupancy grid counts the free
+# cells in any rectangle in O(1), so a uniformly random free cell within a square window is found with two binary
+# searches (row, then column) instead of rejection sampling, in bounded time however cramped the room is
+class FreeSpaceSampler:
+    def __init__(self, solid, tile_size):
+        self.tile_size = tile_size
+        self.height, self.width = solid.shape
+        free = (~solid).astype(np.int64)
+        self.row_sums = np.zeros((self.height, self.width + 1), dtype=np.int64)  # [row, col]: free cells before col
+        np.cumsum(free, axis=1, out=self.row_sums[:, 1:])
+        self.table = np.zeros((self.height + 1, self.width + 1), dtype=np.int64)  # free cells above and left of
+        np.cumsum(self.row_sums, axis=0, out=self.table[1:])
+
+    # free cells in rows [top, bottom) and cols [left, right)
+    def count(self, left, top, right, bottom):
+        table = self.table
+        return int(table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left])
+
+    # random free room position within radius (a square, like the old rejection sampling) of room position pos,
+    # None if there is no free cell in range. Positions are uniform over free cells then within the cell
+    def sample(self, pos, radius, rng=random):
+        half = self.tile_size // 2
+        # cells whose centers (x * tile_size) are within range, clipped to the room
+        left = max(0, math.ceil((pos[0] - radius) / self.tile_size))
+        right = min(self.width, math.floor((pos[0] + radius) / self.tile_size) + 1)
+        top = max(0, math.ceil((pos[1] - radius) / self.tile_size))
+        bottom = min(self.height, math.floor((pos[1] + radius) / self.tile_size) + 1)
+        if left >= right or top >= bottom:
+            return None
+        total = self.count(left, top, right, bottom)
+        if total == 0:
+            return None
+        k = rng.randrange(total)
+
+        # first row where the free cells from top up to and including it exceed k
+        low, high = top, bottom - 1
+        while low < high:
+            mid = (low + high) // 2
+            if self.count(left, top, right, mid + 1) > k:
+                high = mid
+            else:
+                low = mid + 1
+        row = low
+        k -= self.count(left, top, right, row)
+        # the k-th free cell of the row within the window
+        sums = self.row_sums[row]
+        col = int(np.searchsorted(sums[left + 1:right + 1] - sums[left], k, side='right')) + left
+
+        return (col * self.tile_size + rng.uniform(-half, half - 1),
+                row * self.tile_size + rng.uniform(-half, half - 1))
+
+
+# navigation mesh over a room's walkable space: convex rects (see compiled_level.merge_free_rects) linked by the
+# edges they share (portals). Planning runs A* over the rects, tens of nodes instead of a lattice's thousands, then
+# pulls the path tight through the crossed portals with the funnel algorithm. Positions are room positions
+class NavMesh:
+    def __init__(self, walkable, portals, solid, tile_size):
+        self.solid = solid
+        self.tile_size = tile_size
+        half = tile_size // 2  # compiled rects are from the room's corner, room positions are from the first tile center
+        self.rects = np.array(walkable, dtype=np.float64).reshape(-1, 4)
+        self.rects[:, :2] -= half
+        self.links = [[] for _ in range(len(self.rects))]  # [rect: [(neighbour rect, portal end, portal end)]]
+        for a, b, x1, y1, x2, y2 in np.array(portals, dtype=np.float64).reshape(-1, 6).tolist():
+            p1, p2 = (x1 - half, y1 - half), (x2 - half, y2 - half)
+            self.links[int(a)].append((int(b), p1, p2))
+            self.links[int(b)].append((int(a), p1, p2))
+        self.expanded = 0  # rects expanded by the last search (for profiling)
+
+    # index of the rect containing pos, or the nearest rect if pos is not walkable (None for an empty mesh)
+    def locate(self, pos):
+        if not len(self.rects):
+            return None
+        x, y, w, h = self.rects.T
+        dx = np.maximum(np.maximum(x - pos[0], pos[0] - (x + w)), 0)
+        dy = np.maximum(np.maximum(y - pos[1], pos[1] - (y + h)), 0)
+        return int(np.argmin(dx * dx + dy * dy))
+
+    # path of room positions from start to goal (both included), empty if the goal can not be reached. Corners are
+    # kept radius away from walls so a body of that radius fits through
+    def find_path(self, start, goal, radius=0):
+        first, last = self.locate(start), self.locate(goal)
+        if first is None:
+            return []
+        if first == last:
+            return [tuple(start), tuple(goal)]
+
+        # A* over rects, a rect is reached at the midpoint of the portal it was entered through
+        entry = {first: tuple(start)}
+        g = {first: 0}
+        came_from = {}  # {rect: (previous rect, portal end, portal end)}
+        heap = [(0, first)]
+        closed = set()
+        self.expanded = 0
+        while heap:
+            rect = heapq.heappop(heap)[1]
+            if rect in closed:
+                continue
+            if rect == last:
+                break
+            closed.add(rect)
+            self.expanded += 1
+            for neighbour, p1, p2 in self.links[rect]:
+                if neighbour in closed:
+                    continue
+                mid = ((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2)
+                cost = g[rect] + math.dist(entry[rect], mid)
+                if cost < g.get(neighbour, inf):
+                    g[neighbour] = cost
+                    entry[neighbour] = mid
+                    came_from[neighbour] = (rect, p1, p2)
+                    heapq.heappush(heap, (cost + math.dist(mid, goal), neighbour))
+        if last not in came_from:
+            return []
+
+        # portals crossed from start to goal, as (left, right) seen when crossing
+        portals = []
+        rect = last
+        while rect != first:
+            previous, p1, p2 = came_from[rect]
+            portals.append(self.orient_portal(previous, rect, p1, p2, radius))
+            rect = previous
+        portals.reverse()
+        return string_pull(tuple(start), tuple(goal), portals)
+
+    # portal ends ordered (left, right) for travel from rect a into rect b, each end pulled radius in from walls
+    def orient_portal(self, a, b, p1, p2, radius):
+        ax, ay, aw, ah = self.rects[a]
+        bx, by, bw, bh = self.rects[b]
+        direction = (bx + bw / 2 - (ax + aw / 2), by + bh / 2 - (ay + ah / 2))
+        if triarea2((0, 0), direction, (p1[0] - p2[0], p1[1] - p2[1])) > 0:
+            p1, p2 = p2, p1
+        length = math.dist(p1, p2)
+        inset = min(radius, length / 2)
+        if inset and length:
+            ux, uy = (p2[0] - p1[0]) / length, (p2[1] - p1[1]) / length
+            if self.touches_wall(p1):
+                p1 = (p1[0] + ux * inset, p1[1] + uy * inset)
+            if self.touches_wall(p2):
+                p2 = (p2[0] - ux * inset, p2[1] - uy * inset)
+        return p1, p2
+
+    # whether any of the four cells meeting at a cell corner (room position) is solid or outside the room
+    def touches_wall(self, point):
+        half = self.tile_size // 2
+        col = int(round((point[0] + half) / self.tile_size))
+        row = int(round((point[1] + half) / self.tile_size))
+        height, width = self.solid.shape
+        for r in (row - 1, row):
+            for c in (col - 1, col):
+                if not (0 <= r < height and 0 <= c < width) or self.solid[r, c]:
+                    return True
+        return False
+
+
+# twice the signed area of triangle a, b, c
+def triarea2(a, b, c):
+    return (c[0] - a[0]) * (b[1] - a[1]) - (b[0] - a[0]) * (c[1] - a[1])
+
+
+# simple stupid funnel algorithm (Mononen): walks the portals keeping the funnel from the current apex as narrow as
+# possible, a new corner is added whenever one side of the funnel crosses over the other
+def string_pull(start, goal, portals):
+    portals = [(start, start)] + portals + [(goal, goal)]
+    path = [start]
+    apex = left = right = start
+    apex_index = left_index = right_index = 0
+    i = 1
+    while i < len(portals):
+        portal_left, portal_right = portals[i]
+        # tighten the right side
+        if triarea2(apex, right, portal_right) <= 0:
+            if apex == right or triarea2(apex, left, portal_right) > 0:
+                right, right_index = portal_right, i
+            else:
+                # right crossed over left, left is a corner
+                path.append(left)
+                apex, apex_index = left, left_index
+                left = right = apex
+                left_index = right_index = apex_index
+                i = apex_index + 1
+                continue
+        # tighten the left side
+        if triarea2(apex, left, portal_left) >= 0:
+            if apex == left or triarea2(apex, right, portal_left) < 0:
+                left, left_index = portal_left, i
+            else:
+                path.append(right)
+                apex, apex_index = right, right_index
+                left = right = apex
+                left_index = right_index = apex_index
+                i = apex_index + 1
+                continue
+        i += 1
+    if path[-1] != goal:
+        path.append(goal)
+    return path
+
+
+# -- checks --
+
+# cost of the cheapest path from start to goal over a lattice, inf if there is none
+def dijkstra(lattice, start, goal):
+    costs = {goal: 0}
+    heap = [(0, goal)]
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if node == start:
+            return cost
+        if cost > costs[node]:
+            continue
+        for di, dj, step in neighbours:
+            s = (node[0] + di, node[1] + dj)
+            if lattice.is_passable(s) and cost + step < costs.get(s, inf):
+                costs[s] = cost + step
+                heapq.heappush(heap, (cost + step, s))
+    return inf
+
+
+# plans on seeded random rooms while the start walks along the path and random nodes open and close, compared with
+# Dijkstra from scratch. Returns the number of plans that are not a connected path through passable nodes as cheap
+# as Dijkstra's (or that miss a reachable goal) and the number of plans made
+def check_dstar(seeds=range(200), size=16, fill=0.3, plans=10, tolerance=1e-6):
+    mismatches = checked = 0
+    for seed in seeds:
+        rng = random.Random(seed)
+        lattice = Lattice(np.array([[rng.random() < fill for _ in range(size)] for _ in range(size)]), 16, 8)
+        free = [(i, j) for j in range(lattice.height) for i in range(lattice.width) if lattice.passable[j, i]]
+        planner = DStarLite(lattice, rng.choice(free), rng.choice(free))
+        for _ in range(plans):
+            path = planner.get_path()
+            checked += 1
+            expected = dijkstra(lattice, planner.start, planner.goal)
+            cost = sum(math.dist(a, b) for a, b in zip(path, path[1:])) if path else inf
+            connected = all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(path, path[1:]))
+            valid = not path or (path[0] == planner.start and path[-1] == planner.goal and connected and
+                                 all(lattice.is_passable(node) for node in path))
+            if not valid or not (cost == expected or abs(cost - expected) < tolerance):
+                mismatches += 1
+            if len(path) > 2:
+                planner.move_start(path[2])
+            elif path:
+                break  # arrived
+            changed = [node for node in (rng.choice(free) for _ in range(3)) if node not in (planner.start, planner.goal)]
+            lattice.set_passable(changed, rng.random() < 0.5)
+            planner.update_nodes(changed)
+    return mismatches, checked
+
+
+# python pathfinding.py, exit status 1 if a D* Lite plan disagrees with Dijkstra
+if __name__ == '__main__':
+    import sys, time
+    start = time.perf_counter()
+    mismatches, checked = check_dstar()
+    print(f'pathfinding: {mismatches} of {checked} D* Lite plans mismatched ({time.perf_counter() - start:.1f} s)')
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,52 @@
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+# runs simulation and rendering as a two stage pipeline. Threaded, the simulation of frame N + 1 runs on a worker thread
+# while the calling thread renders frame N, so a frame costs the longer of the two rather than their sum (NumPy and
+# pygame blits release the GIL, so the stages really overlap on multi-core machines). Simulation returns a Frame of
+# snapshots (copies) and render only reads that Frame, never live state. The swap is explicit: step waits for the frame
+# in flight, starts the next and renders the finished one, so what is shown is one frame behind the simulation. The
+# first step simulates on the calling thread (there is nothing to render yet), so every step's input is simulated once
+# and in order. Unthreaded, step simulates then renders the same frame on the calling thread (deterministic, nothing is
+# copied). The worker thread is stopped when the pipeline is garbage collected
+class FramePipeline:
+    def __init__(self, simulate, render, threaded=False):
+        self.simulate = simulate  # simulate(*args) -> Frame
+        self.render = render  # render(Frame)
+        self.threaded = threaded
+        self.executor = None  # started on the first threaded step
+        self.back = None  # frame being simulated (future), None until the second threaded step
+        self.front = None  # frame last rendered
+
+    def step(self, *args):
+        if not self.threaded:
+            self.front = self.simulate(*args)
+        elif self.executor is None:
+            self.executor = ThreadPoolExecutor(1, thread_name_prefix='simulation')
+            weakref.finalize(self, self.executor.shutdown, wait=False)
+            self.front = self.simulate(*args)  # nothing in flight yet, the next step starts the worker
+        else:
+            if self.back is not None:
+                self.front = self.back.result()  # swap, rethrows anything raised by the simulation
+            self.back = self.executor.submit(self.simulate, *args)
+        self.render(self.front)
+
+
+# everything the level's render reads for one simulated frame (see Level.simulate). When the pipeline is threaded the
+# entities are snapshots, otherwise they are the live objects
+class Frame:
+    def __init__(self, view, still, pause, dev_debug, transition, background_layers, collideable, foreground_layers,
+                 creatures, player, flocks, room_corners):
+        self.view = view  # camera zoom transform (see camera.View)
+        self.still = still  # camera did not scroll or rotate and nothing forces a full redraw
+        self.pause = pause
+        self.dev_debug = dev_debug
+        self.transition = transition  # room transition trigger the player is in
+        self.background_layers = background_layers
+        self.collideable = collideable
+        self.foreground_layers = foreground_layers
+        self.creatures = creatures
+        self.player = player
+        self.flocks = flocks  # in process flocks and flock workers
+        self.room_corners = room_corners  # (4, 2)
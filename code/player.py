@@ -1,13 +1,20 @@
-import pygame, math
-from support import get_distance, get_angle_rad
+import pygame, copy
+import numpy as np
+from ecs import Entity, component
+from camera import no_zoom
 
+player_components = {'pos': (np.float64, 2)}
 
-class Player(pygame.sprite.Sprite):
-    def __init__(self, spawn, screen_surface, radius):
-        super().__init__()
+
+class Player(pygame.sprite.Sprite, Entity):
+    pos = component('pos')
+
+    def __init__(self, registry, spawn, screen_surface, radius):
+        pygame.sprite.Sprite.__init__(self)
+        registry.register('player', **player_components)
+        Entity.__init__(self, registry, 'player', pos=(spawn.x, spawn.y))
         self.surface = screen_surface
 
-        self.pos = [spawn.x, spawn.y]
         self.prev_pos = [spawn.x, spawn.y]
         self.radius = radius
 
@@ -15,8 +22,8 @@ class Player(pygame.sprite.Sprite):
         self.speed = 5
         self.direction = [0, 0]
 
-    def get_input(self):
-        keys = pygame.key.get_pressed()
+    # keys is the frame's key state (see replay.FrameInput)
+    def get_input(self, keys):
 
         if keys[pygame.K_w]:
             self.direction[1] -= self.speed
@@ -31,32 +38,36 @@ class Player(pygame.sprite.Sprite):
     def get_pos(self):
         return self.pos
 
+    # tiles is a TileLayer, pushed out of its baked colliders back towards where the player came from
     def collision(self, tiles):
-        for tile in tiles:
-            distance = get_distance(self.pos, tile.hitbox.center)
-            if distance - (tile.radius + self.radius) < 0:
-                angle = get_angle_rad(self.pos, self.prev_pos)  # angle to move back towards where seg came from
-                self.pos[0] += math.sin(angle) * (tile.radius + self.radius - distance + 1)
-                self.pos[1] += math.cos(angle) * (tile.radius + self.radius - distance + 1)
-
-    def apply_scroll(self, scroll_value):
-        self.pos[0] -= int(scroll_value[0])
-        self.pos[1] -= int(scroll_value[1])
-
-    def update(self, tiles, rot, dt, scroll_value):
+        pos = tiles.collide_circle(self.pos, self.prev_pos, self.radius)
+        if pos is not None:
+            self.pos[0], self.pos[1] = pos
+
+    # scroll is applied by the camera systems
+    def update(self, tiles, rot, dt, keys):
         self.direction = [0, 0]
         self.prev_pos = [self.pos[0], self.pos[1]]
         self.rot += rot
 
         # -- INPUT --
-        self.get_input()
+        self.get_input(keys)
 
         # -- CHECKS/UPDATE --
         self.pos[0] += self.direction[0]
         self.pos[1] += self.direction[1]
         self.collision(tiles)
 
-        self.apply_scroll(scroll_value)
+    # player drawing from registry, a snapshot holding the player archetype (see pipeline.py)
+    def snapshot(self, registry):
+        player = copy.copy(self)
+        player.registry = registry
+        return player
+
+    # screen area the player is drawn to, for dirty rectangle rendering
+    def get_rect(self):
+        return pygame.Rect(int(self.pos[0]) - self.radius - 1, int(self.pos[1]) - self.radius - 1,
+                           self.radius * 2 + 3, self.radius * 2 + 3)
 
-    def draw(self):
-        pygame.draw.circle(self.surface, 'red', self.pos, self.radius, 1)
\ No newline at end of file
+    def draw(self, view=no_zoom):
+        pygame.draw.circle(self.surface, 'red', view.point(self.pos), view.length(self.radius), 1)
\ No newline at end of file
@@ -0,0 +1,108 @@
+import pygame, sys, time
+from pygame._sdl2.video import Window
+from game_data import screen_width, screen_height, scaling_factor
+
+
+# owns the window and gets the logical screen onto it. With pygame.SCALED the screen IS the display surface (logical
+# size) and SDL's renderer does the upscale to a size * factor window, so presenting is just a display update. Without SCALED (unsupported driver,
+# or scaled=False) the screen is a separate surface that is nearest neighbour upscaled by the largest integer factor that
+# fits into a view of the window (letterboxed), so nothing is allocated per frame
+class Presenter:
+    def __init__(self, size=(screen_width, screen_height), factor=scaling_factor, flags=0, vsync=True, scaled=True):
+        self.size = size
+        self.factor = factor
+        self.flags = flags
+        self.scaled = False
+        if scaled:
+            try:
+                # logical resolution stays size, the window is sized by factor (SDL's default is the largest integer
+                # multiple that fits the desktop)
+                self.window = pygame.display.set_mode(size, flags | pygame.SCALED, vsync=vsync)
+                Window.from_display_module().size = (size[0] * factor, size[1] * factor)
+                self.scaled = True
+            except pygame.error:
+                pass
+        if not self.scaled:
+            self.window = pygame.display.set_mode((size[0] * factor, size[1] * factor), flags)
+        self.screen = self.window if self.scaled else pygame.Surface(size)
+        self.buffer = None  # window view the screen is scaled into (software path)
+        self.buffer_rect = None
+        self.resize()
+
+    # recalculates the software scale target, call when the window surface changes (resize, fullscreen)
+    def resize(self):
+        if self.scaled:
+            return
+        self.window = pygame.display.get_surface()
+        window_width, window_height = self.window.get_size()
+        scale = max(1, min(window_width // self.size[0], window_height // self.size[1]))
+        self.buffer_rect = pygame.Rect(0, 0, self.size[0] * scale, self.size[1] * scale)
+        self.buffer_rect.center = (window_width // 2, window_height // 2)
+        self.buffer_rect = self.buffer_rect.clip(self.window.get_rect())
+        self.window.fill((0, 0, 0))
+        self.buffer = self.window.subsurface(self.buffer_rect)
+
+    # window pixel position -> logical screen position (SCALED already reports logical positions)
+    def to_screen(self, pos):
+        if self.scaled:
+            return pos
+        scale = self.buffer_rect.width // self.size[0]
+        return (pos[0] - self.buffer_rect.x) // scale, (pos[1] - self.buffer_rect.y) // scale
+
+    def toggle_fullscreen(self):
+        pygame.display.toggle_fullscreen()
+        self.resize()
+
+    # rects limits the update to those screen regions (dirty rectangles), None updates everything. SCALED always
+    # uploads and presents the whole screen texture, so rects are ignored there
+    def present(self, rects=None):
+        if self.scaled:
+            pygame.display.flip()
+        elif rects is None:
+            pygame.transform.scale(self.screen, self.buffer_rect.size, self.buffer)  # nearest neighbour, in place
+            pygame.display.update()
+        else:
+            scale = self.buffer_rect.width // self.size[0]
+            window_rects = []
+            for rect in rects:
+                rect = rect.clip(self.screen.get_rect())
+                if rect.width and rect.height:
+                    dest = pygame.Rect(rect.x * scale, rect.y * scale, rect.width * scale, rect.height * scale)
+                    pygame.transform.scale(self.screen.subsurface(rect), dest.size, self.buffer.subsurface(dest))
+                    window_rects.append(dest.move(self.buffer_rect.topleft))
+            pygame.display.update(window_rects)
+
+
+# present cost per window size: python present.py [frames]
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    def time_frames(present):
+        start = time.perf_counter()
+        for _ in range(frames):
+            present()
+        return (time.perf_counter() - start) / frames * 1000
+
+    pygame.init()
+    for factor in (1, 2, 3, 4):
+        size = (screen_width * factor, screen_height * factor)
+
+        # the previous present path, a SCALED window at size with a software scaled copy of the screen every frame
+        window = pygame.display.set_mode(size, pygame.SCALED, vsync=False)
+        screen = pygame.Surface((screen_width, screen_height))
+
+        def present_scale():
+            window.blit(pygame.transform.scale(screen, window.get_size()), (0, 0))
+            pygame.display.update()
+
+        results = [f'transform.scale {time_frames(present_scale):.3f} ms']
+        pygame.display.quit()
+        pygame.display.init()
+
+        for scaled in (True, False):
+            presenter = Presenter(factor=factor, vsync=False, scaled=scaled)
+            mode = 'SCALED' if presenter.scaled else 'integer'
+            results.append(f'{mode} {time_frames(presenter.present):.3f} ms')
+            pygame.display.quit()
+            pygame.display.init()
+        print(f'{size[0]}x{size[1]}: ' + ', '.join(results))
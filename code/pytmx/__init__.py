@@ -22,10 +22,18 @@ from .pytmx import *
 
 logger = logging.getLogger(__name__)
 
-try:
-    from pytmx.util_pygame import load_pygame
-except ImportError:
-    logger.debug("cannot import pygame tools")
+
+# the pygame tools are imported on first use of pytmx.load_pygame rather than with the package, so importing pytmx
+# for its data classes does not pull in a rendering backend (util_pygame, util_pyglet, util_pysdl2 all load lazily)
+def __getattr__(name):
+    if name == "load_pygame":
+        try:
+            from pytmx.util_pygame import load_pygame
+        except ImportError:
+            logger.debug("cannot import pygame tools")
+            raise AttributeError(name)
+        return load_pygame
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __version__ = (3, 31)
 __author__ = "bitcraft"
@@ -36,6 +36,8 @@ from xml.etree import ElementTree
 import json
 from copy import deepcopy
 
+import numpy as np
+
 # for type hinting
 try:
     import pygame
@@ -69,6 +71,7 @@ GID_TRANS_FLIPX = 1 << 31
 GID_TRANS_FLIPY = 1 << 30
 GID_TRANS_ROT = 1 << 29
 GID_MASK = GID_TRANS_FLIPX | GID_TRANS_FLIPY | GID_TRANS_ROT
+GID_BITS = 0xFFFFFFFF & ~GID_MASK  # the tile id part of a gid, as an unsigned 32 bit mask for arrays
 
 
 # error message format strings go here
@@ -135,28 +138,49 @@ def decode_gid(raw_gid: int) -> Tuple[int, TileFlags]:
     )
 
 
+def decode_gids(
+    raw_gids: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Decode an array of GIDs from TMX data, the vectorised decode_gid.
+
+    Args:
+        raw_gids (np.ndarray): uint32 GIDs, as reported by Tiled.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: GIDs without the flag bits, then boolean
+        flipped_horizontally, flipped_vertically and flipped_diagonally masks, all shaped like `raw_gids`.
+
+    """
+    return (
+        raw_gids & np.uint32(GID_BITS),
+        (raw_gids & np.uint32(GID_TRANS_FLIPX)) != 0,
+        (raw_gids & np.uint32(GID_TRANS_FLIPY)) != 0,
+        (raw_gids & np.uint32(GID_TRANS_ROT)) != 0,
+    )
+
+
 def reshape_data(
-    gids: List[int],
+    gids: np.ndarray,
     width: int,
-) -> List[List[int]]:
-    """Change 1D list to 2d list
+) -> np.ndarray:
+    """Change 1D gids to 2d rows
 
     Args:
-        gids (List[int]): List of gid ints.
+        gids (np.ndarray): 1D array of gids.
         width (int): Width of each row.
 
     Returns:
-        List[List[int]]: 2D nested list object.
+        np.ndarray: 2D array, indexed [y][x] (or [y, x]).
 
     """
-    return [gids[i : i + width] for i in range(0, len(gids), width)]
+    return np.asarray(gids, dtype=np.uint32).reshape(-1, width)
 
 
 def unpack_gids(
     text: str,
     encoding: Optional[str] = None,
     compression: Optional[str] = None,
-) -> List[int]:
+) -> np.ndarray:
     """Return all gids from encoded/compressed layer data
 
     Args:
@@ -165,7 +189,7 @@ def unpack_gids(
         compression (Optional[str]): Compression used.
 
     Returns:
-        List[int]: List of all the GIDs in the layer.
+        np.ndarray: 1D uint32 array of all the GIDs in the layer (flag bits included).
 
     """
     if encoding == "base64":
@@ -176,10 +200,10 @@ def unpack_gids(
             data = zlib.decompress(data)
         elif compression:
             raise ValueError(f"layer compression {compression} is not supported.")
-        fmt = "<%dL" % (len(data) // 4)
-        return list(struct.unpack(fmt, data))
+        return np.frombuffer(data, dtype="<u4", count=len(data) // 4).astype(np.uint32)
     elif encoding == "csv":
-        return [int(i) for i in text.split(",")]
+        # stops at the first malformed value, callers check the count against the layer size
+        return np.fromstring(text, dtype=np.uint32, sep=",")
     elif encoding:
         raise ValueError(f"layer encoding {encoding} is not supported.")
 
@@ -530,6 +554,7 @@ class TiledMap(TiledElement):
         self.imagemap = dict()  # mapping of gid and trans flags to real gids
         self.tiledgidmap = dict()  # mapping of tiledgid to pytmx gid
         self.maxgid = 1
+        self._gid_locations = None  # {gid: locations} see get_gid_locations
 
         # should be filled in by a loader function
         self.images = list()
@@ -873,7 +898,7 @@ class TiledMap(TiledElement):
     def get_tile_locations_by_gid(self, gid: int) -> Iterable[MapPoint]:
         """Search map for tile locations by the GID.
 
-        Note: Not a fast operation.  Cache results if used often.
+        Looked up in the gid index (see get_gid_locations), built on the first search.
 
         Args:
             gid (int): GID to be searched for.
@@ -882,9 +907,40 @@ class TiledMap(TiledElement):
             Iterable[MapPoint]: (int, int, int) tuples, where the layer is index of the visible tile layers.
 
         """
-        for l in self.visible_tile_layers:
-            for x, y, _gid in [i for i in self.layers[l].iter_data() if i[2] == gid]:
-                yield x, y, l
+        if gid == 0:  # empty cells are not indexed
+            for l in self.visible_tile_layers:
+                ys, xs = np.nonzero(np.asarray(self.layers[l].data) == 0)
+                for x, y in zip(xs.tolist(), ys.tolist()):
+                    yield x, y, l
+            return
+        locations = self.get_gid_locations().get(gid)
+        if locations is not None:
+            yield from zip(*(column.tolist() for column in locations.T))
+
+    def get_gid_locations(self) -> Dict[int, np.ndarray]:
+        """Index of where every GID is placed in the visible tile layers, built once and kept until a layer is added.
+
+        Returns:
+            Dict[int, np.ndarray]: GID to (n, 3) int array of x, y, layer rows, by layer then row by row.
+
+        """
+        if self._gid_locations is None:
+            gids = []
+            locations = []
+            for l in self.visible_tile_layers:
+                data = np.asarray(self.layers[l].data)
+                ys, xs = np.nonzero(data)
+                gids.append(data[ys, xs])
+                locations.append(np.column_stack((xs, ys, np.full(len(xs), l))))
+            self._gid_locations = {}
+            if gids:
+                gids = np.concatenate(gids)
+                locations = np.concatenate(locations)
+                order = np.argsort(gids, kind="stable")
+                values, starts = np.unique(gids[order], return_index=True)
+                for gid, group in zip(values.tolist(), np.split(locations[order], starts[1:])):
+                    self._gid_locations[gid] = group
+        return self._gid_locations
 
     def get_tile_properties_by_gid(self, gid: int) -> Optional[Dict]:
         """Get the tile properties of a tile GID.
@@ -929,8 +985,7 @@ class TiledMap(TiledElement):
             logger.debug(msg.format(type(layer)))
             raise ValueError
 
-        p = product(range(self.width), range(self.height))
-        layergids = set(self.layers[layer].data[y][x] for x, y in p)
+        layergids = np.unique(np.asarray(self.layers[layer].data)).tolist()
 
         for gid in layergids:
             try:
@@ -956,6 +1011,7 @@ class TiledMap(TiledElement):
 
         self.layers.append(layer)
         self.layernames[layer.name] = layer
+        self._gid_locations = None
 
     def add_tileset(self, tileset: TiledTileset) -> None:
         """Add a tileset to the map."""
@@ -1397,7 +1453,7 @@ class TiledTileLayer(TiledElement):
             Iterable[Tuple[int, int, int]]: Iterator of X, Y, GID tuples for each tile in the layer.
 
         """
-        for y, row in enumerate(self.data):
+        for y, row in enumerate(np.asarray(self.data).tolist()):
             for x, gid in enumerate(row):
                 yield x, y, gid
 
@@ -1409,7 +1465,9 @@ class TiledTileLayer(TiledElement):
 
         """
         images = self.parent.images
-        for x, y, gid in [i for i in self.iter_data() if i[2]]:
+        data = np.asarray(self.data)
+        ys, xs = np.nonzero(data)
+        for x, y, gid in zip(xs.tolist(), ys.tolist(), data[ys, xs].tolist()):
             yield x, y, images[gid]
 
     def _set_properties(self, node) -> None:
@@ -1445,25 +1503,32 @@ class TiledTileLayer(TiledElement):
                 "XML tile elements are no longer supported. Must use base64 or csv map formats."
             )
 
-        reg = self.parent.register_gid
-        temp = list()
-        temp_append = temp.append
-        for gid in unpack_gids(
+        raw_gids = unpack_gids(
             text=data_node.text.strip(),
             encoding=data_node.get("encoding", None),
             compression=data_node.get("compression", None),
-        ):
-            if gid == 0:
-                temp_append(0)
-            elif gid < GID_TRANS_ROT:
-                gid = reg(gid)
-                temp_append(gid)
+        )
+        if raw_gids.size != self.width * self.height:
+            raise ValueError(
+                f"layer {self.name} has {raw_gids.size} tiles, expected {self.width * self.height}."
+            )
+
+        # each distinct raw gid (tile id and flag bits) is registered once, in the order it first appears in the layer
+        # (so pytmx gids are numbered as they were when every tile was registered in turn), then the whole layer is
+        # mapped through the lookup at once
+        values, first, inverse = np.unique(raw_gids, return_index=True, return_inverse=True)
+        gids, flipx, flipy, rot = decode_gids(values)
+        lookup = np.zeros(len(values), dtype=np.uint32)
+        reg = self.parent.register_gid
+        for i in np.argsort(first).tolist():
+            if values[i] == 0:
+                continue
+            if values[i] < GID_TRANS_ROT:
+                lookup[i] = reg(int(gids[i]))
             else:
-                gid, flags = decode_gid(gid)
-                gid = reg(gid, flags)
-                temp_append(gid)
+                lookup[i] = reg(int(gids[i]), TileFlags(bool(flipx[i]), bool(flipy[i]), bool(rot[i])))
 
-        self.data = reshape_data(temp, self.width)
+        self.data = reshape_data(lookup[inverse.reshape(-1)], self.width)
         return self
 
 
@@ -17,10 +17,11 @@ GNU Lesser General Public License for more details.
 You should have received a copy of the GNU Lesser General Public
 License along with pytmx.  If not, see <http://www.gnu.org/licenses/>.
 """
-import itertools
 import logging
 from typing import Optional, Union, List
 
+import numpy as np
+
 import pytmx
 from pytmx.pytmx import ColorLike, PointLike
 
@@ -119,6 +120,7 @@ def pygame_image_loader(filename: str, colorkey: Optional[ColorLike], **kwargs):
     Parameters:
         filename: filename, including path, to load
         colorkey: colorkey for the image
+        image: already loaded tileset image (e.g. from an asset bundle), used instead of loading filename
 
     Returns:
         function to load tile images
@@ -128,7 +130,9 @@ def pygame_image_loader(filename: str, colorkey: Optional[ColorLike], **kwargs):
         colorkey = pygame.Color("#{0}".format(colorkey))
 
     pixelalpha = kwargs.get("pixelalpha", True)
-    image = pygame.image.load(filename)
+    image = kwargs.get("image")
+    if image is None:
+        image = pygame.image.load(filename)
 
     def load_image(rect=None, flags=None):
         if rect:
@@ -247,11 +251,10 @@ def build_rects(
             logger.debug(msg.format(layer, tmxmap))
             raise ValueError
 
-    p = itertools.product(range(tmxmap.width), range(tmxmap.height))
-    if gid:
-        points = [(x, y) for (x, y) in p if layer_data[y][x] == gid]
-    else:
-        points = [(x, y) for (x, y) in p if layer_data[y][x]]
+    # column by column, as the points were found before the layer data was an array
+    layer_data = np.asarray(layer_data).T
+    xs, ys = np.nonzero(layer_data == gid if gid else layer_data)
+    points = list(zip(xs.tolist(), ys.tolist()))
 
     rects = simplify(points, tmxmap.tilewidth, tmxmap.tileheight)
     return rects
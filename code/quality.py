@@ -0,0 +1,138 @@
+from game_data import quality_bounds
+
+
+# lowers (and later restores) simulation/render fidelity to hold the frame budget set by game_speed.
+# Knobs are degraded one step at a time in priority order (cheapest loss of fidelity first) and restored in the reverse
+# order. Hysteresis: frame time must stay above the high threshold (or below the low one) for a number of frames
+# before a step is taken, and every step is followed by a cooldown so the effect can be measured before the next one.
+class QualityGovernor:
+    def __init__(self):
+        self.high = 0.95  # fraction of frame budget above which quality is lowered
+        self.low = 0.70  # fraction of frame budget below which quality is raised
+        self.degrade_frames = 30  # consecutive frames over budget before lowering
+        self.upgrade_frames = 180  # consecutive frames under budget before raising (slower, avoids oscillation)
+        self.cooldown_frames = 60  # frames after a change before frame time is judged again
+        self.smoothing = 0.1  # exponential moving average weight of the newest frame
+
+        self.frame_ms = 0  # smoothed frame work time
+        self.budget_ms = 0
+        self.over = 0  # consecutive frames over high threshold
+        self.under = 0  # consecutive frames under low threshold
+        self.cooldown = 0
+
+        # knobs in degrade order
+        self.knobs = [Knob('flock_size', -10),
+                      Knob('outline_segments', -1),
+                      Knob('ik_iterations', -3),
+                      Knob('replan_interval', 60)]
+        self.log = []  # recent changes shown on the dev overlay
+        self.level = None  # level the knob values were last pushed to
+        self.pushed = {}  # {knob name: value} last pushed to it
+
+    # frame_ms is the time spent on the frame's work (not waiting on the clock/vsync), source is the world's input
+    # source (see replay.InputSource) that carries settings to the level
+    def update(self, frame_ms, level, source, game_speed):
+        self.budget_ms = 1000 / game_speed
+        if self.frame_ms == 0:
+            self.frame_ms = frame_ms
+        self.frame_ms += (frame_ms - self.frame_ms) * self.smoothing
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+        else:
+            if self.frame_ms > self.budget_ms * self.high:
+                self.over += 1
+                self.under = 0
+            elif self.frame_ms < self.budget_ms * self.low:
+                self.under += 1
+                self.over = 0
+            else:
+                self.over = 0
+                self.under = 0
+
+            if self.over >= self.degrade_frames:
+                self.step(self.knobs, -1)
+            elif self.under >= self.upgrade_frames:
+                self.step(reversed(self.knobs), 1)
+
+        # changed values, or all of them for a newly entered room. Sent with the next frame's input, so the level
+        # applies them before it simulates that frame and recordings keep them (see replay.Recorder)
+        if level is not self.level:
+            self.level = level
+            self.pushed = {}
+        for knob in self.knobs:
+            if self.pushed.get(knob.name) != knob.value:
+                self.pushed[knob.name] = knob.value
+                source.set(knob.name, knob.value)
+
+    # moves the first knob that can still move in direction (-1 lower quality, 1 raise quality)
+    def step(self, knobs, direction):
+        for knob in knobs:
+            old = knob.value
+            if knob.move(direction):
+                self.over = 0
+                self.under = 0
+                self.cooldown = self.cooldown_frames
+                message = f'{knob.name} {old} -> {knob.value} ({self.frame_ms:.1f}/{self.budget_ms:.1f}ms)'
+                print(f'quality: {message}')
+                self.log = (self.log + [message])[-3:]
+                return
+
+    # dev overlay, current knob values and the last few changes
+    def draw(self, surface, font, pos):
+        lines = [f'frame {self.frame_ms:.1f}/{self.budget_ms:.1f}ms']
+        lines += [f'{knob.name}: {knob.value}' for knob in self.knobs]
+        lines += self.log
+        for i, line in enumerate(lines):
+            font.render(line, surface, (pos[0], pos[1] + i * (font.line_height + font.line_spacing)))
+
+
+# a setting in quality_bounds, applied by setters[name]
+class Knob:
+    def __init__(self, name, step):
+        self.name = name
+        self.min_value, self.max_value = quality_bounds[name]  # full quality is whichever bound step moves away from
+        self.step = step  # change applied when lowering quality
+        self.value = self.max_value if step < 0 else self.min_value
+
+    # returns whether the value changed (False if it is already at the bound in that direction)
+    def move(self, direction):
+        value = self.value - self.step * direction
+        value = max(self.min_value, min(self.max_value, value))
+        if value == self.value:
+            return False
+        self.value = value
+        return True
+
+
+# -- knob setters --
+
+def set_flock_size(level, value):
+    for flock in level.flocks + level.flock_workers:
+        flock.set_flock_size(value)
+
+
+def set_outline_segments(level, value):
+    for creature in level.creatures:
+        creature.outline_curve_segments = value
+
+
+def set_ik_iterations(level, value):
+    for creature in level.creatures:
+        for segment in creature.segments:
+            if segment.has_legs:
+                for legpair in segment.legs:
+                    for appendage in legpair.legs:
+                        appendage.max_iter = value
+
+
+def set_replan_interval(level, value):
+    for creature in level.creatures:
+        creature.brain.path_reset = value
+
+
+# {setting name: function(level, value)}, one for each of quality_bounds
+setters = {'flock_size': set_flock_size,
+           'outline_segments': set_outline_segments,
+           'ik_iterations': set_ik_iterations,
+           'replan_interval': set_replan_interval}
@@ -0,0 +1,289 @@
+import pygame, os, sys, struct, hashlib, random, time
+import numpy as np
+from game_data import controller_map, quality_bounds
+
+# Input recording and deterministic replay. The game reads its input once per frame (World.update polls an
+# InputSource) and passes the FrameInput down to the level, so nothing in the simulation reads pygame's key state
+# directly. A Recorder keeps every frame's input (dt, the keys and controller buttons the game reads and the main loop's
+# restart / pause actions) plus the world's random seed, the quality settings applied with each frame (see
+# QualityGovernor, they follow the machine's frame times so they are replayed rather than recomputed) and every
+# hash_interval frames a hash of the player, creature, boid and tile state. A Replay feeds the recorded input back frame by frame and checks the hashes. Randomness comes
+# from per subsystem streams seeded from the world seed (see get_rng), so the same input gives the same frames whatever
+# order threaded jobs run in. Flock workers are seeded too, their boids are hashed from the state they published (a
+# frame behind in process flocks), so a recording replays with the flock_workers setting it was made with.
+
+MAGIC = b'SNKR'
+VERSION = 2
+HEADER = struct.Struct('<4sHHQIII')  # magic, version, hash interval, seed, frame count, hash count, setting count
+FRAME = struct.Struct('<fHBh')  # dt, key bits, flag bits, right analog y (scaled to int16)
+SETTING = struct.Struct('<IBi')  # frame, setting (index into SETTINGS), value
+SETTINGS = tuple(quality_bounds)  # quality knobs by name (see quality.setters)
+SUBSYSTEMS = ('player', 'creatures', 'boids', 'tiles')  # hashed separately so a mismatch names what diverged
+HASH = struct.Struct('<I' + '8s' * len(SUBSYSTEMS))  # frame, digest of each subsystem
+
+# every key the game reads, bit i of a frame's key bits is KEYS[i]
+KEYS = (pygame.K_p, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_z, pygame.K_LSHIFT, pygame.K_w, pygame.K_a, pygame.K_s,
+        pygame.K_d, pygame.K_c)
+KEY_BITS = {key: 1 << i for i, key in enumerate(KEYS)}
+# flag bits, actions the main loop requests then controller state. Only the first controller is read
+ACTIONS = ('restart', 'pause')
+BUTTONS = ('share', 'X', 'options')
+CONNECTED = 1 << len(ACTIONS)
+BUTTON_BITS = {controller_map[button]: CONNECTED << (i + 1) for i, button in enumerate(BUTTONS)}
+AXIS = controller_map['right_analog_y']
+AXIS_SCALE = 32767
+
+
+# random stream for one subsystem of a level, e.g. get_rng(level.seed, 'boids'). Seeding with a string is stable
+# across runs and platforms (it is hashed with sha512, not hash())
+def get_rng(seed, name):
+    return random.Random(f'{seed}:{name}')
+
+
+# ------------------ INPUT ------------------
+
+# pressed keys, indexed like pygame.key.get_pressed() (only KEYS are ever pressed)
+class KeyState:
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    def __getitem__(self, key):
+        return bool(self.bits & KEY_BITS.get(key, 0))
+
+
+# first controller's buttons and right analog y, read like a pygame joystick
+class ControllerState:
+    def __init__(self, flags=0, axis=0):
+        self.flags = flags
+        self.axis = axis
+
+    def get_button(self, button):
+        return bool(self.flags & BUTTON_BITS.get(button, 0))
+
+    def get_axis(self, axis):
+        return self.axis / AXIS_SCALE if axis == AXIS else 0.0
+
+
+# everything the simulation reads for one frame. frame counts polls of the source, source is told when the level has
+# simulated the frame (see InputSource.end_frame). settings are (name, value) quality settings the level applies before
+# simulating the frame
+class FrameInput:
+    def __init__(self, dt, keys=0, flags=0, axis=0, frame=0, source=None, settings=()):
+        self.dt = dt
+        self.keys = KeyState(keys)
+        self.flags = flags
+        self.controllers = [ControllerState(flags, axis)] if flags & CONNECTED else []
+        self.restart = bool(flags & 1)
+        self.pause = bool(flags & 2)
+        self.frame = frame
+        self.source = source
+        self.settings = settings
+
+    def end_frame(self, level):
+        if self.source is not None:
+            self.source.end_frame(self.frame, level)
+
+
+# no keys held, for reads outside a frame (e.g. the camera focusing as a level is built)
+no_input = FrameInput(1)
+
+
+# live keyboard and controllers, recorded when a Recorder is set. controllers is the game's joystick list
+class InputSource:
+    def __init__(self, controllers):
+        self.controllers = controllers
+        self.recorder = None
+        self.actions = 0  # flag bits requested since the last poll
+        self.settings = []  # (name, value) set since the last poll
+        self.frame = 0
+
+    # restart or pause on the next frame (main loop key presses)
+    def request(self, action):
+        self.actions |= 1 << ACTIONS.index(action)
+
+    # quality setting (see quality.setters) applied to the level with the next frame
+    def set(self, name, value):
+        self.settings.append((name, value))
+
+    def poll(self, dt):
+        pressed = pygame.key.get_pressed()
+        keys = sum(bit for key, bit in KEY_BITS.items() if pressed[key])
+        flags, axis = self.actions, 0
+        self.actions = 0
+        if self.controllers:
+            controller = self.controllers[0]
+            flags |= CONNECTED | sum(bit for button, bit in BUTTON_BITS.items() if controller.get_button(button))
+            axis = round(max(-1.0, min(1.0, controller.get_axis(AXIS))) * AXIS_SCALE)
+        settings, self.settings = self.settings, []
+        if self.recorder is not None:
+            dt = self.recorder.record(dt, keys, flags, axis, settings)  # dt as it is stored, so recording and replay match
+        self.frame += 1
+        return FrameInput(dt, keys, flags, axis, self.frame - 1, self, settings)
+
+    def end_frame(self, frame, level):
+        if self.recorder is not None:
+            self.recorder.end_frame(frame, level)
+
+
+# ------------------ RECORDING ------------------
+
+# input, settings and state hashes of a session, kept in memory (9 bytes a frame and a setting) and written by save
+class Recorder:
+    def __init__(self, seed, room, spawn, hash_interval=60):
+        self.seed = seed
+        self.room = room.replace(os.sep, '/')
+        self.spawn = spawn
+        self.hash_interval = hash_interval
+        self.frames = bytearray()
+        self.frame_count = 0
+        self.hashes = bytearray()
+        self.hash_count = 0
+        self.settings = bytearray()
+        self.setting_count = 0
+
+    def record(self, dt, keys, flags, axis, settings=()):
+        dt = float(np.float32(dt))
+        self.frames += FRAME.pack(dt, keys, flags, axis)
+        for name, value in settings:
+            self.settings += SETTING.pack(self.frame_count, SETTINGS.index(name), value)
+            self.setting_count += 1
+        self.frame_count += 1
+        return dt
+
+    def end_frame(self, frame, level):
+        if self.hash_interval and frame % self.hash_interval == self.hash_interval - 1:
+            self.hashes += HASH.pack(frame, *hash_state(level))
+            self.hash_count += 1
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.hash_interval, self.seed, self.frame_count, self.hash_count,
+                                   self.setting_count))
+            for text in (self.room, self.spawn):
+                encoded = text.encode('utf-8')
+                file.write(struct.pack('<H', len(encoded)) + encoded)
+            file.write(self.frames)
+            file.write(self.hashes)
+            file.write(self.settings)
+        print(f'replay: recorded {self.frame_count} frames to {path}')
+
+
+# ------------------ REPLAY ------------------
+
+# a recorded session as an input source. poll returns the recorded frames with their settings in order (the live dt is
+# ignored) and end_frame compares state hashes, mismatches are kept as (frame, [subsystems that differ])
+class Replay:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, self.hash_interval, self.seed, self.frame_count, hash_count, setting_count = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} replay')
+        offset = HEADER.size
+        texts = []
+        for _ in range(2):
+            length = struct.unpack_from('<H', data, offset)[0]
+            texts.append(data[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 2 + length
+        self.room, self.spawn = os.path.normpath(texts[0]), texts[1]
+
+        self.frames = list(FRAME.iter_unpack(data[offset:offset + self.frame_count * FRAME.size]))
+        offset += self.frame_count * FRAME.size
+        self.hashes = {frame: digests for frame, *digests in
+                       HASH.iter_unpack(data[offset:offset + hash_count * HASH.size])}
+        offset += hash_count * HASH.size
+        self.settings = {}  # {frame: [(name, value)]}
+        for frame, setting, value in SETTING.iter_unpack(data[offset:offset + setting_count * SETTING.size]):
+            self.settings.setdefault(frame, []).append((SETTINGS[setting], value))
+        self.controllers = []  # replays never read live controllers
+        self.frame = 0
+        self.mismatches = []
+        self.checked = 0
+
+    @property
+    def done(self):
+        return self.frame >= self.frame_count
+
+    def request(self, action):
+        pass  # actions come from the recording
+
+    def set(self, name, value):
+        pass  # settings come from the recording
+
+    def poll(self, dt):
+        dt, keys, flags, axis = self.frames[min(self.frame, self.frame_count - 1)]
+        self.frame += 1
+        return FrameInput(dt, keys, flags, axis, self.frame - 1, self, self.settings.get(self.frame - 1, ()))
+
+    def end_frame(self, frame, level):
+        expected = self.hashes.get(frame)
+        if expected is not None:
+            self.checked += 1
+            differ = [name for name, digest, recorded in zip(SUBSYSTEMS, hash_state(level), expected)
+                      if digest != recorded]
+            if differ:
+                self.mismatches.append((frame, differ))
+
+
+# ------------------ STATE HASHING ------------------
+
+# 8 byte digest of each of SUBSYSTEMS for a level's live state
+def hash_state(level):
+    def digest(*arrays):
+        h = hashlib.blake2b(digest_size=8)
+        for array in arrays:
+            h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return h.digest()
+
+    creatures = []
+    for creature in level.creatures:
+        creatures.append([segment.pos for segment in creature.segments])
+        creatures.append([creature.brain.target])
+        for segment in creature.segments:
+            for leg in getattr(segment, 'legs', ()):
+                creatures.append(leg.feet)
+    boids = []
+    for flock in level.flocks:
+        boids += flock.get_components('pos', 'vel', 'heading')
+        if flock.predator is not None:
+            boids += [flock.predator.pos, flock.predator.vel]
+    for worker in level.flock_workers:
+        boids.append(worker.get_state()[:worker.counts[worker.front] + 1])
+    layers = [level.collideable] + level.background_layers + level.foreground_layers
+    return (digest(level.player.sprite.get_pos()), digest(*creatures), digest(*boids),
+            digest(*(layer.archetype.view('pos') for layer in layers)))
+
+
+# replays a recording as a benchmark and regression check (exit status 1 on a hash mismatch):
+# python replay.py [replay file] [runs]
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from game_data import replay_path, screen_width, screen_height
+    path = sys.argv[1] if len(sys.argv) > 1 else replay_path
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    pygame.display.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    from world import World
+
+    failed = False
+    for run in range(runs):
+        replay = Replay(path)
+        world = World('../rooms/tiled_worlds/habitat.world', screen, screen.get_rect(), [], replay.seed, replay)
+        world.enter_room(replay.room, replay.spawn)
+        times = []
+        while not replay.done:
+            start = time.perf_counter()
+            world.update(None)
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        print(f'run {run + 1}: {len(times)} frames, mean {sum(times) / len(times):.2f} ms, '
+              f'median {times[len(times) // 2]:.2f} ms, 99th percentile {times[len(times) * 99 // 100]:.2f} ms, '
+              f'{replay.checked} hashes checked, {len(replay.mismatches)} mismatched')
+        for frame, differ in replay.mismatches[:5]:
+            print(f'  frame {frame}: {", ".join(differ)} diverged')
+        failed = failed or bool(replay.mismatches)
+    sys.exit(1 if failed else 0)
@@ -1,24 +1,27 @@
 import pygame
+import numpy as np
+from ecs import Entity, component
+
+spawn_components = {'pos': (np.float64, 2)}
 
 
 # in-room spawns are stored as property of SpawnTrigger class for simplicity of access
-class Spawn(pygame.sprite.Sprite):
-    def __init__(self, x, y, name, parallax, player_facing):
-        super().__init__()
+class Spawn(pygame.sprite.Sprite, Entity):
+    pos = component('pos')
+
+    def __init__(self, registry, x, y, name, parallax, player_facing):
+        pygame.sprite.Sprite.__init__(self)
         self.original_pos = (x, y)
-        self.x = x
-        self.y = y
+        registry.register('spawns', **spawn_components)
+        Entity.__init__(self, registry, 'spawns', pos=(x, y))
         self.name = name
         self.parallax = parallax
         self.player_facing = player_facing
 
-    def apply_scroll(self, scroll_value, use_parallax):
-        if use_parallax:
-            self.x -= int(scroll_value[0] * self.parallax[0])
-            self.y -= int(scroll_value[1] * self.parallax[1])
-        else:
-            self.x -= int(scroll_value[0])
-            self.y -= int(scroll_value[1])
+    @property
+    def x(self):
+        return float(self.pos[0])
 
-    def update(self, scroll_value, use_parallax=False):
-        self.apply_scroll(scroll_value, use_parallax)
\ No newline at end of file
+    @property
+    def y(self):
+        return float(self.pos[1])
@@ -0,0 +1,111 @@
+import builtins, sys, time, threading
+from importlib.util import resolve_name
+from contextlib import contextmanager
+from game_data import profile_startup, startup_report_path
+
+# Start-up profiling (game_data.profile_startup). Times every module imported on the main thread as a tree (like
+# python -X importtime, with the time each import statement blocked for) and named init phases, and writes both to a
+# report. Disabled, nothing is timed or written.
+
+
+class StartupProfiler:
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.phases = []  # [name, depth, start ms, ms (None for marks)] in the order they started
+        self.depth = 0
+        self.imports = ImportTimer() if enabled else None
+
+    def now(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        record = [name, self.depth, self.now(), None]
+        self.phases.append(record)
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            record[3] = self.now() - record[2]
+
+    # a point in time, e.g. the first frame being shown
+    def mark(self, name):
+        if self.enabled:
+            self.phases.append([name, self.depth, self.now(), None])
+
+    # stops timing imports and writes the report, imports below min_ms (inclusive time) are left out
+    def report(self, path=startup_report_path, min_ms=1.0):
+        if not self.enabled:
+            return
+        self.imports.stop()
+        self.imports.root.ms = sum(child.ms for child in self.imports.root.children)
+        lines = [f'start-up report, {self.now():.1f} ms since the profiler started', '', 'phases (start, duration)']
+        for name, depth, start, ms in self.phases:
+            duration = f'{ms:9.1f} ms' if ms is not None else ' ' * 12
+            lines.append(f'{start:9.1f} ms {duration}  {"  " * depth}{name}')
+
+        lines += ['', f'imports (inclusive, self) at least {min_ms} ms, {self.imports.root.ms:.1f} ms in all']
+        def add_imports(node, depth):
+            for child in sorted(node.children, key=lambda child: child.ms, reverse=True):
+                if child.ms >= min_ms:
+                    lines.append(f'{child.ms:9.1f} ms {child.get_self_ms():9.1f} ms  {"  " * depth}{child.name}')
+                    add_imports(child, depth + 1)
+        add_imports(self.imports.root, 0)
+
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        print(f'start-up report written to {path}')
+
+
+# wraps builtins.__import__, recording a node for each import statement that loads a new module. Nested imports made
+# while a module runs become its children. Other threads' imports are not timed (the tree is one stack)
+class ImportTimer:
+    def __init__(self):
+        self.root = ImportNode('imports')
+        self.stack = [self.root]
+        self.thread = threading.get_ident()
+        self.original = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def stop(self):
+        if builtins.__import__ == self.timed_import:
+            builtins.__import__ = self.original
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if threading.get_ident() != self.thread:
+            return self.original(name, globals, locals, fromlist, level)
+        try:
+            resolved = resolve_name('.' * level + name, (globals or {}).get('__package__')) if level else name
+        except (ImportError, ValueError):
+            resolved = name
+        if resolved in sys.modules:
+            return self.original(name, globals, locals, fromlist, level)
+
+        node = ImportNode(resolved)
+        self.stack[-1].children.append(node)
+        self.stack.append(node)
+        start = time.perf_counter()
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            node.ms = (time.perf_counter() - start) * 1000
+            self.stack.pop()
+
+
+class ImportNode:
+    def __init__(self, name):
+        self.name = name
+        self.ms = 0  # inclusive
+        self.children = []
+
+    def get_self_ms(self):
+        return self.ms - sum(child.ms for child in self.children)
+
+
+# one profiler per run, imported first by main.py so the imports that follow are timed
+profiler = StartupProfiler(profile_startup)
@@ -1,6 +1,7 @@
 import pygame, os, sys, math
 from csv import reader
-from game_data import tile_size
+from game_data import tile_size, tile_cache_granularity, slice_cache, use_asset_bundle, asset_bundle_path, asset_bundles
+from bundle import Bundle
 
 
 # ------------------ IMPORT FUNCTIONS ------------------
@@ -17,6 +18,32 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+# packed assets (see bundle.py), None when loose files are used
+def get_asset_bundle():
+    path = resource_path(asset_bundle_path)
+    if path not in asset_bundles:
+        use_bundle = use_asset_bundle or getattr(sys, 'frozen', False)
+        asset_bundles[path] = Bundle(path) if use_bundle and os.path.exists(path) else None
+    return asset_bundles[path]
+
+
+# image from the bundle (already decoded and in display format) or its file
+def load_image(path):
+    bundle = get_asset_bundle()
+    if bundle is not None and path in bundle:
+        return bundle.get_image(path)
+    return pygame.image.load(path)
+
+
+# contents of a non image asset, from the bundle or its file
+def read_asset(path):
+    bundle = get_asset_bundle()
+    if bundle is not None and path in bundle:
+        return bytes(bundle.get_bytes(path))
+    with open(path, 'rb') as file:
+        return file.read()
+
+
 # https://riptutorial.com/pygame/example/23788/transparency    info on alpha values in surfaces (opacity and clear pixels)
 
 # imports all the images in a single folder
@@ -25,7 +52,10 @@ def import_folder(path, return_type):
     surface_list = []
     allowed_file_types = ['.png', '.jpg', '.jpeg', '.gif']
 
-    for folder_name, sub_folders, img_files in os.walk(path):
+    bundle = get_asset_bundle()
+    bundled = bundle.listdir(path) if bundle is not None else None
+    folders = [(path, [], list(bundled))] if bundled else os.walk(path)
+    for folder_name, sub_folders, img_files in folders:
         if '.DS_Store' in img_files:
             img_files.remove('.DS_Store')  # remove before sorting frames into order
 
@@ -37,7 +67,7 @@ def import_folder(path, return_type):
             for ftype in allowed_file_types:
                 if ftype in image.lower():  # prevents invisible non image files causing error while allowing image type to be flexible (e.g. .DS_Store)
                     full_path = path + '/' + image  # accesses image file by creating path name
-                    image_surface = pygame.image.load(full_path).convert_alpha()  # creates image surf (convert alpha is best practice)
+                    image_surface = load_image(full_path).convert_alpha()  # creates image surf (convert alpha is best practice)
 
                     if return_type == 'surface':
                         return image_surface
@@ -61,45 +91,71 @@ def import_csv_layout(path):
 # cuts up tile sheets returning list with provided path and the size each tile is in the image.
 # tiles must have no spacing and consistent dimensions
 def import_cut_graphics(path, art_tile_size):
-    surface = pygame.image.load(path).convert_alpha()
+    key = (path, art_tile_size)
+    # sheet has already been loaded and cut, share the existing views
+    if key in slice_cache:
+        return slice_cache[key]
+
+    surface = load_image(path)
     tile_num_x = int(surface.get_size()[0] / art_tile_size)  # works out how many tiles are on the x and y based on passed value
     tile_num_y = int(surface.get_size()[1] / art_tile_size)
     surface = pygame.transform.scale(surface, (tile_size * tile_num_x, tile_size * tile_num_y)) # expands tileset to game resolution based on dimensions in tiles
+    surface = surface.convert_alpha()  # convert the whole sheet once, tiles are views into it
 
-    cut_tiles = []
-    # keeps track of different segments of tilesheet
-    for row in range(tile_num_y):
-        for col in range(tile_num_x):
-            # x and y refer to x and y tile grid on the imported tileset not the game (top left of tile being sliced)
-            x = col * tile_size
-            y = row * tile_size
-            # makes new surface and places segment of sheet (tile) on new surface
-            new_surface = pygame.Surface((tile_size, tile_size), pygame.SRCALPHA)  # SRCALPHA allows opacity and invis pixels
-            # blit args: thing to be placed, position (the top left corner of the surface), rectangle (mask)
-            new_surface.blit(surface, (0, 0), pygame.Rect(x, y, tile_size, tile_size))
-            #new_surface.set_alpha(100)  <-- changes alpha value for entire surface
-            cut_tiles.append(new_surface)
-
+    # tiles are read left to right, top to bottom
+    cut_tiles = slice_sheet(surface, (tile_size, tile_size), tile_num_x, tile_num_y)
+    slice_cache[key] = cut_tiles
     return cut_tiles
 
 # ------------------ PROCEDURAL GRAPHICS ------------------
 
 
+# returns subsurface views of a sheet (no pixels are copied, views share the sheet's pixels and colour key)
+# views are listed left to right, top to bottom
+def slice_sheet(surface, dim, columns, rows):
+    views = []
+    for row in range(rows):
+        for col in range(columns):
+            views.append(surface.subsurface(pygame.Rect(col * dim[0], row * dim[1], dim[0], dim[1])))
+    return views
+
+
+# cuts a vertical sprite stack strip into its layers (bottom layer first)
+# result is cached per surface so every tile with the same gid shares one list of views
 def cut_sprite_stack(surface, dim):
-    layer_num = int(surface.get_height() / dim[1])
+    key = (surface, tuple(dim))
+    if key not in slice_cache:
+        layer_num = int(surface.get_height() / dim[1])
+        cut_layers = slice_sheet(surface, dim, 1, layer_num)
+        cut_layers.reverse()  # layers are in reverse on sprite stack sheet
+        slice_cache[key] = cut_layers
+    return slice_cache[key]
+
+
+# pre-renders the stacked layers (bottom layer first) at every rotation step, size is the layer width in px
+def create_rotation_cache(images, size=tile_size):
+    cache = {}
+
+    # pre-render 360 deg view at 10 deg increments of stack
+    for rot in range(0, 360, tile_cache_granularity):
+        # multiply by 1.5 to account for expansion of image when rotated 45 deg
+        surf = pygame.Surface((size * 1.5, size * 1.5 + len(images) - 1))  # width, height
+
+        # stack images
+        for img in range(len(images)):
+            rot_img = pygame.transform.rotate(images[img], rot)
+            # account for 1.5 multiplier in height
+            surf.blit(rot_img, (0, surf.get_height() - size * 1.5 - img))
+
+        # make transparent bg
+        surf = surf.convert(24)
+        surf.set_colorkey('black')
+        surf.set_alpha(255)
 
-    cut_layers = []
-    # keeps track of different segments of tilesheet
-    for layer in range(layer_num):
-        # x and y coords on layer img
-        x = 0
-        y = layer * dim[1]
-        # makes new surface and places segment of sheet (tile) on new surface
-        new_surf = crop(surface, x, y, dim[0], dim[1])
-        cut_layers.append(new_surf)
+        # cache image
+        cache[rot] = surf
 
-    cut_layers.reverse()  # layers are in reverse on sprite stack sheet
-    return cut_layers
+    return cache
 
 
 def swap_colour(img, old_c, new_c):
@@ -191,12 +247,10 @@ def rotate_point_deg(point, origin, angle):
 
 
 # crops a surface out of a larger surface (usefull for images)
+# returns an independent copy, use slice_sheet for views that share pixels with the source
 def crop(surf, x, y, x_size, y_size):
-    handle_surf = surf.copy()
-    clipR = pygame.Rect(x, y, x_size, y_size)
-    handle_surf.set_clip(clipR)
-    image = surf.subsurface(handle_surf.get_clip())
-    return image.copy()
+    clipR = pygame.Rect(x, y, x_size, y_size).clip(surf.get_rect())
+    return surf.subsurface(clipR).copy()
 
 
 # centers an object with a given width on the x axis on a given surface
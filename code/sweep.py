@@ -0,0 +1,205 @@
+import pygame, os, time, itertools, ast, argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from game_data import screen_width, screen_height
+from quality import set_flock_size, set_ik_iterations, set_replan_interval
+
+# Parameter sweeps. Runs a headless Level (dummy video driver, fixed dt, simulated then rendered on one thread) for
+# every combination of a grid of tuning values, spread over a process pool, and writes one row per run to a columnar
+# .npz file (one array per parameter and metric, np.load gives them back by name). Input is either nothing held or the
+# frames of a recording (see replay.py). Metrics:
+#   sim_ms, sim_ms_p95, render_ms  frame times (runs share the machine's cores, so compare runs of the same sweep)
+#   path_failures_per_min          creature targets no path was found to
+#   cohesion                       mean distance of boids from their flock's centre in px (lower is tighter)
+#   steps_per_s                    creature feet starting a step
+
+ROOM = '../rooms/tiled_rooms/room_0.tmx'
+SPAWN = 'initial'
+METRICS = ('sim_ms', 'sim_ms_p95', 'render_ms', 'path_failures_per_min', 'cohesion', 'steps_per_s')
+
+
+# -- parameter setters -- function(level, value), applied once the level is built and before its first frame
+
+def set_matching_factor(level, value):
+    for flock in level.flocks:
+        flock.matching_factor = value
+
+
+def set_centering_factor(level, value):
+    for flock in level.flocks:
+        flock.centering_factor = value
+
+
+def set_path_precision(level, value):
+    for creature in level.creatures:
+        creature.brain.path_precision = value
+
+
+# 0 plans with D* Lite over the path_precision lattice, 1 over the navmesh
+def set_use_navmesh(level, value):
+    for creature in level.creatures:
+        creature.brain.use_navmesh = bool(value)
+
+
+def set_step_interval(level, value):
+    for legpair in get_legpairs(level):
+        legpair.step_interval = value
+        legpair.step_timers = [value // 2, 0]
+
+
+# segment radii as Creature.create_body sets them from the spacing (one px less spacing per segment, at least 1)
+def set_segment_spacing(level, value):
+    for creature in level.creatures:
+        creature.seg_spacing = value
+        creature.max_length = 0
+        for i, segment in enumerate(creature.segments):
+            segment.radius = max(1, value - i) // 2
+            segment.hitbox.size = (segment.radius * 2, segment.radius * 2)
+            creature.max_length += segment.radius * 2
+
+
+PARAMETERS = {'matching_factor': set_matching_factor,  # Flock
+              'centering_factor': set_centering_factor,  # Flock
+              'flock_size': set_flock_size,
+              'use_navmesh': set_use_navmesh,  # Brain
+              'path_precision': set_path_precision,  # Brain, only used with use_navmesh=0
+              'replan_interval': set_replan_interval,  # Brain
+              'step_interval': set_step_interval,  # LegPair
+              'segment_spacing': set_segment_spacing,  # Creature
+              'ik_iterations': set_ik_iterations}
+
+
+def get_legpairs(level):
+    return [legpair for creature in level.creatures for segment in creature.segments if segment.has_legs
+            for legpair in segment.legs]
+
+
+# every combination of grid's values, {parameter: [values]} -> [{parameter: value}]
+def expand_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# ------------------ WORKERS ------------------
+
+# pool process set up, a dummy display so levels can be built and drawn without a window
+def init_worker():
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.display.init()
+    pygame.display.set_mode((screen_width, screen_height))
+
+
+# runs one configuration and returns its metrics. inputs are (dt, keys, flags, axis) frames (see replay.FRAME), None
+# holds nothing at dt 1
+def run_config(config, seed, frames, inputs=None, room=ROOM, spawn=SPAWN, render=True):
+    from level import Level
+    from replay import FrameInput
+    screen = pygame.display.get_surface()
+    level = Level(room, screen, screen.get_rect(), [], spawn, f'sweep:{seed}')
+    level.start_flock_workers()
+    for name, value in config.items():
+        PARAMETERS[name](level, value)
+
+    legpairs = get_legpairs(level)
+    moving = [list(legpair.foot_move) for legpair in legpairs]
+    sim_ms, render_ms, cohesion = [], [], []
+    steps = 0
+    seconds = 0
+    for f in range(frames):
+        frame_input = FrameInput(*inputs[f % len(inputs)]) if inputs else FrameInput(1)
+        start = time.perf_counter()
+        frame = level.simulate(frame_input)
+        sim_ms.append((time.perf_counter() - start) * 1000)
+        if render:
+            start = time.perf_counter()
+            level.render(frame)
+            render_ms.append((time.perf_counter() - start) * 1000)
+        seconds += frame_input.dt / 60
+
+        # a step is a foot that starts moving this frame
+        for legpair, was_moving in zip(legpairs, moving):
+            steps += sum(now and not was for now, was in zip(legpair.foot_move, was_moving))
+            was_moving[:] = legpair.foot_move
+        for flock in level.flocks:
+            pos = flock.get_components('pos')[0]
+            if len(pos):
+                cohesion.append(float(np.linalg.norm(pos - pos.mean(axis=0), axis=1).mean()))
+
+    failures = sum(creature.brain.path_failures for creature in level.creatures)
+    return {'sim_ms': float(np.mean(sim_ms)), 'sim_ms_p95': float(np.percentile(sim_ms, 95)),
+            'render_ms': float(np.mean(render_ms)) if render_ms else np.nan,
+            'path_failures_per_min': failures / seconds * 60 if seconds else np.nan,
+            'cohesion': float(np.mean(cohesion)) if cohesion else np.nan,
+            'steps_per_s': steps / seconds if seconds else np.nan}
+
+
+# ------------------ SWEEP ------------------
+
+# runs every configuration once per seed on a pool of worker processes, returns {column: array} in configuration then
+# seed order. A configuration that raises gets NaN metrics and its error
+def sweep(configs, seeds=(0,), frames=600, workers=None, inputs=None, render=True, room=ROOM, spawn=SPAWN):
+    runs = [(config, seed) for config in configs for seed in seeds]
+    results = [None] * len(runs)
+    errors = [''] * len(runs)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=init_worker) as executor:
+        futures = {executor.submit(run_config, config, seed, frames, inputs, room, spawn, render): i
+                   for i, (config, seed) in enumerate(runs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = dict.fromkeys(METRICS, np.nan)
+                errors[i] = f'{type(e).__name__}: {e}'
+                print(f'sweep: {runs[i][0]} failed, {errors[i]}')
+            if done % max(1, len(runs) // 10) == 0 or done == len(runs):
+                print(f'sweep: {done}/{len(runs)} runs, {time.perf_counter() - start:.0f} s')
+
+    columns = {name: np.array([config.get(name, np.nan) for config, seed in runs], dtype=np.float64)
+               for name in dict.fromkeys(name for config in configs for name in config)}
+    columns['seed'] = np.array([seed for config, seed in runs], dtype=np.int64)
+    for metric in METRICS:
+        columns[metric] = np.array([result[metric] for result in results], dtype=np.float64)
+    columns['error'] = np.array(errors)
+    return columns
+
+
+# python sweep.py matching_factor=0.02,0.05,0.08 step_interval=60,90,120 [--seeds 3] [--frames 600] [--workers n]
+#                 [--replay file] [--out file]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run headless levels over a grid of tuning values.')
+    parser.add_argument('grid', nargs='+', help=f'name=value,value,... for names in {", ".join(PARAMETERS)}')
+    parser.add_argument('--seeds', type=int, default=1, help='runs of each configuration, each with its own seed')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--workers', type=int, default=None, help='processes, defaults to one per core')
+    parser.add_argument('--replay', help='recording whose input is played in every run (see replay.py)')
+    parser.add_argument('--no-render', action='store_true', help='only simulate')
+    parser.add_argument('--out', default='../sweep_results.npz')
+    args = parser.parse_args()
+
+    grid = {}
+    for item in args.grid:
+        name, _, values = item.partition('=')
+        if name not in PARAMETERS:
+            parser.error(f'unknown parameter {name}')
+        grid[name] = [ast.literal_eval(value) for value in values.split(',')]
+    inputs, room, spawn = None, ROOM, SPAWN
+    if args.replay:
+        from replay import Replay
+        replay = Replay(args.replay)
+        inputs, room, spawn = replay.frames, replay.room, replay.spawn
+
+    configs = expand_grid(grid)
+    columns = sweep(configs, range(args.seeds), args.frames, args.workers, inputs, not args.no_render, room, spawn)
+    np.savez(args.out, **columns)
+    print(f'sweep: {len(configs)} configurations x {args.seeds} seeds written to {args.out}')
+
+    # fastest runs
+    names = list(grid)
+    order = np.argsort(columns['sim_ms'])
+    print(' '.join(f'{name:>12}' for name in names + list(METRICS[:1]) + list(METRICS[3:])))
+    for i in order[:10]:
+        print(' '.join(f'{columns[name][i]:12.4g}' for name in names + list(METRICS[:1]) + list(METRICS[3:])))
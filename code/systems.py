@@ -0,0 +1,77 @@
+import numpy as np
+import math
+
+
+# systems run over every archetype that has the components they need (see ecs.py). Camera movement used to be an
+# apply_scroll/apply_camera method on every class, each entity is now moved in bulk by these.
+
+# -- camera --
+
+# shifts every positioned entity by the camera scroll. Archetypes with a parallax component scroll at their parallax.
+# names limits the camera systems to those archetypes (so they can be split into jobs, see jobs.py)
+def scroll_system(registry, scroll_value, names=None):
+    scroll = np.array(scroll_value, dtype=np.float64)
+    for archetype in registry.query('pos', names=names):
+        pos = archetype.view('pos')
+        if 'parallax' in archetype.columns:
+            pos -= np.trunc(scroll * archetype.view('parallax'))
+        else:
+            pos -= np.trunc(scroll)
+
+
+# rotates every positioned entity around origin (the camera rotates around the player) and turns entities that have a
+# rot component (so sprite stacks are drawn at the matching angle)
+def rotation_system(registry, rot_value, origin, names=None):
+    if rot_value == 0:
+        return
+    origin = np.array(origin, dtype=np.float64)
+    for archetype in registry.query('pos', names=names):
+        rotate_points(archetype.view('pos'), origin, rot_value)
+    for archetype in registry.query('rot', names=names):
+        archetype.view('rot')[:] -= rot_value
+
+
+# moves hitboxes (x, y, w, h) so they are centered on pos, rounding like pygame.Rect.center
+def hitbox_system(registry, names=None):
+    for archetype in registry.query('pos', 'size', 'hitbox', names=names):
+        pos = archetype.view('pos')
+        size = archetype.view('size')
+        hitbox = archetype.view('hitbox')
+        hitbox[:, :2] = round_half_away(pos) - size // 2
+        hitbox[:, 2:] = size
+
+
+# -- points -- (for positions that are not entities, e.g. creature joints)
+
+# rotates an (n, 2) float array in place, matches support.rotate_point_deg
+def rotate_points(points, origin, angle):
+    rot = math.radians(angle)
+    cos, sin = math.cos(rot), math.sin(rot)
+    rel = points - origin
+    points[:, 0] = rel[:, 0] * cos - rel[:, 1] * sin + origin[0]
+    points[:, 1] = rel[:, 1] * cos + rel[:, 0] * sin + origin[1]
+
+
+# applies scroll then rotation to a list of points, returns the moved points as a list of [x, y] lists
+def transform_points(points, scroll_value, rot_value, origin):
+    if not points:
+        return []
+    array = np.array(points, dtype=np.float64)
+    array -= scroll_value
+    if rot_value != 0:
+        rotate_points(array, np.array(origin, dtype=np.float64), rot_value)
+    return array.tolist()
+
+
+def round_half_away(values):
+    return np.copysign(np.floor(np.abs(values) + 0.5), values)
+
+
+# -- collision queries -- (over one archetype's hitboxes)
+
+# rows whose hitbox overlaps rect (x, y, w, h), matches pygame.Rect.colliderect
+def colliderect(archetype, rect):
+    hitbox = archetype.view('hitbox')
+    x, y, w, h = rect
+    return np.flatnonzero((hitbox[:, 0] < x + w) & (x < hitbox[:, 0] + hitbox[:, 2]) &
+                          (hitbox[:, 1] < y + h) & (y < hitbox[:, 1] + hitbox[:, 3]))
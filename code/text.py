@@ -1,9 +1,14 @@
 import pygame, sys
+from collections import OrderedDict
 from support import *
 
 
+# bitmap font. Glyphs are areas of one recoloured sheet (the atlas) looked up through a char table, outlined glyphs are
+# baked once per outline colour into a second atlas, and whole rendered strings are kept in an LRU cache so repeated
+# text (HUD, menus) costs one blit
 class Font:
     def __init__(self, path, colour, numbers=False):
+        self.colour = colour
         self.letters, self.letter_spacing, self.line_height = self.load_font_img(path, colour)
         if not numbers:
             self.font_order = ['A','B','C','D','E','F','G','H','I','J','K','L','M','N','O','P','Q','R','S','T','U','V','W','X','Y','Z','a','b','c','d','e','f','g','h','i','j','k','l','m','n','o','p','q','r','s','t','u','v','w','x','y','z','.','-',',',':','+','\'','!','?','0','1','2','3','4','5','6','7','8','9','(',')','/','_','=','\\','[',']','*','"','<','>',';']
@@ -13,6 +18,16 @@ class Font:
         self.base_spacing = 1
         self.line_spacing = 2
 
+        # {char: (area of glyph in the atlas, advance)}, replaces searching font_order for every char
+        self.atlas = self.letters[0].get_parent()
+        self.glyphs = {}
+        for char, letter, spacing in zip(self.font_order, self.letters, self.letter_spacing):
+            self.glyphs[char] = (pygame.Rect(letter.get_offset(), letter.get_size()), spacing + self.base_spacing)
+        self.outlined = {}  # {outline colour: (atlas, {char: area})}
+
+        self.text_cache = OrderedDict()  # {(text, colour, outline colour, line width): surface}, least recent first
+        self.text_cache_size = 128
+
     # black wont work
     def load_font_img(self, path, font_colour):
         path = resource_path(path)
@@ -21,7 +36,7 @@ class Font:
 
         fg_colour = (255, 255, 255)
         bg_colour = (0, 0, 0)
-        font_img = pygame.image.load(path).convert()
+        font_img = load_image(path).convert()
         font_img = swap_colour(font_img, fg_colour, font_colour)
         font_img.set_colorkey(bg_colour)
         last_x = 0
@@ -29,7 +44,8 @@ class Font:
         letter_spacing = []
         for x in range(font_img.get_width()):
             if font_img.get_at((x, 0)) == (255, 0, 255):
-                letters.append(crop(font_img, last_x, 0, x - last_x, font_img.get_height()))
+                # glyphs are views into the recoloured sheet rather than copies
+                letters.append(font_img.subsurface(pygame.Rect(last_x, 0, x - last_x, font_img.get_height())))
                 letter_spacing.append(x - last_x)
                 last_x = x + 1
             x += 1
@@ -37,48 +53,95 @@ class Font:
         # letter.set_colorkey(bg_color)
         return letters, letter_spacing, font_img.get_height()
 
+    # bakes every glyph with an outline into one atlas (once per outline colour)
+    def get_outlined(self, outline_col):
+        if outline_col not in self.outlined:
+            images = [outline_image(letter, outline_col) for letter in self.letters]
+            atlas = pygame.Surface((sum(image.get_width() for image in images), self.line_height + 2))
+            atlas.set_colorkey(images[0].get_colorkey())
+            areas = {}
+            x = 0
+            for char, image in zip(self.font_order, images):
+                atlas.blit(image, (x, 0))
+                areas[char] = pygame.Rect(x, 0, image.get_width(), image.get_height())
+                x += image.get_width()
+            self.outlined[outline_col] = (atlas, areas)
+        return self.outlined[outline_col]
+
     def width(self, text):
         text_width = 0
         for char in text:
             if char == ' ':
                 text_width += self.space_width + self.base_spacing
             else:
-                text_width += self.letter_spacing[self.font_order.index(char)] + self.base_spacing
+                text_width += self.glyphs[char][1]
         return text_width
 
-    def render(self, text, surf, loc, outline_col='', line_width=0):
+    # inserts line breaks at the last space before a line exceeds line_width
+    def wrap(self, text, line_width):
+        spaces = []
+        x = 0
+        for i, char in enumerate(text):
+            if char == ' ':
+                spaces.append((x, i))
+                x += self.space_width + self.base_spacing
+            else:
+                x += self.glyphs[char][1]
+        line_offset = 0
+        for i, space in enumerate(spaces):
+            if (space[0] - line_offset) > line_width:
+                line_offset += spaces[i - 1][0] - line_offset
+                if i != 0:
+                    text = text[:spaces[i - 1][1]] + '\n' + text[spaces[i - 1][1] + 1:]
+        return text
+
+    # glyph positions relative to the text origin, [(char, x, y)]
+    def layout(self, text):
         x_offset = 0
         y_offset = 0
-
-        if line_width != 0:
-            spaces = []
-            x = 0
-            for i, char in enumerate(text):
-                if char == ' ':
-                    spaces.append((x, i))
-                    x += self.space_width + self.base_spacing
-                else:
-                    x += self.letter_spacing[self.font_order.index(char)] + self.base_spacing
-            line_offset = 0
-            for i, space in enumerate(spaces):
-                if (space[0] - line_offset) > line_width:
-                    line_offset += spaces[i - 1][0] - line_offset
-                    if i != 0:
-                        text = text[:spaces[i - 1][1]] + '\n' + text[spaces[i - 1][1] + 1:]
+        chars = []
         for char in text:
             if char not in ['\n', ' ']:
-                char_surf = self.letters[self.font_order.index(char)]
-                # outline per char
-                if outline_col != '':
-                    surf.blit(outline_image(char_surf, outline_col), (loc[0] + x_offset, loc[1] + y_offset))
-                else:
-                    surf.blit(char_surf, (loc[0] + x_offset, loc[1] + y_offset))
-                x_offset += self.letter_spacing[self.font_order.index(char)] + self.base_spacing
+                chars.append((char, x_offset, y_offset))
+                x_offset += self.glyphs[char][1]
             elif char == ' ':
                 x_offset += self.space_width
             else:
                 y_offset += self.line_spacing + self.line_height
                 x_offset = 0
+        return chars
+
+    # returns the rendered string (cached), transparent where nothing is drawn
+    def get_text_surface(self, text, outline_col='', line_width=0):
+        key = (text, self.colour, outline_col, line_width)
+        surface = self.text_cache.get(key)
+        if surface is not None:
+            self.text_cache.move_to_end(key)
+            return surface
+
+        if line_width != 0:
+            text = self.wrap(text, line_width)
+        chars = self.layout(text)
+        if outline_col != '':
+            atlas, areas = self.get_outlined(outline_col)
+            blits = [(atlas, (x, y), areas[char]) for char, x, y in chars]
+        else:
+            atlas = self.atlas
+            blits = [(atlas, (x, y), self.glyphs[char][0]) for char, x, y in chars]
+
+        width = max([pos[0] + area.width for _, pos, area in blits], default=0)
+        height = max([pos[1] + area.height for _, pos, area in blits], default=0)
+        surface = pygame.Surface((max(width, 1), max(height, 1)))
+        surface.set_colorkey((0, 0, 0))
+        surface.blits(blits, doreturn=False)
+
+        self.text_cache[key] = surface
+        if len(self.text_cache) > self.text_cache_size:
+            self.text_cache.popitem(last=False)
+        return surface
+
+    def render(self, text, surf, loc, outline_col='', line_width=0):
+        surf.blit(self.get_text_surface(text, outline_col, line_width), loc)
 
     def get_surf(self, text, outline_col='', line_width=0):
         surface = pygame.Surface((self.width(text)+1, self.line_height))
@@ -1,104 +1,248 @@
-import pygame
-from support import import_folder, cut_sprite_stack, rotate_point_deg
-from game_data import tile_cache, tile_size, tile_cache_granularity
+import pygame, math
+import numpy as np
+from support import import_folder, cut_sprite_stack, get_angle_rad
+from game_data import tile_cache, tile_size, tile_cache_granularity, screen_width, screen_height, zoom_tile_cache, \
+    zoom_cache_levels
+from ecs import Entity, component
+from systems import colliderect
+from camera import no_zoom
 
+# components of every tile archetype, pos is the tile center and sprite indexes TileLayer.surfaces
+tile_components = {'pos': (np.float64, 2), 'rot': (np.float64, 1), 'size': (np.int32, 2), 'hitbox': (np.int32, 4),
+                   'sprite': (np.int32, 1)}
 
-# base tile class with block fill image and normal surface support (also used for images, i.e, one big tile)
-class StaticTile(pygame.sprite.Sprite):
-    def __init__(self, pos, size, parallax, image_surface=None):
+
+# a tile layer is its own archetype so layer queries (drawing, culling) run over dense arrays. Tiles are scrolled and
+# rotated by the camera systems with every other entity, the layer only draws and answers collision queries (through
+# its baked Colliders, visual only layers have none and never collide)
+class TileLayer(list):
+    def __init__(self, registry, name, colliders=None):
         super().__init__()
+        self.registry = registry
+        self.name = name
+        self.colliders = colliders
+        self.archetype = registry.register(f'tiles {name}', **tile_components)
+        self.surfaces = []  # sprite index: tile surface (tile_cache key)
+        self.sprites = {}  # {tile surface: sprite index}
+        self.overhang = None  # see get_overhang
+
+    def get_sprite(self, surface):
+        if surface not in self.sprites:
+            self.sprites[surface] = len(self.surfaces)
+            self.surfaces.append(surface)
+        return self.sprites[surface]
+
+    # how far a drawn sprite stack can reach past its hitbox
+    def get_overhang(self):
+        if self.overhang is None:
+            self.overhang = max((max(max(surf.get_size()) for surf in tile_cache[surface].values())
+                                 for surface in self.surfaces), default=0)
+        return self.overhang
+
+# -- collisions --
+
+    def collidepoint(self, point):
+        return self.colliders is not None and self.colliders.collidepoint(point)
+
+    # pos of a circle pushed out of the layer's tiles, None if it does not touch any (see Colliders.collide_circle)
+    def collide_circle(self, pos, prev_pos, radius):
+        if self.colliders is None:
+            return None
+        return self.colliders.collide_circle(pos, prev_pos, radius)
+
+# -- render --
+
+    # layer drawing from a copy of its components (see pipeline.py), the tiles themselves are not copied
+    def snapshot(self):
+        layer = TileLayer.__new__(TileLayer)
+        layer.__dict__.update(self.__dict__)
+        layer.archetype = self.archetype.snapshot()
+        return layer
+
+    # draws the layer's sprite stacks that are on screen in y order, one blits call for the whole layer. Zoomed views
+    # use sprites scaled once per zoom level (see get_zoomed_sprite)
+    def draw(self, screen, screen_rect, view=no_zoom):
+        if not self.archetype.count:
+            return
+        # sprite stacks (and their rotations) extend past the hitbox, so cull against an area grown by the overhang
+        overhang = self.get_overhang()
+        area = pygame.Rect(view.world_rect(screen_rect)).inflate(overhang * 2, overhang * 2)
+        rows = colliderect(self.archetype, area)
+        pos = self.archetype.view('pos')[rows]
+        order = np.argsort(pos[:, 1], kind='stable')  # sort based on y position of tiles
+        rows = rows[order]
+        pos = view.points(pos[order])  # list of [x, y]
+        rounded_rots = (self.archetype.view('rot')[rows] // tile_cache_granularity * tile_cache_granularity) % 360
+        sprites = self.archetype.view('sprite')[rows]
+
+        zoom = view.zoom
+        blits = []
+        for (x, y), rot, sprite in zip(pos, rounded_rots.astype(int).tolist(), sprites.tolist()):
+            if zoom == 1:
+                surf = tile_cache[self.surfaces[sprite]][rot]  # get cached image
+            else:
+                surf = get_zoomed_sprite(self.surfaces[sprite], rot, zoom)
+            # blit with accounting for pos (center of tile??)
+            blits.append((surf, (x - tile_size//2 * zoom, y - surf.get_height() + tile_size * zoom)))
+        screen.blits(blits, doreturn=False)
+
+
+# a tile layer's solid tiles merged into rects (x, y, w, h) in room px, baked when the room is compiled (see
+# compiled_level.merge_solid_rects). The room is scrolled and rotated as a whole, so a query moves its points into room
+# space with the room corners and tests a few rects instead of every moved tile
+class Colliders:
+    def __init__(self, rects, get_corners, room_dim):
+        self.rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        self.get_corners = get_corners  # screen positions of the room's corners, (4, 2) clockwise from the top left
+        self.room_dim = room_dim
+
+    # screen origin of the room and its x and y axes per room px
+    def get_axes(self):
+        (ox, oy), (rx, ry), _, (bx, by) = self.get_corners().tolist()
+        width, height = self.room_dim
+        return ox, oy, (rx - ox) / width, (ry - oy) / width, (bx - ox) / height, (by - oy) / height
+
+    # the camera only scrolls and rotates, so the axes are perpendicular and one px long
+    @staticmethod
+    def to_room(point, axes):
+        ox, oy, xx, xy, yx, yy = axes
+        dx, dy = point[0] - ox, point[1] - oy
+        return dx * xx + dy * xy, dx * yx + dy * yy
+
+    @staticmethod
+    def to_screen(point, axes):
+        ox, oy, xx, xy, yx, yy = axes
+        return [ox + point[0] * xx + point[1] * yx, oy + point[0] * xy + point[1] * yy]
+
+    def collidepoint(self, point):
+        x, y = self.to_room(point, self.get_axes())
+        rects = self.rects
+        return bool(np.any((rects[:, 0] <= x) & (x < rects[:, 0] + rects[:, 2]) &
+                           (rects[:, 1] <= y) & (y < rects[:, 1] + rects[:, 3])))
+
+    # pushes a circle at pos out of every rect it overlaps, back along the way it came (towards prev_pos). Returns the
+    # pushed screen pos, None if the circle touches nothing
+    def collide_circle(self, pos, prev_pos, radius):
+        axes = self.get_axes()
+        x, y = self.to_room(pos, axes)
+        prev = self.to_room(prev_pos, axes)
+        # rects within reach of the circle, with a tile of margin as pushes move it
+        rects = self.rects
+        dx = np.maximum(np.maximum(rects[:, 0] - x, x - rects[:, 0] - rects[:, 2]), 0)
+        dy = np.maximum(np.maximum(rects[:, 1] - y, y - rects[:, 1] - rects[:, 3]), 0)
+        reach = radius + tile_size
+        near = rects[dx * dx + dy * dy < reach * reach].tolist()
+
+        pushed = False
+        for left, top, width, height in near:
+            right, bottom = left + width, top + height
+            if left < x < right and top < y < bottom:
+                distance = -min(x - left, right - x, y - top, bottom - y)  # inside, negative depth to the closest side
+            else:
+                distance = math.hypot(x - min(max(x, left), right), y - min(max(y, top), bottom))
+            if distance < radius:
+                angle = get_angle_rad((x, y), prev)  # angle to move back towards where it came from
+                x += math.sin(angle) * (radius - distance + 1)
+                y += math.cos(angle) * (radius - distance + 1)
+                pushed = True
+        return self.to_screen((x, y), axes) if pushed else None
+
+
+# rotated sprite stack image scaled to zoom, scaled the first time it is drawn at that zoom level. Zoom levels are
+# evicted least recently used first
+def get_zoomed_sprite(surface, rot, zoom):
+    cache = zoom_tile_cache.get(zoom)
+    if cache is None:
+        cache = zoom_tile_cache[zoom] = {}
+        if len(zoom_tile_cache) > zoom_cache_levels:
+            zoom_tile_cache.popitem(last=False)
+    elif next(reversed(zoom_tile_cache)) != zoom:
+        zoom_tile_cache.move_to_end(zoom)
+    key = (surface, rot)
+    if key not in cache:
+        surf = tile_cache[surface][rot]
+        cache[key] = pygame.transform.scale(surf, (round(surf.get_width() * zoom), round(surf.get_height() * zoom)))
+    return cache[key]
+
+
+# base tile class with block fill image and normal surface support (also used for images, i.e, one big tile)
+class StaticTile(Entity):
+    pos = component('pos')
+    rot = component('rot')
+
+    def __init__(self, layer, pos, size, parallax, image_surface=None):
         if image_surface:
             self.images = [image_surface]
         else:
             self.images = [pygame.Surface((size[0], size[1]))]  # creates tile
             self.images[0].fill('grey')  # makes tile grey
-        self.rect = self.images[0].get_rect(topleft=pos)  # postions the rect and image
+        rect = self.images[0].get_rect(topleft=pos)  # postions the rect and image
+        self.create(layer, rect)
         self.parallax = parallax
-        self.screen_width = pygame.display.Info().current_w
-        self.screen_height = pygame.display.Info().current_h
-
-    # allows all tiles to scroll at a set speed creating camera illusion
-    def apply_scroll(self, scroll_value, use_parallax=False):
-        if use_parallax:
-            self.rect.x -= int(scroll_value[0] * self.parallax[0])
-            self.rect.y -= int(scroll_value[1] * self.parallax[1])
-        else:
-            self.rect.x -= int(scroll_value[0])
-            self.rect.y -= int(scroll_value[1])
+        self.screen_width = screen_width  # logical screen (querying the display per tile is slow and main thread only)
+        self.screen_height = screen_height
 
-    def apply_rotation(self, rot_value, origin):
-        self.rect.centerx, self.rect.centery = rotate_point_deg(self.rect.center, origin, rot_value)
-        for img in range(len(self.images)):
-            self.images[img] = pygame.transform.rotate(self.images[img], rot_value)
+    # adds the tile entity, centered on rect
+    def create(self, layer, rect, pos=None):
+        sprite = layer.get_sprite(getattr(self, 'surface', self.images[0]))
+        Entity.__init__(self, layer.registry, layer.archetype.name, pos=pos or rect.center, size=rect.size,
+                        hitbox=rect, sprite=sprite)
+        self.layer = layer
+        layer.append(self)
 
-    # scroll is separate to update, giving control to children of Tile class to override update
-    def update(self, scroll_value, rot_value, origin=(0, 0), use_parallax=False):
-        self.apply_scroll(scroll_value, use_parallax)
-        if rot_value != 0:
-            self.apply_rotation(rot_value, origin)
+    @property
+    def rect(self):
+        return pygame.Rect(self.registry.get(self.entity, 'hitbox'))
 
     def draw(self, screen, screen_rect):
         # if the tile is within the screen, render tile
         if self.rect.colliderect(screen_rect):
-            screen.blit(self.images[0], self.rect)
+            image = self.images[0]
+            # camera rotation is stored rather than applied to the image every frame
+            if self.rot != 0:
+                image = pygame.transform.rotate(image, -self.rot)
+            screen.blit(image, image.get_rect(center=self.pos))
 
 
 # terrain tile type, inherits from main tile and can be assigned an image
 class CollideableTile(StaticTile):
-    def __init__(self, pos, size, parallax, surface):
-        super().__init__(pos, size, parallax)  # passing in variables to parent class
+    def __init__(self, layer, pos, size, parallax, surface):
         self.surface = surface  # used for referencing cache as key
-        self.images = cut_sprite_stack(surface, size)  # image is passed tile surface
-        self.hitbox = self.images[0].get_rect()
-        self.hitbox.topleft = pos
-        self.pos = [pos[0], pos[1]]  # used rather than rect so can use floats for precision
-        self.radius = self.hitbox.width // 2  # assumes hitbox is square
-        self.rot = 0
-
-    # allows all tiles to scroll at a set speed creating camera illusion
-    def apply_scroll(self, scroll_value, use_parallax=False):
-        if use_parallax:
-            self.pos[0] -= int(scroll_value[0] * self.parallax[0])
-            self.pos[1] -= int(scroll_value[1] * self.parallax[1])
-        else:
-            self.pos[0] -= int(scroll_value[0])
-            self.pos[1] -= int(scroll_value[1])
-        self.hitbox.center = self.pos
-
-    def apply_rotation(self, rot_value, origin):
-        self.pos = rotate_point_deg(self.pos, origin, rot_value)
-        self.rot -= rot_value
-        self.hitbox.center = self.pos
+        self.images = cut_sprite_stack(surface, size)  # shared (cached) layer views of the passed tile surface
+        self.parallax = parallax
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        # pos (the tile's corner in the room) is used as the center of the hitbox and sprite stack
+        hitbox = self.images[0].get_rect(center=pos)
+        self.radius = hitbox.width // 2  # assumes hitbox is square
+        self.create(layer, hitbox, pos)
 
-    # scroll is separate to update, giving control to children of Tile class to override update
-    def update(self, scroll_value, rot_value, origin=(0, 0), use_parallax=False):
-        self.apply_scroll(scroll_value, use_parallax)
-        if rot_value != 0:
-            self.apply_rotation(rot_value, origin)
+    @property
+    def hitbox(self):
+        return pygame.Rect(self.registry.get(self.entity, 'hitbox'))
 
     def draw(self, screen, screen_rect):
         if self.hitbox.colliderect(screen_rect):
             rounded_rot = (self.rot - (self.rot % tile_cache_granularity)) % 360  # round the rotation to granularity interval
-            surf = tile_cache[self.surface][rounded_rot]  # get cached image
+            surf = tile_cache[self.surface][int(rounded_rot)]  # get cached image
             # blit with accounting for pos (center of tile??)
             screen.blit(surf, (self.pos[0] - tile_size//2, self.pos[1] - surf.get_height() + tile_size))
 
 
 class HazardTile(CollideableTile):
-    def __init__(self, pos, size, parallax, surface, player):
-        super().__init__(pos, size, parallax, surface)
+    def __init__(self, layer, pos, size, parallax, surface, player):
+        super().__init__(layer, pos, size, parallax, surface)
         self.player = player
 
-    def update(self, scroll_value, use_parallax=False):
+    def update(self):
         if self.hitbox.colliderect(self.player.hitbox):
             self.player.invoke_respawn()
-        self.apply_scroll(scroll_value, use_parallax)
 
 
 # animated tile that can be assigned images from a folder to animate
 class AnimatedTile(StaticTile):
-    def __init__(self, pos, size, parallax, path):
-        super().__init__(pos, size, parallax)
+    def __init__(self, layer, pos, size, parallax, path):
+        super().__init__(layer, pos, size, parallax)
         self.frames = import_folder(path)
         self.frame_index = 0
         self.image = self.frames[self.frame_index]
@@ -106,12 +250,12 @@ class AnimatedTile(StaticTile):
     def animate(self, dt):
         # change tile image
         self.image = self.frames[self.frame_index]
+        self.images[0] = self.image
 
         # increment index
         self.frame_index += round(1 * dt)
         if self.frame_index >= len(self.frames):
             self.frame_index = 0
 
-    def update(self, dt, scroll_value, use_parallax=False):
+    def update(self, dt):
         self.animate(dt)
-        self.apply_scroll(scroll_value, use_parallax)
\ No newline at end of file
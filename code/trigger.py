@@ -1,37 +1,35 @@
 import pygame
+import numpy as np
+from ecs import Entity, component
 
+# pos is the hitbox center, hitboxes are moved with it by the hitbox system
+trigger_components = {'pos': (np.float64, 2), 'size': (np.int32, 2), 'hitbox': (np.int32, 4)}
 
-class Trigger(pygame.sprite.Sprite):
-    def __init__(self, x, y, width, height, name, parallax):
-        super().__init__()
+
+class Trigger(pygame.sprite.Sprite, Entity):
+    pos = component('pos')
+
+    def __init__(self, registry, x, y, width, height, name, parallax, destination=None, destination_spawn=None):
+        pygame.sprite.Sprite.__init__(self)
         self.original_pos = (x, y)
-        self.hitbox = pygame.Rect(x, y, width, height)
+        hitbox = pygame.Rect(x, y, width, height)
+        registry.register('triggers', **trigger_components)
+        Entity.__init__(self, registry, 'triggers', pos=hitbox.center, size=hitbox.size, hitbox=hitbox)
+        self.room_rect = pygame.Rect(x, y, width, height)  # unscrolled position in the room
         self.name = name
         self.parallax = parallax
 
-    def apply_scroll(self, scroll_value, use_parallax):
-        if use_parallax:
-            self.hitbox.x -= int(scroll_value[0] * self.parallax[0])
-            self.hitbox.y -= int(scroll_value[1] * self.parallax[1])
-        else:
-            self.hitbox.x -= int(scroll_value[0])
-            self.hitbox.y -= int(scroll_value[1])
+        # room transition (destination room tmx path and spawn name), None if trigger does not change room
+        self.destination = destination
+        self.destination_spawn = destination_spawn
 
-    def update(self, scroll_value, use_parallax=False):
-        self.apply_scroll(scroll_value, use_parallax)
+    @property
+    def hitbox(self):
+        return pygame.Rect(self.registry.get(self.entity, 'hitbox'))
 
 
 # stores correspoding in-room spawn as property
 class SpawnTrigger(Trigger):
-    def __init__(self, x, y, width, height, name, parallax, trigger_spawn):
-        super().__init__(x, y, width, height, name, parallax)
+    def __init__(self, registry, x, y, width, height, name, parallax, trigger_spawn):
+        super().__init__(registry, x, y, width, height, name, parallax)
         self.trigger_spawn = trigger_spawn
-
-    def apply_scroll(self, scroll_value, use_parallax=False):
-        if use_parallax:
-            self.hitbox.x -= int(scroll_value[0] * self.parallax[0])
-            self.hitbox.y -= int(scroll_value[1] * self.parallax[1])
-        else:
-            self.hitbox.x -= int(scroll_value[0])
-            self.hitbox.y -= int(scroll_value[1])
-        self.trigger_spawn.update(scroll_value)
\ No newline at end of file
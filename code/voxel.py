@@ -0,0 +1,195 @@
+import pygame, os, sys, struct, hashlib, time
+import numpy as np
+from game_data import tile_size, tile_cache, tile_cache_granularity, voxel_cache
+from support import resource_path, cut_sprite_stack, create_rotation_cache
+
+# Loads MagicaVoxel .vox models as sprite stacks. A model is parsed into a uint8 grid of palette indices, resampled to
+# the wanted layer size and layer count, drawn into a sprite stack sheet (the same layout as hand drawn stack strips)
+# and baked into tile_cache's rotated sprites. Bakes are saved to BAKE_DIR as raw pixels named by the .vox file's hash
+# and the bake settings, so a baked model loads with one file read and no parsing or rotating.
+
+MAGIC = b'SNKV'
+VERSION = 1
+MODEL_DIR = '../assets/level_assets/models'
+BAKE_DIR = '../assets/level_assets/models/baked'
+# magic, version, size, layers, granularity, sheet width, sheet height, sprite width, sprite height, sprite count
+HEADER = struct.Struct('<4sHHHHHHHHH')
+CHUNK = struct.Struct('<4sii')  # id, content bytes, children bytes
+
+
+# ------------------ RUNTIME ------------------
+
+# sprite stack sheet for a .vox model, its rotated sprites are in tile_cache (the sheet is the key, as for tiles).
+# size is the layer width in px (the model's footprint is scaled to fit), layers defaults to one per voxel of height
+def load_voxel_model(vox_path, size=tile_size, layers=None):
+    key = (vox_path, size, layers)
+    if key not in voxel_cache:
+        path = resource_path(vox_path)
+        with open(path, 'rb') as file:
+            data = file.read()
+        digest = hashlib.sha1(data).hexdigest()
+        name = os.path.splitext(os.path.basename(path))[0]
+        bake_path = os.path.join(resource_path(BAKE_DIR), f'{name}_{digest}_{size}_{layers or 0}.bake')
+
+        baked = read_bake(bake_path, size)
+        if baked is None:
+            model = VoxelModel(data)
+            sheet = model.get_sheet(size, layers)
+            rotations = create_rotation_cache(cut_sprite_stack(sheet, (size, size)), size)
+            write_bake(bake_path, size, sheet, rotations)
+        else:
+            sheet, rotations = baked
+        tile_cache[sheet] = rotations
+        voxel_cache[key] = sheet
+    return voxel_cache[key]
+
+
+# .vox model drawn in place of a tile stack image (see voxel_tiles), the model named like the image in any folder of
+# MODEL_DIR. None if there is no such model
+def get_tile_model(image_path):
+    name = os.path.splitext(os.path.basename(image_path))[0] + '.vox'
+    model_dir = resource_path(MODEL_DIR)
+    for folder, _, files in os.walk(model_dir):
+        if name in files:
+            return os.path.join(MODEL_DIR, os.path.relpath(folder, model_dir), name)  # relative, as load_voxel_model takes
+    return None
+
+
+# sheet and rotated sprites from a bake file, None if it is missing or was baked with other settings
+def read_bake(bake_path, size):
+    try:
+        with open(bake_path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, bake_size, layers, granularity, sheet_w, sheet_h, sprite_w, sprite_h, count = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or bake_size != size or granularity != tile_cache_granularity:
+        return None
+    sprite_bytes = sprite_w * sprite_h * 3
+    if len(data) != HEADER.size + sheet_w * sheet_h * 3 + count * sprite_bytes:
+        return None
+
+    # surfaces are views over the file's bytes (they keep it alive)
+    view = memoryview(data)
+    offset = HEADER.size + sheet_w * sheet_h * 3
+    sheet = pygame.image.frombuffer(view[HEADER.size:offset], (sheet_w, sheet_h), 'RGB')
+    sheet.set_colorkey('black')
+    rotations = {}
+    for i, rot in enumerate(range(0, 360, granularity)):
+        sprite = pygame.image.frombuffer(view[offset + i * sprite_bytes:offset + (i + 1) * sprite_bytes],
+                                         (sprite_w, sprite_h), 'RGB')
+        sprite.set_colorkey('black')
+        sprite.set_alpha(255)
+        rotations[rot] = sprite
+    return sheet, rotations
+
+
+def write_bake(bake_path, size, sheet, rotations):
+    sprites = [rotations[rot] for rot in sorted(rotations)]
+    sprite_w, sprite_h = sprites[0].get_size()
+    header = HEADER.pack(MAGIC, VERSION, size, sheet.get_height() // size, tile_cache_granularity, *sheet.get_size(),
+                         sprite_w, sprite_h, len(sprites))
+    os.makedirs(os.path.dirname(bake_path), exist_ok=True)
+    # written to a temporary file and renamed so a half written bake is never read
+    temp_path = bake_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        file.write(pygame.image.tobytes(sheet, 'RGB'))
+        for sprite in sprites:
+            file.write(pygame.image.tobytes(sprite, 'RGB'))
+    os.replace(temp_path, bake_path)
+
+
+# ------------------ PARSING ------------------
+
+# first model of a .vox file (RIFF style chunks: SIZE, XYZI and RGBA inside MAIN). The scene graph (nTRN, nGRP, nSHP),
+# layers and materials are ignored
+class VoxelModel:
+    def __init__(self, data):
+        if data[:4] != b'VOX ':
+            raise ValueError('not a MagicaVoxel .vox file')
+        self.grid = None  # uint8 palette indices [z, y, x], 0 is empty, z is up
+        palette = None
+        filled = False  # first model's voxels read
+
+        offset = 8  # magic, version
+        _, content, _ = CHUNK.unpack_from(data, offset)
+        offset += CHUNK.size + content  # into MAIN's children
+        while offset < len(data):
+            chunk_id, content, children = CHUNK.unpack_from(data, offset)
+            start = offset + CHUNK.size
+            if chunk_id == b'SIZE' and self.grid is None:
+                size_x, size_y, size_z = struct.unpack_from('<iii', data, start)
+                self.grid = np.zeros((size_z, size_y, size_x), dtype=np.uint8)
+            elif chunk_id == b'XYZI' and not filled:
+                filled = True
+                count = struct.unpack_from('<i', data, start)[0]
+                voxels = np.frombuffer(data, dtype=np.uint8, count=count * 4, offset=start + 4).reshape(-1, 4)
+                self.grid[voxels[:, 2], voxels[:, 1], voxels[:, 0]] = voxels[:, 3]
+            elif chunk_id == b'RGBA':
+                palette = np.frombuffer(data, dtype=np.uint8, count=256 * 4, offset=start).reshape(256, 4)
+            offset = start + content + children
+        if self.grid is None:
+            raise ValueError('.vox file has no model')
+
+        # colour of each palette index, index i is stored at i - 1. Files without a palette get a grey ramp rather
+        # than MagicaVoxel's default palette. Black is drawn as near black since black is the transparent colorkey
+        self.colours = np.zeros((256, 3), dtype=np.uint8)
+        if palette is None:
+            self.colours[1:] = np.arange(1, 256, dtype=np.uint8)[:, None]
+        else:
+            self.colours[1:] = palette[:255, :3]
+        self.colours[1:][~self.colours[1:].any(axis=1)] = 1
+
+    # nearest neighbour resample to layers x footprint (footprint fits size x size, keeping the model's aspect)
+    def resample(self, size, layers=None):
+        size_z, size_y, size_x = self.grid.shape
+        layers = layers or size_z
+        scale = size / max(size_x, size_y)
+        width, height = max(1, round(size_x * scale)), max(1, round(size_y * scale))
+        xs = np.minimum(((np.arange(width) + 0.5) / scale).astype(int), size_x - 1)
+        ys = np.minimum(((np.arange(height) + 0.5) / scale).astype(int), size_y - 1)
+        zs = np.minimum(((np.arange(layers) + 0.5) * size_z / layers).astype(int), size_z - 1)
+        return self.grid[np.ix_(zs, ys, xs)]
+
+    # vertical strip of size x size layers, top layer first (the layout cut_sprite_stack expects)
+    def get_sheet(self, size, layers=None):
+        grid = self.resample(size, layers)
+        layers, height, width = grid.shape
+        pixels = np.zeros((layers, size, size, 3), dtype=np.uint8)
+        top, left = (size - height) // 2, (size - width) // 2
+        # .vox y points away from the viewer, so rows are flipped to put it up the screen
+        pixels[:, top:top + height, left:left + width] = self.colours[grid[::-1, ::-1]]
+        sheet = pygame.image.frombuffer(pixels.reshape(layers * size, size, 3).tobytes(), (size, layers * size), 'RGB')
+        sheet.set_colorkey('black')
+        return sheet
+
+
+# bake and load times of every model: python voxel.py [layer size] [layers]
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else tile_size
+    layers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    pygame.display.set_mode((1, 1))
+    models = sorted(os.path.join(folder, file) for folder, _, files in os.walk(MODEL_DIR)
+                    for file in files if file.endswith('.vox'))
+
+    for vox_path in models:
+        name = os.path.splitext(os.path.basename(vox_path))[0]
+        bake_dir = resource_path(BAKE_DIR)
+        for file in os.listdir(bake_dir) if os.path.isdir(bake_dir) else []:
+            if file.startswith(f'{name}_') and file.endswith(f'_{size}_{layers or 0}.bake'):
+                os.remove(os.path.join(bake_dir, file))
+
+        start = time.perf_counter()
+        load_voxel_model(vox_path, size, layers)
+        bake_ms = (time.perf_counter() - start) * 1000
+        voxel_cache.clear()
+        start = time.perf_counter()
+        sheet = load_voxel_model(vox_path, size, layers)
+        load_ms = (time.perf_counter() - start) * 1000
+        print(f'{name}: {sheet.get_height() // size} layers of {size}px, bake {bake_ms:.2f} ms, '
+              f'cached load {load_ms:.2f} ms')
@@ -0,0 +1,244 @@
+import pygame, os, json, threading, queue, random
+from game_data import tile_size, tile_cache, tile_image_cache, slice_cache, zoom_tile_cache, room_memory_budget, \
+    room_stream_margin
+from support import resource_path, cut_sprite_stack, read_asset
+from compiled_level import load_level
+from level import Level
+from replay import InputSource
+
+
+# streams rooms of a Tiled .world file. The current room is live, neighbouring rooms (touching in the world file or
+# reachable through a transition trigger) are loaded and prebaked on a background thread so entering them is a swap
+# rather than a blocking Level construction. Rooms out of range are kept until the memory budget is exceeded.
+class World:
+    def __init__(self, world_path, screen_surface, screen_rect, controllers, seed=None, input_source=None):
+        self.screen_surface = screen_surface
+        self.screen_rect = screen_rect
+        self.controllers = controllers
+        # input is polled once a frame and passed to the level, every level's random streams derive from the seed (see
+        # replay.py, a Replay as the input source plays a recording back)
+        self.input = input_source or InputSource(controllers)
+        self.seed = random.getrandbits(64) if seed is None else seed
+
+        # -- world layout -- {room tmx path: pygame.Rect in world pixels}
+        self.room_rects = {}
+        world_data = json.loads(read_asset(resource_path(world_path)))
+        world_dir = os.path.dirname(world_path)
+        for room in world_data.get('maps', []):
+            path = os.path.normpath(os.path.join(world_dir, room['fileName']))
+            self.room_rects[path] = pygame.Rect(room['x'], room['y'], room['width'], room['height'])
+
+        # -- rooms --
+        self.level = None  # live level
+        self.current_room = None
+        self.current_spawn = None
+        self.arrived = False  # player is still inside the transition they arrived through
+        self.resident = {}  # {room tmx path: Room} rooms that are loaded (current and streamed)
+        self.building = set()  # Rooms being prepared, not yet resident (their cached surfaces are in use too)
+        self.failed = set()  # rooms the streaming thread could not load
+        self.wanted = set()  # rooms in range of the current room
+        self.clock = 0  # room entry counter, used to evict least recently used rooms
+        self.tile_sprite_bytes = 1024  # rough cost of one tile sprite and its rects, added to surface memory
+
+        # -- streaming -- jobs are (room path, spawn name or None)
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self.stream_rooms, daemon=True)
+        self.worker.start()
+
+# -- streaming --
+
+    # background thread, prepares rooms until the game closes
+    def stream_rooms(self):
+        while True:
+            path, spawn = self.jobs.get()
+            # room may have gone out of range while the job was queued
+            if path not in self.wanted and path != self.current_room:
+                continue
+            try:
+                room = self.prepare_room(path, spawn)
+            except Exception as e:
+                print(f'world: failed to stream {path}: {e}')
+                with self.lock:
+                    self.failed.add(path)
+                continue
+            with self.lock:
+                self.building.discard(room)
+                if path in self.wanted or path == self.current_room:
+                    self.resident[path] = room
+
+    # loads and prebakes a room, and builds a ready to run Level for the spawn if one is given. A new room is in building
+    # until the caller makes it resident, so eviction meanwhile keeps the cached surfaces it shares
+    def prepare_room(self, path, spawn=None):
+        with self.lock:
+            room = self.resident.get(path)
+        try:
+            if room is None:
+                room = Room(path)
+                with self.lock:
+                    self.building.add(room)
+                room.tmx_data = load_level(resource_path(path))
+                self.prebake(room)
+            if spawn is not None and spawn not in room.levels:
+                room.levels[spawn] = Level(path, self.screen_surface, self.screen_rect, self.controllers, spawn,
+                                           self.get_level_seed(path, spawn))
+        except Exception:
+            with self.lock:
+                self.building.discard(room)
+            raise
+        return room
+
+    # builds rotated sprite stack caches for every tile surface in the room (what Level would do on construction). The
+    # room's surfaces are claimed under the lock before the cache is checked, so eviction can not drop an entry the room
+    # is about to rely on
+    def prebake(self, room):
+        tiles = 0
+        surfaces = set()
+        for layer in room.tmx_data.layers:
+            if not hasattr(layer, 'tiles'):
+                continue
+            for x, y, surface in layer.tiles():
+                tiles += 1
+                surfaces.add(surface)
+        with self.lock:
+            room.surfaces |= surfaces
+            missing = [surface for surface in surfaces if surface not in tile_cache]
+        for surface in missing:
+            tile_cache[surface] = Level.create_tile_cache(cut_sprite_stack(surface, (tile_size, tile_size)))
+
+        # estimated memory is tile sprites plus every surface the room's tiles keep alive (shared surfaces are counted
+        # for each room that uses them, which errs on the side of evicting early)
+        room.bytes = tiles * self.tile_sprite_bytes
+        for surface in room.surfaces:
+            room.bytes += surface.get_pitch() * surface.get_height()
+            for surf in tile_cache[surface].values():
+                room.bytes += surf.get_pitch() * surf.get_height()
+
+    # rooms touching the current room in the world file plus transition destinations (with the spawn they arrive at)
+    def get_neighbours(self):
+        neighbours = {}
+        if self.current_room in self.room_rects:
+            area = self.room_rects[self.current_room].inflate(room_stream_margin * 2, room_stream_margin * 2)
+            for path, rect in self.room_rects.items():
+                if path != self.current_room and area.colliderect(rect):
+                    neighbours[path] = None
+        for trigger in self.level.transitions:
+            if trigger.destination is not None:
+                neighbours[trigger.destination] = trigger.destination_spawn
+        return neighbours
+
+    # queues neighbours. The current room's level is only rebuilt when it is restarted (its tiles stay prebaked, so that
+    # is a Level construction, not a room load)
+    def stream_neighbours(self):
+        neighbours = self.get_neighbours()
+        with self.lock:
+            self.wanted = set(neighbours)
+        for path, spawn in neighbours.items():
+            self.jobs.put((path, spawn))
+
+    # evicts least recently used out of range rooms until resident rooms fit the memory budget
+    def evict(self):
+        with self.lock:
+            keep = self.wanted | {self.current_room}
+            candidates = sorted((room for path, room in self.resident.items() if path not in keep),
+                                key=lambda r: r.last_used)
+            total = sum(room.bytes for room in self.resident.values())
+            for room in candidates:
+                if total <= room_memory_budget:
+                    break
+                del self.resident[room.path]
+                total -= room.bytes
+                self.release_surfaces(room)
+                print(f'world: evicted {room.path} ({room.bytes // 1024} KB)')
+
+    # drops cached surfaces that no remaining resident room uses
+    def release_surfaces(self, room):
+        in_use = set()
+        for other in list(self.resident.values()) + list(self.building):
+            in_use |= other.surfaces
+        released = room.surfaces - in_use
+        for surface in released:
+            tile_cache.pop(surface, None)
+            slice_cache.pop((surface, (tile_size, tile_size)), None)
+        for cache in zoom_tile_cache.values():
+            for key in [key for key in cache if key[0] in released]:
+                del cache[key]
+        for key in [key for key, surface in tile_image_cache.items() if surface in released]:
+            del tile_image_cache[key]
+
+# -- rooms --
+
+    # starts building a room on the streaming thread before anything is live (e.g. the first room, while a loading frame
+    # is shown), enter it once room_ready
+    def load_room(self, path, spawn):
+        path = os.path.normpath(path)
+        with self.lock:
+            self.wanted.add(path)
+            self.failed.discard(path)
+        self.jobs.put((path, spawn))
+
+    # room's level is built, or streaming it failed (enter_room then loads it on the calling thread, raising the error)
+    def room_ready(self, path, spawn):
+        path = os.path.normpath(path)
+        with self.lock:
+            room = self.resident.get(path)
+            return (room is not None and spawn in room.levels) or path in self.failed
+
+    # makes room the live level, using the streamed level if it is ready and otherwise building it now
+    def enter_room(self, path, spawn):
+        path = os.path.normpath(path)
+        with self.lock:
+            room = self.resident.get(path)
+            level = room.levels.pop(spawn, None) if room else None
+        if room is None or level is None:
+            if self.level is not None and path != self.current_room:
+                print(f'world: {path} was not streamed in time, loading now')
+            room = self.prepare_room(path, spawn)
+            level = room.levels.pop(spawn)
+            with self.lock:
+                self.building.discard(room)
+                self.resident[path] = room
+
+        # levels are built on the streaming thread, their worker processes are forked here on the main thread
+        level.start_flock_workers()
+        self.clock += 1
+        room.last_used = self.clock
+        self.level = level
+        self.current_room = path
+        self.current_spawn = spawn
+        self.arrived = True  # ignore transitions until the player has stepped out of the one they arrived in
+
+        self.stream_neighbours()
+        self.evict()
+        return self.level
+
+    # seed of a room's level, the same every time the room is entered through the spawn
+    def get_level_seed(self, path, spawn):
+        return f'{self.seed}:{path.replace(os.sep, "/")}:{spawn}'
+
+    def restart(self):
+        return self.enter_room(self.current_room, self.current_spawn)
+
+    def update(self, dt):
+        frame_input = self.input.poll(dt)
+        if frame_input.restart:
+            self.restart()
+        if frame_input.pause:
+            self.level.set_pause()
+        self.level.update(frame_input)
+
+        transition = self.level.get_transition()
+        if transition is None:
+            self.arrived = False
+        elif not self.arrived:
+            self.enter_room(transition.destination, transition.destination_spawn)
+
+
+class Room:
+    def __init__(self, path):
+        self.path = path
+        self.tmx_data = None  # compiled level
+        self.levels = {}  # {spawn name: Level} built ahead of time, consumed when entered
+        self.surfaces = set()  # tile surfaces used by the room (tile_cache keys)
+        self.bytes = 0  # estimated memory
+        self.last_used = 0
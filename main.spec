@@ -8,7 +8,7 @@ a = Analysis(
     ['code/main.py'],
     pathex=[],
     binaries=[],
-    datas=[('assets', 'assets'), ('code', 'code')],
+    datas=[('assets', 'assets'), ('code', 'code'), ('assets.bundle', '.')],  # build assets.bundle first (code/bundle.py)
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -1,10 +1,13 @@
 import PyInstaller.__main__
 
+# pack the assets first (cd code && python bundle.py), the frozen game loads them from assets.bundle
+
 PyInstaller.__main__.run([
     'code/main.py',
     '--onefile',
     '--noconsole',
-    '--debug=imports'
+    '--debug=imports',
+    '--add-data=assets.bundle:.'
     #'--add-binary=rooms:rooms'
     #'--add-data='
 ])